@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any, Callable
+# local imports
+from server import GameServer, make_argument_parser, configure
+from snapshot import Snapshot
+import protocol
+import logs
+
+log = logs.get_logger("aioserver")
+
+
+class AsyncConnection:
+    """Connection with its own writer task and a bounded outgoing queue
+
+    Frames that must arrive (join messages, corrections) are queued, and the connection is dropped if it falls too far behind.
+    'DELTA' snapshots are coalesced while the previous one is still being written, so a slow client gets fewer, newer updates
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_queued_frames: int) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.max_queued_frames = max_queued_frames
+        self.frames: deque[bytes] = deque()
+        self.pending_delta: Snapshot | None = None
+        self.wakeup = asyncio.Event()
+        self.is_open = True
+        self.coalesced_deltas = 0
+        self.coalesced_values = 0
+        self.delta_written: Callable[[int], None] = lambda size: None # with the size of each 'DELTA' frame written
+
+    def send_frame(self, frame: bytes) -> bool:
+        if not self.is_open:
+            return False
+        if len(self.frames) >= self.max_queued_frames:
+            return False
+        self.frames.append(frame)
+        self.wakeup.set()
+        return True
+
+    def send_delta(self, delta: Snapshot) -> None:
+        if not self.is_open:
+            return
+        if self.pending_delta is None:
+            self.pending_delta = delta
+        else: # previous one was not written yet
+            self.coalesced_values += self.pending_delta.merge(delta)
+            self.coalesced_deltas += 1
+        self.wakeup.set()
+
+    async def write_loop(self) -> None:
+        while self.is_open:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.frames:
+                self.writer.write(self.frames.popleft())
+            if self.pending_delta is not None:
+                delta = self.pending_delta
+                self.pending_delta = None
+                frame = protocol.encode_delta(delta._records())
+                self.writer.write(frame)
+                self.delta_written(len(frame))
+            await self.writer.drain() # new deltas coalesce while waiting here
+
+    def close(self) -> None:
+        self.is_open = False
+        self.wakeup.set()
+        self.writer.close()
+
+
+class AsyncGame(GameServer):
+    """`GameServer` whose messages go to `AsyncConnection`s, using the binary protocol only
+
+    Transport hook: `queue(self, connection, message: bytes | Snapshot) -> None`
+    """
+
+    def queue(self, connection: AsyncConnection, message: bytes | Snapshot) -> None:
+        raise NotImplementedError
+
+    def send_frame(self, connection: AsyncConnection, frame: bytes) -> None: # type: ignore[override]
+        self.queue(connection, frame)
+
+    def send_delta(self, connection: AsyncConnection, delta: Snapshot) -> None: # type: ignore[override]
+        self.queue(connection, delta) # counted once written, as coalesced ones are never sent
+
+    def count_delta(self, size: int) -> None:
+        self.snapshot_stats.add_sent(1, size)
+        self.metrics.count_sent("DELTA", size)
+
+    def join(self, connection: AsyncConnection, binary: bool) -> None: # type: ignore[override]
+        if not binary:
+            log.warning("Client does not speak binary protocol version %d, not joining it", protocol.VERSION)
+            return
+        super().join(connection, binary=True) # type: ignore
+
+
+class AsyncHost:
+    """Accepts connections and ticks at a fixed rate with asyncio, for `AsyncServer` and `RoomServer`
+
+    Every connection gets a reader and a writer task, and ticks run on their own task,
+    so a slow client only slows down its own writer.
+    Hooks: `place` picks the game a new connection joins, `received` runs after each read, `tick` runs every tick
+    """
+    tps: int = 16
+    MAX_QUEUED_FRAMES: int = 256 # per connection, before it is dropped
+    READ_SIZE: int = 65_536
+    BACKLOG: int = 1024
+
+    def __init__(self, *, host: str = "localhost", port: int = 8080) -> None:
+        self.host = host
+        self.port = port
+        self.connection_games: dict[AsyncConnection, AsyncGame] = {}
+
+    def run(self) -> None:
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            log.info("Server stopped")
+        finally:
+            self.stop()
+
+    async def serve(self) -> None:
+        self.start()
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port, backlog=self.BACKLOG)
+        log.info("Serving %s on %s:%d at %d tps", type(self).__name__, self.host, self.port, self.tps)
+        async with server:
+            await self.tick_loop()
+
+    def start(self) -> None:
+        ...
+
+    def stop(self) -> None:
+        ...
+
+    def place(self) -> AsyncGame | None:
+        """Game a new connection joins, `None` to refuse it
+        """
+        raise NotImplementedError
+
+    def received(self, game: AsyncGame) -> None:
+        ...
+
+    def tick(self, delta: float) -> None:
+        raise NotImplementedError
+
+    def count_late_tick(self) -> None:
+        ...
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        game = self.place()
+        if game is None:
+            writer.close()
+            return
+        connection = AsyncConnection(reader, writer, self.MAX_QUEUED_FRAMES)
+        self.connection_games[connection] = game
+        connection.delta_written = game.count_delta
+        host, port, *_ = writer.get_extra_info("peername")
+        game._on_client_connected(connection, host, port) # type: ignore
+        write_task = asyncio.create_task(connection.write_loop())
+        error: Exception = ConnectionResetError("Connection closed by client")
+        try:
+            while connection.is_open:
+                data = await reader.read(self.READ_SIZE)
+                if not data:
+                    break
+                game._on_request_received(connection, data) # type: ignore
+                self.received(game)
+        except (OSError, asyncio.IncompleteReadError) as read_error:
+            error = read_error
+        finally:
+            self.drop(connection, error)
+            write_task.cancel()
+
+    def drop(self, connection: AsyncConnection, error: Exception) -> AsyncGame | None:
+        """Closes the connection and leaves its game, which is returned unless it was dropped before
+        """
+        game = self.connection_games.pop(connection, None)
+        if game is None:
+            return None
+        connection.close()
+        game._on_client_disconnected(connection, error) # type: ignore
+        return game
+
+    def send(self, connection: AsyncConnection, message: bytes | Snapshot) -> None:
+        """Hands a message to the connection's writer, on the event loop's thread
+        """
+        if connection not in self.connection_games: # dropped since
+            return
+        if isinstance(message, Snapshot):
+            connection.send_delta(message)
+        elif not connection.send_frame(message):
+            log.warning("Outgoing queue full, dropping connection")
+            self.drop(connection, BufferError("Outgoing queue full"))
+
+    async def tick_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tps
+        next_tick = loop.time()
+        while True:
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else: # running behind, skip the missed ticks instead of bursting
+                self.count_late_tick()
+                next_tick = loop.time()
+                await asyncio.sleep(0) # let readers and writers run
+            self.tick(interval)
+
+
+class AsyncServer(AsyncGame, AsyncHost):
+    """Serves `GameServer` with asyncio, using the binary protocol only
+    """
+
+    def start(self) -> None:
+        self._on_start()
+
+    def place(self) -> AsyncGame:
+        return self
+
+    def tick(self, delta: float) -> None:
+        self._update(delta)
+
+    def count_late_tick(self) -> None:
+        self.metrics.late_ticks += 1
+
+    def queue(self, connection: AsyncConnection, message: bytes | Snapshot) -> None:
+        self.send(connection, message)
+
+    def connection_count(self) -> int:
+        return len(self.connection_games)
+
+    def make_report(self) -> dict[str, Any]:
+        self.metrics.gauges["coalesced_deltas"] = sum(connection.coalesced_deltas for connection in self.connection_games)
+        return super().make_report()
+
+
+if __name__ == "__main__":
+    args = make_argument_parser("Agar.io - Server (asyncio)").parse_args()
+    configure(args)
+    server = AsyncServer(host=args.host, port=args.port)
+    server.run()
@@ -16,4 +16,7 @@ class Background(Node2D):
 
     def _render(self, surface: Surface) -> None:
         loc = self.get_global_position() - Camera.current.offset - self.root.half_world_size
-        pygame.draw.rect(surface, color.WHITE, (loc.to_tuple(), (self.root.half_world_size * 2).to_tuple()))
+        world_rect = pygame.Rect(loc.to_tuple(), (self.root.half_world_size * 2).to_tuple())
+        visible_rect = world_rect.clip(surface.get_rect()) # only the part of the world on screen
+        if visible_rect:
+            surface.fill(color.WHITE, visible_rect)
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import itertools
+import subprocess
+import multiprocessing
+import urllib.request
+from typing import Any, Iterable
+# dependencies
+from displaylib.math import Vec2, Vec2i # type: ignore
+# local imports
+from swarm import HeadlessBot, Swarm
+import logs
+
+# Sweeps client count, MAX_FOOD_COUNT and WORLD_SIZE, one fresh server process per combination.
+# The server runs in a child process so the scripted clients do not share its GIL,
+# and its tick numbers are read from its own stats endpoint (see `metrics.py`)
+
+
+class ScriptedClient(HeadlessBot):
+    """Wanders on a path given by its seed alone, so every run sends the same moves
+    """
+    TURN_ANGLE: float = 12 # degrees per simulation step, at most
+    BORDER_TURN_START: float = 0.6 # of the half world size
+
+    def __init__(self, address: tuple[str, int], seed: int) -> None:
+        super().__init__(address)
+        self.random = random.Random(seed)
+        self.direction = Vec2.RIGHT.rotated(self.random.uniform(0, math.tau))
+
+    def steer(self, loc: Vec2, radius: float, closest_food: Vec2 | None,
+              nearby_players: Iterable[tuple[Vec2, float]], half_world_size: Vec2) -> Vec2:
+        self.direction = self.direction.rotated(math.radians(self.random.uniform(-self.TURN_ANGLE, self.TURN_ANGLE)))
+        if abs(loc.x) > half_world_size.x * self.BORDER_TURN_START or abs(loc.y) > half_world_size.y * self.BORDER_TURN_START:
+            self.direction = self.direction.lerp(loc.direction_to(Vec2.ZERO), 0.1).normalized()
+        return self.direction
+
+
+class ScriptedSwarm(Swarm):
+
+    def __init__(self, *, seed: int, **options: Any) -> None:
+        super().__init__(**options)
+        self.seed = seed
+
+    def make_bot(self) -> HeadlessBot:
+        return ScriptedClient(self.address, self.seed + len(self.bots))
+
+
+def run_server(port: int, stats_port: int, seed: int, max_food_count: int, world_size: int, args: argparse.Namespace) -> None:
+    # imported in the child only, as `MainServer` starts an engine
+    from server import GameServer
+    logs.configure("warning")
+    GameServer.SEED = seed + 1 # 0 would be a new world every run
+    GameServer.COLLISION_ENGINE = args.engine
+    GameServer.MOVEMENT = args.movement
+    GameServer.MAX_FOOD_COUNT = max_food_count
+    GameServer.FOOD_DENSITY = max_food_count / (world_size ** 2 / 1_000_000) # spread over the whole world
+    GameServer.WORLD_SIZE = Vec2i(world_size, world_size)
+    GameServer.HALF_WORLD_SIZE = Vec2i(world_size // 2, world_size // 2)
+    GameServer.STATS_PORT = stats_port
+    GameServer.REPORT_INTERVAL = math.inf # counters keep adding up, and are compared between two reads
+    if args.server == "asyncio":
+        from aioserver import AsyncServer
+        AsyncServer(host="localhost", port=port).run()
+    else:
+        from engineserver import MainServer
+        MainServer(host="localhost", port=port)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+def fetch_report(stats_port: int, timeout: float = 10) -> dict[str, Any]:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{stats_port}/", timeout=timeout) as response:
+                return json.loads(response.read())
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def sent_totals(report: dict[str, Any], kind: str) -> tuple[int, int]:
+    counter = report["sent"].get(kind, {"messages": 0, "bytes": 0})
+    return (counter["messages"], counter["bytes"])
+
+
+def measure(clients: int, max_food_count: int, world_size: int, args: argparse.Namespace) -> dict[str, Any]:
+    port = free_port()
+    stats_port = free_port()
+    server = multiprocessing.Process(target=run_server, daemon=True,
+                                     args=(port, stats_port, args.seed, max_food_count, world_size, args))
+    server.start()
+    try:
+        fetch_report(stats_port) # waits until it serves
+        swarm = ScriptedSwarm(seed=args.seed, port=port, count=clients, ramp_up=args.ramp_up, tps=args.rate)
+        swarm.start_timestamp = time.perf_counter()
+        warmup = clients / args.ramp_up + args.warmup
+        while swarm.step() < warmup:
+            pass
+        start = fetch_report(stats_port)
+        start_timestamp = time.perf_counter()
+        while swarm.step() < warmup + args.duration:
+            pass
+        end = fetch_report(stats_port)
+        elapsed = time.perf_counter() - start_timestamp
+        swarm.close()
+    finally:
+        server.terminate()
+        server.join()
+    ticks = max(1, end["ticks"] - start["ticks"])
+    delta_messages = sent_totals(end, "DELTA")[0] - sent_totals(start, "DELTA")[0]
+    delta_bytes = sent_totals(end, "DELTA")[1] - sent_totals(start, "DELTA")[1]
+    return {
+        "clients": clients,
+        "max_food_count": max_food_count,
+        "world_size": world_size,
+        "joined": end["clients"],
+        "ticks_per_second": round(ticks / elapsed, 2),
+        "tick_ms": end["tick_ms"],
+        "sections_ms": end["sections_ms"],
+        "fan_out": {
+            "broadcast_ms": end["sections_ms"]["broadcast"],
+            "delta_messages_per_tick": round(delta_messages / ticks, 2),
+            "delta_bytes_per_tick": round(delta_bytes / ticks, 1),
+            "delta_bytes_per_client_per_second": round(delta_bytes / max(1, clients) / elapsed, 1)
+        },
+        "max_rss_kib": end["max_rss_kib"]
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agar.io - Server benchmark with scripted clients")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--max-food-count", type=int, nargs="+", default=[200, 1000, 20000])
+    parser.add_argument("--world-size", type=int, nargs="+", default=[2000, 4000])
+    parser.add_argument("--server", choices=("main", "asyncio"), default="main", help="`MainServer` or `AsyncServer`")
+    parser.add_argument("--engine", default="grid", help="collision engine of the server")
+    parser.add_argument("--movement", choices=("input", "position"), default="input",
+                        help="whether clients send 'SET_INPUT' when turning, or 'SET_POSITION' when moved")
+    parser.add_argument("--rate", type=int, default=60, help="client updates per second")
+    parser.add_argument("--ramp-up", type=float, default=100, help="clients connected per second")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds after all clients connected")
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured per combination")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+    logs.configure("warning")
+    results: list[dict[str, Any]] = []
+    for clients, max_food_count, world_size in itertools.product(args.clients, args.max_food_count, args.world_size):
+        result = measure(clients, max_food_count, world_size, args)
+        results.append(result)
+        print(f"[Info] {clients} clients, {max_food_count} foods, {world_size} world:",
+              f"{result['ticks_per_second']} ticks/s, tick p50 {result['tick_ms']['p50']} ms,",
+              f"p99 {result['tick_ms']['p99']} ms, {result['max_rss_kib']} KiB")
+    with open(args.output, "w") as file:
+        json.dump({
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "seed": args.seed,
+            "server": args.server,
+            "engine": args.engine,
+            "movement": args.movement,
+            "rate": args.rate,
+            "duration": args.duration,
+            "results": results
+        }, file, indent=4)
+    print("[Info] Results written to", args.output)
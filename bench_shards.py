@@ -0,0 +1,76 @@
+import os
+import time
+import random
+import argparse
+import statistics
+# dependencies
+from displaylib.math import Vec2, Vec2i # type: ignore
+# local imports
+from server import GameServer, HeadlessServer
+import logs
+
+
+def make_server(engine: str, shards: int, clients: int, foods: int, world_size: int, seed: int) -> HeadlessServer:
+    GameServer.SEED = seed + 1 # 0 would be a new world every run
+    GameServer.COLLISION_ENGINE = engine
+    GameServer.SHARDS = shards
+    GameServer.MOVEMENT = "position" # moved by `set_position` below
+    GameServer.MAX_POSITION_RATE = 0 # as fast as the loop sends them
+    GameServer.MOVE_TOLERANCE = float("inf") # moves are not checked here
+    GameServer.WORLD_SIZE = Vec2i(world_size, world_size)
+    GameServer.HALF_WORLD_SIZE = Vec2i(world_size // 2, world_size // 2)
+    GameServer.MAX_FOOD_COUNT = foods
+    GameServer.FOOD_DENSITY = foods / (world_size ** 2 / 1_000_000) # spread over the whole world
+    server = HeadlessServer()
+    server._on_start()
+    for connection in range(clients):
+        server._on_client_connected(connection, "bench", connection) # type: ignore
+        server.join(connection, binary=True) # type: ignore
+    return server
+
+
+def measure(engine: str, shards: int, clients: int, foods: int, world_size: int, ticks: int, seed: int) -> tuple[list[float], list[float]]:
+    """Collision time and whole tick time of each tick, in seconds
+
+    The whole tick includes what stays in the front process, like movement and broadcasting
+    """
+    server = make_server(engine, shards, clients, foods, world_size, seed)
+    rng = random.Random(seed)
+    tick_times: list[float] = []
+    for _ in range(ticks):
+        for client in tuple(server.clients.values()):
+            step = Vec2(rng.uniform(-10, 10), rng.uniform(-10, 10))
+            server.set_position(client.connection, client.cid, client.position + step)
+        tick_start = time.perf_counter()
+        server._update(1 / 16)
+        tick_times.append(time.perf_counter() - tick_start)
+    sections = server.metrics.sections
+    collision_times = [food + player for food, player in zip(sections["food_collision"].samples, sections["player_collision"].samples)]
+    if engine == "sharded":
+        print(f"    handoffs {server.collisions.handoffs}, strips eaten again in front {server.collisions.replayed_strips}")
+        server.collisions.close()
+    return collision_times, tick_times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agar.io - Collision and tick time by shard count")
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--foods", type=int, default=20000)
+    parser.add_argument("--world-size", type=int, default=8000, help="side of the square world")
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shards", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+    logs.configure("warning") # kills and joins are logged
+    print(f"[Info] {args.clients} clients, {args.foods} foods, {args.world_size} world,",
+          f"{args.ticks} ticks, {os.cpu_count()} cores")
+    runs = [("numpy", 0)] + [("sharded", shards) for shards in args.shards]
+    baselines: tuple[float, float] | None = None
+    for engine, shards in runs:
+        collision_times, tick_times = measure(engine, shards, args.clients, args.foods, args.world_size, args.ticks, args.seed)
+        medians = (statistics.median(collision_times), statistics.median(tick_times))
+        baselines = baselines or medians
+        label = f"{engine} x{shards}" if shards else engine
+        print(f"{label:<12} collisions {medians[0] * 1000:8.2f} ms, speedup {baselines[0] / medians[0]:5.2f},",
+              f"tick {medians[1] * 1000:8.2f} ms, speedup {baselines[1] / medians[1]:5.2f}")
@@ -0,0 +1,46 @@
+import sys
+import argparse
+import subprocess
+
+# Import time of the headless entry points, from `python -X importtime` in a fresh process each.
+# Servers and bots are started by the dozen, so none of them may pull in pygame or a display
+
+HEADLESS_MODULES: tuple[str, ...] = ("server", "aioserver", "swarm", "replay")
+FORBIDDEN_PREFIXES: tuple[str, ...] = ("pygame", "displaylib.pygame") # initialize a display
+BUDGET_MS: float = 100 # cumulative import time of each module, after the interpreter started; asyncio alone takes about half
+
+
+def measure(module: str) -> dict[str, float]:
+    """Cumulative import time in milliseconds of every module imported by `import module`
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|") # "import time: self | cumulative | indented name"
+        times[name.strip()] = int(cumulative_us) / 1000
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agar.io - Import time of the headless entry points")
+    parser.add_argument("modules", nargs="*", default=HEADLESS_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--top", type=int, default=5, help="slowest imports listed per module")
+    args = parser.parse_args()
+    failed = False
+    for module in args.modules:
+        times = measure(module)
+        total = times[module]
+        forbidden = sorted(name for name in times if name.startswith(FORBIDDEN_PREFIXES))
+        over_budget = total > args.budget_ms
+        failed = failed or over_budget or bool(forbidden)
+        print(f"{module:<12} {total:8.1f} ms{'  over budget' if over_budget else ''}")
+        slowest = sorted(((name, ms) for name, ms in times.items() if name != module), key=lambda item: -item[1])
+        for name, ms in slowest[:args.top]:
+            print(f"    {name:<32} {ms:8.1f} ms")
+        if forbidden:
+            print(f"    [Warning] imports {', '.join(forbidden)}")
+    sys.exit(1 if failed else 0)
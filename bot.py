@@ -1,22 +1,21 @@
-import random
-import math
 # override the Player class itself
-from displaylib.math import Vec2, Vec2i
-from displaylib.template import networking
+from displaylib.math import Vec2
 import player
+from steering import BotSteering
+from prediction import Prediction
+import simulation
 
 
-class Bot(player.PlayerBase):
-    direction = Vec2.RIGHT
-    speed = Vec2.ONE
-    SIGHT_RANGE: int = 70
-    BOUNDARY_WILL_START: float = 0.6
-    BOUNDARY_AVOIDANCE: float = 0.15
-    FOOD_WILL: float = 0.25
+class Bot(BotSteering, Prediction, player.PlayerBase):
     CHILL_TIME: float = 0.3
     time_chilled: float = CHILL_TIME
     last_position = Vec2.ZERO
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.timestep = simulation.FixedTimestep()
+        self.reset_prediction()
+
     @property
     def is_chilling(self) -> bool:
         return self.time_chilled <= self.CHILL_TIME
@@ -26,40 +25,28 @@ class Bot(player.PlayerBase):
         if self.is_chilling:
             return
         super()._update(delta)
-        self.visual_position = self.get_global_position()
-        #: manupulate direction
-        angle = math.radians(random.randint(-12, 12))
-        self.direction = self.direction.rotated(angle)
-        if self.root.foods:
+        for _ in range(self.timestep.advance(delta)):
+            #: manupulate direction
             loc = self.get_global_position()
-            closest_food = self.root.foods[tuple(self.root.foods.keys())[0]] # start at first one
-            for food in self.root.foods.values():
-                if loc.distance_to(food.position) < loc.distance_to(closest_food.position):
-                    closest_food = food
-            if loc.distance_to(closest_food.position) < self.SIGHT_RANGE:
-                dir_to_closest_food = loc.direction_to(closest_food.position)
-                self.direction = self.direction.lerp(dir_to_closest_food, self.FOOD_WILL).normalized()
-        # bias for moving close to border
-        origin = Vec2.ZERO
-        dist_to_center = self.get_global_position().distance_to(origin)
-        dir_to_center = self.get_global_position().direction_to(origin)
-        dist_to_corner = self.root.half_world_size.length()
-        if dist_to_center == 0:
-            dist_to_center = 0.1
-        ratio = dist_to_center / dist_to_corner
-        if ratio >= self.BOUNDARY_WILL_START: # kinda close to edge
-            self.direction = self.direction.lerp(dir_to_center, self.BOUNDARY_AVOIDANCE * ratio)
-        # change position
-        self.position += self.direction * self.speed * delta * 0.15
-        #:
-        loc = self.get_global_position()
-        half_boundary = self.root.half_world_size - (Vec2i.ONE * int(self.visual_radius))
-        valid_loc = loc.clamped(-half_boundary, half_boundary)
+            closest_food = self.root.nearest_food(loc, self.SIGHT_RANGE)
+            nearby_players = ((player.position, player.radius) for player in self.root.nearby_players(loc, self.SIGHT_RANGE))
+            self.steer(loc, self.radius, None if closest_food is None else closest_food.position,
+                       nearby_players, self.root.half_world_size)
+            direction = self.direction
+            if self.root.movement == "input":
+                data = self.next_input(loc, direction) # only sent when steering turned enough
+                if data is not None:
+                    self.root.send_request("SET_INPUT", [self.cid, *data])
+                direction = self.sent_direction # as the server moves with it
+            # change position
+            self.set_global_position(simulation.step(loc, direction, self.radius, self.root.half_world_size))
+        valid_loc = simulation.clamp_to_world(self.get_global_position(), self.radius, self.root.half_world_size)
         self.set_global_position(valid_loc)
-        if self.get_global_position().distance_to(self.last_position) > 0.5: # moved more than 0.5
-            req = networking.Request("SET_POSITION", data=[self.cid, *self.get_global_position().to_tuple()])
-            self.root.send(req)
-        self.last_position = self.get_global_position()
+        self.visual_position = valid_loc + self.ease_correction()
+        if self.root.movement == "position" and valid_loc.distance_to(self.last_position) > 0.5: # moved more than 0.5
+            sequence = self.record_sent(valid_loc)
+            self.root.send_request("SET_POSITION", [self.cid, *valid_loc.to_tuple(), sequence])
+        self.last_position = valid_loc
 
 
 player.Player = Bot
@@ -4,10 +4,8 @@ from displaylib.pygame import Node2D, Vec2
 
 
 class Camera(Node2D):
-    current: Camera
+    current: Camera # set by `App` once its engine started, not when imported
 
     @property
     def offset(self) -> Vec2:
         return self.get_global_position() - (Vec2(self.root.width, self.root.height) / 2)
-
-Camera.current = Camera()
\ No newline at end of file
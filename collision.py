@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+from typing import Any, Hashable
+# local imports
+from spatial import SpatialHash
+
+FoodKey = int # ID from `entities.FoodStore`
+np: Any = None # optional dependency, imported by `NumpyCollisions` so grid servers start without it
+
+
+class GridCollisions:
+    """Broad phase backed by `SpatialHash`, one grid for clients and one for foods
+    """
+    name = "grid"
+
+    def __init__(self, cell_size: float) -> None:
+        self.client_grid: SpatialHash[int] = SpatialHash(cell_size)
+        self.food_grid: SpatialHash[FoodKey] = SpatialHash(cell_size)
+        self.radii: dict[int, float] = {}
+        self._max_radius: float = 0
+        self._max_radius_dirty = False
+
+    @property
+    def max_radius(self) -> float:
+        if self._max_radius_dirty:
+            self._max_radius = max(self.radii.values(), default=0)
+            self._max_radius_dirty = False
+        return self._max_radius
+
+    def add_client(self, cid: int, x: float, y: float, radius: float) -> None:
+        self.client_grid.insert(cid, x, y)
+        self.radii[cid] = radius
+        self._max_radius_dirty = True
+
+    def update_client(self, cid: int, x: float, y: float, radius: float) -> None:
+        self.client_grid.move(cid, x, y)
+        if self.radii[cid] != radius:
+            self.radii[cid] = radius
+            self._max_radius_dirty = True
+
+    def remove_client(self, cid: int) -> None:
+        self.client_grid.remove(cid)
+        del self.radii[cid]
+        self._max_radius_dirty = True
+
+    def add_food(self, key: FoodKey, x: float, y: float) -> None:
+        self.food_grid.insert(key, x, y)
+
+    def remove_food(self, key: FoodKey) -> None:
+        self.food_grid.discard(key)
+
+    def query_clients(self, x: float, y: float, radius: float) -> list[int]:
+        """Clients in the square around (`x`, `y`), in no particular order, as used for areas of interest
+        """
+        return self.client_grid.query(x, y, radius, ordered=False)
+
+    def query_foods(self, x: float, y: float, radius: float) -> list[FoodKey]:
+        return self.food_grid.query(x, y, radius, ordered=False)
+
+    def food_candidates(self, queries: list[tuple[float, float, float]]) -> list[list[FoodKey]]:
+        """Foods near each `(x, y, reach)` query, in insertion order
+        """
+        return [self.food_grid.query(x, y, reach) for x, y, reach in queries]
+
+    def player_candidates(self, cid: int, x: float, y: float, radius: float) -> list[int]:
+        """Clients that may overlap a circle at (`x`, `y`), in insertion order
+        """
+        return [other_cid for other_cid in self.client_grid.query(x, y, radius + self.max_radius)
+                if other_cid != cid]
+
+
+class _PackedArray:
+    """Growable structure of arrays with swap-remove, keyed by any hashable
+    """
+
+    def __init__(self, capacity: int = 256) -> None:
+        self.count = 0
+        self.positions = self._new_array((capacity, 2), np.float64)
+        self.radii = self._new_array((capacity,), np.float64)
+        self.orders = self._new_array((capacity,), np.int64) # insertion order, to match dict iteration
+        self.keys: list[Hashable] = []
+        self.index: dict[Hashable, int] = {}
+        self._order_counter = 0
+
+    def _new_array(self, shape: tuple[int, ...], dtype: type) -> np.ndarray:
+        return np.zeros(shape, dtype=dtype)
+
+    def _grow(self) -> None:
+        capacity = len(self.radii) * 2
+        for name in ("positions", "radii", "orders"):
+            old = getattr(self, name)
+            new = self._new_array((capacity, *old.shape[1:]), old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, key: Hashable, x: float, y: float, radius: float) -> None:
+        if key in self.index:
+            self.update(key, x, y, radius)
+            return
+        if self.count == len(self.radii):
+            self._grow()
+        i = self.count
+        self.positions[i] = (x, y)
+        self.radii[i] = radius
+        self.orders[i] = self._order_counter
+        self._order_counter += 1
+        self.keys.append(key)
+        self.index[key] = i
+        self.count += 1
+
+    def update(self, key: Hashable, x: float, y: float, radius: float) -> None:
+        i = self.index[key]
+        self.positions[i] = (x, y)
+        self.radii[i] = radius
+
+    def remove(self, key: Hashable) -> None:
+        i = self.index.pop(key)
+        last = self.count - 1
+        if i != last: # move the last entry into the hole
+            last_key = self.keys[last]
+            self.positions[i] = self.positions[last]
+            self.radii[i] = self.radii[last]
+            self.orders[i] = self.orders[last]
+            self.keys[i] = last_key
+            self.index[last_key] = i
+        self.keys.pop()
+        self.count = last
+
+    def sorted_keys(self, indices: np.ndarray) -> list[Hashable]:
+        indices = indices[np.argsort(self.orders[indices], kind="stable")]
+        keys = self.keys
+        return [keys[i] for i in indices.tolist()]
+
+
+class NumpyCollisions:
+    """Broad phase over contiguous NumPy arrays, resolving all distance checks in batches
+
+    Candidates are already filtered by the exact distance, so callers only apply the rules to real hits.
+    Requires `numpy` to be installed
+    """
+    name = "numpy"
+
+    def __init__(self, cell_size: float = 0) -> None: # same signature as `GridCollisions`
+        global np
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                raise RuntimeError(f"Collision engine '{self.name}' requires numpy to be installed") from None
+        self.clients = self._new_packed_array()
+        self.foods = self._new_packed_array()
+        self.cell_size = cell_size or 100
+        self._food_index: _CellIndex | None = None # until foods change
+
+    def _new_packed_array(self) -> _PackedArray:
+        return _PackedArray()
+
+    def add_client(self, cid: int, x: float, y: float, radius: float) -> None:
+        self.clients.add(cid, x, y, radius)
+
+    def update_client(self, cid: int, x: float, y: float, radius: float) -> None:
+        self.clients.update(cid, x, y, radius)
+
+    def remove_client(self, cid: int) -> None:
+        self.clients.remove(cid)
+
+    def add_food(self, key: FoodKey, x: float, y: float) -> None:
+        self.foods.add(key, x, y, 0)
+        self._food_index = None
+
+    def remove_food(self, key: FoodKey) -> None:
+        if key in self.foods.index:
+            self.foods.remove(key)
+            self._food_index = None
+
+    def _query(self, packed: _PackedArray, x: float, y: float, radius: float) -> list:
+        delta = packed.positions[:packed.count] - (x, y)
+        inside = np.abs(delta).max(axis=1) <= radius # same square as `SpatialHash.query`
+        return packed.sorted_keys(np.flatnonzero(inside))
+
+    def query_clients(self, x: float, y: float, radius: float) -> list[int]:
+        return self._query(self.clients, x, y, radius) # type: ignore
+
+    def query_foods(self, x: float, y: float, radius: float) -> list[FoodKey]:
+        if not self.foods.count:
+            return []
+        _rows, indices = self.food_index().within_reach(np.array([(x, y, radius)], dtype=np.float64), square=True)
+        return self.foods.sorted_keys(indices)
+
+    def food_index(self) -> _CellIndex:
+        """Foods by grid cell, built again after foods changed
+        """
+        if self._food_index is None:
+            foods = self.foods
+            self._food_index = _CellIndex(foods.positions[:foods.count], self.cell_size)
+        return self._food_index
+
+    def food_candidates(self, queries: list[tuple[float, float, float]]) -> list[list[FoodKey]]:
+        """Foods within reach of each `(x, y, reach)` query, in insertion order
+        """
+        foods = self.foods
+        if not queries or not foods.count:
+            return [[] for _ in queries]
+        block = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        rows, indices = self.food_index().within_reach(block)
+        keys = foods.keys
+        return [[keys[i] for i in row] for row in _group(rows, indices, len(block), foods.orders)]
+
+    def player_candidates(self, cid: int, x: float, y: float, radius: float) -> list[int]:
+        """Clients overlapping a circle at (`x`, `y`), in insertion order
+        """
+        clients = self.clients
+        delta = clients.positions[:clients.count] - (x, y)
+        dist_squared = np.einsum("ij,ij->i", delta, delta)
+        reach = clients.radii[:clients.count] + radius + 1e-6 # exact check is done by the caller
+        overlapping = dist_squared < reach * reach
+        overlapping[clients.index[cid]] = False
+        return clients.sorted_keys(np.flatnonzero(overlapping)) # type: ignore
+
+
+class _CellIndex:
+    """Positions sorted by grid cell, so a query only measures the positions in the cells its square touches,
+    and all of those distances are checked in one batch
+    """
+
+    def __init__(self, positions: np.ndarray, cell_size: float) -> None:
+        self.positions = positions
+        self.cell_size = cell_size
+        self.order = np.argsort(self.cell_keys(positions[:, 0], positions[:, 1]))
+        self.cells = self.cell_keys(*positions[self.order].T)
+
+    def cell_keys(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Sort key of the grid cell of each position, column by column
+        """
+        columns = np.floor(xs / self.cell_size).astype(np.int64)
+        rows = np.floor(ys / self.cell_size).astype(np.int64)
+        return (columns << 32) + (rows + (1 << 31))
+
+    def within_reach(self, block: np.ndarray, square: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """Positions closer than `reach` to each `(x, y, reach)` row of `block`,
+        or inside the square of half size `reach` if `square`, as `SpatialHash.query`
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: row of `block` and index of the position, for every hit
+        """
+        xs, ys, reaches = block.T
+        # one row per (query, grid column), then per (query, position in the cells of that column)
+        first_columns = np.floor((xs - reaches) / self.cell_size).astype(np.int64)
+        column_counts = np.floor((xs + reaches) / self.cell_size).astype(np.int64) - first_columns + 1
+        column_rows, columns = _expand(first_columns, column_counts)
+        first_keys = self.cell_keys(columns * self.cell_size, (ys - reaches)[column_rows])
+        last_keys = self.cell_keys(columns * self.cell_size, (ys + reaches)[column_rows])
+        starts = np.searchsorted(self.cells, first_keys, side="left")
+        ends = np.searchsorted(self.cells, last_keys, side="right")
+        hit_rows, sorted_indices = _expand(starts, ends - starts)
+        rows = column_rows[hit_rows]
+        indices = self.order[sorted_indices]
+        delta = self.positions[indices] - block[rows, :2]
+        reach = reaches[rows]
+        if square:
+            inside = np.abs(delta).max(axis=1) <= reach
+        else:
+            inside = np.einsum("ij,ij->i", delta, delta) < reach * reach
+        return rows[inside], indices[inside]
+
+
+def _group(rows: np.ndarray, indices: np.ndarray, row_count: int, orders: np.ndarray) -> list[list[int]]:
+    """`indices` of each row, in the order given by `orders`
+    """
+    by_row = np.lexsort((orders[indices], rows))
+    splits = np.searchsorted(rows[by_row], np.arange(1, row_count + 1)).tolist()
+    indices = indices[by_row].tolist()
+    groups: list[list[int]] = []
+    start = 0
+    for end in splits:
+        groups.append(indices[start:end])
+        start = end
+    return groups
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Every element of the ranges `starts[i]:starts[i] + counts[i]`, with the `i` of its range
+    """
+    rows = np.repeat(np.arange(len(starts)), counts)
+    elements = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    return rows, elements
+
+
+ENGINES: dict[str, type[GridCollisions] | type[NumpyCollisions]] = {
+    GridCollisions.name: GridCollisions,
+    NumpyCollisions.name: NumpyCollisions
+}
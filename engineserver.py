@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import socket
+from typing import Any, Sequence
+# dependencies
+from displaylib.template import Engine, networking # type: ignore
+# local imports
+from server import GameServer, make_argument_parser, configure
+import protocol
+
+# `GameServer` run by displaylib's engine loop and networking server, which also speaks the text protocol.
+# Kept apart from `server.py`, so headless servers and tools do not import the engine.
+# The default server, started with `python engineserver.py`
+
+
+class MainServer(GameServer, networking.Server, Engine):
+    request_batch = 128
+
+    def _on_start(self) -> None:
+        super()._on_start()
+        self.frame_writers: dict[socket.socket, protocol.FrameWriter] = {}
+
+    def _on_client_disconnected(self, connection: socket.socket, error: Exception) -> None:
+        super()._on_client_disconnected(connection, error)
+        self.frame_writers.pop(connection, None)
+
+    def _on_text_request(self, sender: socket.socket, request: bytes) -> None:
+        networking.Server._on_request_received(self, sender, request)
+
+    def _on_response(self, connection: socket.socket, response: networking.Response) -> None:
+        self.handle_text(connection, response.kind, response.data)
+
+    def send_frame(self, connection: socket.socket, frame: bytes) -> None:
+        writer = self.frame_writers.get(connection)
+        if writer is None:
+            writer = self.frame_writers[connection] = protocol.FrameWriter()
+        writer.write(frame)
+
+    def send_text(self, connection: socket.socket, kind: str, data: Sequence[Any]) -> None:
+        req = networking.Request(kind, data=data)
+        self.send_to(req, connection=connection)
+
+    def flush(self) -> None:
+        for connection, writer in self.frame_writers.items():
+            writer.flush(connection)
+
+
+def main() -> None:
+    args = make_argument_parser("Agar.io - Server").parse_args()
+    configure(args)
+    MainServer(host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
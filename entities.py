@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import socket
+from array import array
+from typing import TYPE_CHECKING, Iterator
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+# local imports
+from interest import InterestArea
+import simulation
+# type hinting
+if TYPE_CHECKING:
+    from displaylib.pygame import ColorValue # type: ignore
+
+# Server side entity state, as plain records and arrays instead of nodes, since the server draws nothing
+
+
+class Client:
+    """A joined connection and its player
+    """
+    __slots__ = ("cid", "connection", "interest", "color", "position", "radius",
+                 "move_budget", "move_timestamp", "pending_position", "direction", "input_start",
+                 "input_radii", "input_sequence", "input_steps", "input_changed", "step_lead")
+
+    def __init__(self, cid: int, connection: socket.socket, position: Vec2, color: ColorValue, move_timestamp: float) -> None:
+        self.cid = cid
+        self.connection = connection
+        self.interest = InterestArea() # players and foods nearby arrive with the next 'DELTA'
+        self.color = color
+        self.position = position
+        self.radius: float = simulation.INITIAL_RADIUS
+        self.move_budget: float = 0 # distance it may still move, see `GameServer.set_position`
+        self.move_timestamp = move_timestamp # when a position was last applied
+        self.pending_position: tuple[Vec2, int] | None = None # newest one that came too soon after, and its sequence
+        self.direction = Vec2(0, 0) # last input, when the server moves the client
+        self.input_start = position # where it started moving with `direction`
+        self.input_radii: list[tuple[int, float]] = [(0, self.radius)] # first step and radius of each stretch of the input
+        self.input_sequence: int = 0
+        self.input_steps: int = 0 # steps moved with `input_sequence`
+        self.input_changed: bool = False
+        self.step_lead: int = 0 # steps the client claimed beyond what the server moved it, over all inputs
+
+
+class FoodStore:
+    """Foods as parallel arrays indexed by slot, about 25 bytes each instead of a few objects per food
+
+    A food ID is its slot and the generation of that slot, so a freed slot is reused under a new ID,
+    which clients and interest areas never mistake for the food that had the slot before
+    """
+    SLOT_BITS: int = 20 # about a million foods at once
+    SLOT_MASK: int = (1 << SLOT_BITS) - 1
+    GENERATION_MASK: int = (1 << (32 - SLOT_BITS)) - 1 # IDs are sent as uint32
+
+    def __init__(self) -> None:
+        self.xs = array("d")
+        self.ys = array("d")
+        self.colors = array("B") # red, green, blue per slot
+        self.generations = array("I")
+        self.alive = bytearray()
+        self.free_slots: list[int] = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, food_id: int) -> bool:
+        slot = food_id & self.SLOT_MASK
+        return (slot < len(self.alive) and self.alive[slot] == 1
+                and self.generations[slot] == food_id >> self.SLOT_BITS)
+
+    def __iter__(self) -> Iterator[int]:
+        generations = self.generations
+        for slot, alive in enumerate(self.alive):
+            if alive:
+                yield slot | generations[slot] << self.SLOT_BITS
+
+    def add(self, x: float, y: float, red: int, green: int, blue: int) -> int:
+        """Stores a food in a free slot, or a new one
+
+        Returns:
+            int: ID of the food
+        """
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.xs[slot] = x
+            self.ys[slot] = y
+            self.colors[slot * 3:slot * 3 + 3] = array("B", (red, green, blue))
+            self.alive[slot] = 1
+        else:
+            slot = len(self.alive)
+            if slot > self.SLOT_MASK:
+                raise OverflowError(f"More than {self.SLOT_MASK + 1} foods")
+            self.xs.append(x)
+            self.ys.append(y)
+            self.colors.extend((red, green, blue))
+            self.generations.append(0)
+            self.alive.append(1)
+        self.count += 1
+        return slot | self.generations[slot] << self.SLOT_BITS
+
+    def remove(self, food_id: int) -> None:
+        if food_id not in self:
+            raise KeyError(food_id)
+        slot = food_id & self.SLOT_MASK
+        self.alive[slot] = 0
+        self.generations[slot] = (self.generations[slot] + 1) & self.GENERATION_MASK
+        self.free_slots.append(slot)
+        self.count -= 1
+
+    def position(self, food_id: int) -> tuple[float, float]:
+        """Position of a stored food, which is not checked for speed
+        """
+        slot = food_id & self.SLOT_MASK
+        return (self.xs[slot], self.ys[slot])
+
+    def color(self, food_id: int) -> tuple[int, int, int]:
+        start = (food_id & self.SLOT_MASK) * 3
+        colors = self.colors
+        return (colors[start], colors[start + 1], colors[start + 2])
@@ -1,16 +1,79 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
 # dependencies
 from displaylib.pygame import * # type: ignore
 import pygame
 # local imports
 from camera import Camera
+from spatial import SpatialHash
+import simulation
+# type hinting
+if TYPE_CHECKING:
+    from main import App
 
 
-class Food(Node2D):
-    color: ColorValue = color.BLACK
-    radius: int = 3
+class Food:
+    """Food known by the client, drawn by `FoodLayer` instead of being a node itself
+    """
+    __slots__ = ("position", "color")
+    radius: int = simulation.FOOD_RADIUS
+
+    def __init__(self, position: Vec2, color: ColorValue) -> None:
+        self.position = position
+        self.color = color
+
+
+class FoodLayer(Node2D):
+    """Draws every food inside the view in one `Surface.blits` call
+
+    Foods are indexed in a grid to find the visible ones, and drawn from a sprite cached per (color, radius)
+    """
+    root: App
+    CELL_SIZE: int = 128
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.grid: SpatialHash[int] = SpatialHash(self.CELL_SIZE)
+        self.foods: dict[int, Food] = {} # food ID: food
+        self.pool: list[Food] = [] # removed foods, reused by the next ones added
+        self.sprites: dict[tuple[tuple[int, ...], int], Surface] = {}
+
+    def add(self, food_id: int, x: float, y: float, food_color: ColorValue) -> Food:
+        if self.pool:
+            food = self.pool.pop()
+            food.position.x = x
+            food.position.y = y
+            food.color = food_color
+        else:
+            food = Food(Vec2(x, y), food_color)
+        self.foods[food_id] = food
+        self.grid.insert(food_id, x, y)
+        return food
+
+    def remove(self, food_id: int) -> None:
+        self.pool.append(self.foods.pop(food_id))
+        self.grid.discard(food_id)
+
+    def get_sprite(self, food_color: ColorValue, radius: int) -> Surface:
+        sprite_key = (tuple(food_color), radius)
+        sprite = self.sprites.get(sprite_key)
+        if sprite is None:
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, food_color, (radius, radius), radius)
+            self.sprites[sprite_key] = sprite
+        return sprite
 
     def _render(self, surface: Surface) -> None:
-        loc = self.get_global_position() - Camera.current.offset
-        pygame.draw.circle(surface, self.color, (loc).to_tuple(), self.radius)
+        offset = Camera.current.offset
+        width, height = surface.get_size()
+        # view square around the screen center, cells are clipped by the blit itself
+        view_radius = max(width, height) / 2 + Food.radius
+        visible = self.grid.query(offset.x + width / 2, offset.y + height / 2, view_radius, ordered=False)
+        foods = self.foods
+        blit_sequence = []
+        for food_id in visible:
+            food = foods[food_id]
+            blit_sequence.append((self.get_sprite(food.color, food.radius),
+                                  (food.position.x - offset.x - food.radius, food.position.y - offset.y - food.radius)))
+        surface.blits(blit_sequence, doreturn=False)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import math
+import random
+# local imports
+from entities import FoodStore
+
+
+class FoodField:
+    """Keeps the food count of every region of the world near a target density, refilling through a spawn budget
+
+    The budget grows with every tick by a fraction of the target, so eaten food comes back evenly over time
+    instead of in bursts, and a bigger world refills as fast as a small one relative to its size.
+    When `max_count` is below what the density asks for, every region's target is scaled down alike,
+    so food stays spread over the whole world. Foods spawn in small groups around a random point
+    of the region missing the most, ties broken at random
+    """
+
+    def __init__(self, foods: FoodStore, rng: random.Random, half_world_size: tuple[int, int], *,
+                 region_size: int, density: float, refill_rate: float, max_count: int,
+                 group_size: int, group_min_radius: int, group_max_radius: int, border_margin: int) -> None:
+        """
+        Args:
+            foods (FoodStore): store to spawn into and remove from
+            rng (random.Random): source of positions and colors
+            half_world_size (tuple[int, int]): half of the world size
+            region_size (int): side of a square region
+            density (float): foods per million square units
+            refill_rate (float): fraction of the target spawned per second at most
+            max_count (int): foods in the whole world at most
+            group_size (int): foods spawned around the same point at most
+            group_min_radius (int): offset of a food from its group point per axis, at least
+            group_max_radius (int): and at most
+            border_margin (int): distance kept from the world border
+        """
+        self.foods = foods
+        self.rng = rng
+        self.half_width, self.half_height = half_world_size
+        self.region_size = region_size
+        self.refill_rate = refill_rate
+        self.max_count = max_count
+        self.group_size = group_size
+        self.group_min_radius = group_min_radius
+        self.group_max_radius = group_max_radius
+        self.border_margin = border_margin
+        self.columns = math.ceil(self.half_width * 2 / region_size)
+        self.rows = math.ceil(self.half_height * 2 / region_size)
+        self.targets: list[int] = []
+        for row in range(self.rows):
+            height = min(region_size, self.half_height * 2 - row * region_size)
+            for column in range(self.columns):
+                width = min(region_size, self.half_width * 2 - column * region_size)
+                self.targets.append(round(width * height * density / 1_000_000))
+        if sum(self.targets) > max_count:
+            self.targets = self.scale_targets(self.targets, max_count)
+        self.target = sum(self.targets)
+        self.counts = [0] * len(self.targets)
+        self.budget = 0.0
+
+    def scale_targets(self, targets: list[int], total: int) -> list[int]:
+        """`targets` scaled down to add up to `total`, the remainder going to random regions
+        """
+        whole = sum(targets)
+        scaled = [target * total // whole for target in targets]
+        regions = [region for region, target in enumerate(targets) if target]
+        for region in self.rng.sample(regions, min(len(regions), total - sum(scaled))):
+            scaled[region] += 1
+        return scaled
+
+    def region_of(self, x: float, y: float) -> int:
+        column = min(self.columns - 1, max(0, int((x + self.half_width) // self.region_size)))
+        row = min(self.rows - 1, max(0, int((y + self.half_height) // self.region_size)))
+        return row * self.columns + column
+
+    def fill(self) -> list[int]:
+        """Spawns every region up to its target at once, for a new world
+
+        Returns:
+            list[int]: IDs of the spawned foods
+        """
+        return self._spawn(len(self.targets) * self.group_size + self.max_count)
+
+    def refill(self, delta: float) -> list[int]:
+        """Adds `delta` seconds worth of budget, and spawns as much of it as regions are missing
+
+        Returns:
+            list[int]: IDs of the spawned foods
+        """
+        per_second = self.target * self.refill_rate
+        self.budget = min(self.budget + per_second * delta, max(per_second, self.group_size)) # a second worth at most
+        if self.budget < 1:
+            return []
+        spawned = self._spawn(int(self.budget))
+        self.budget -= len(spawned)
+        if len(self.foods) >= self.target: # nothing missing, so nothing to save up for
+            self.budget = 0.0
+        return spawned
+
+    def remove(self, food_id: int) -> None:
+        self.counts[self.region_of(*self.foods.position(food_id))] -= 1
+        self.foods.remove(food_id)
+
+    def _spawn(self, budget: int) -> list[int]:
+        foods = self.foods
+        rng = self.rng
+        counts = self.counts
+        targets = self.targets
+        spawned: list[int] = []
+        missing = [region for region, target in enumerate(targets) if counts[region] < target]
+        rng.shuffle(missing) # `max` keeps the first of equally short regions
+        max_x = self.half_width - self.border_margin
+        max_y = self.half_height - self.border_margin
+        while missing and budget > 0 and len(foods) < self.max_count:
+            region = max(missing, key=lambda region: targets[region] - counts[region])
+            group = min(self.group_size, budget, targets[region] - counts[region], self.max_count - len(foods))
+            left = region % self.columns * self.region_size - self.half_width
+            top = region // self.columns * self.region_size - self.half_height
+            center_x = rng.randint(left, left + self.region_size - 1)
+            center_y = rng.randint(top, top + self.region_size - 1)
+            for _ in range(group):
+                x = center_x + rng.randint(self.group_min_radius, self.group_max_radius) * rng.choice((-1, 1))
+                y = center_y + rng.randint(self.group_min_radius, self.group_max_radius) * rng.choice((-1, 1))
+                x = min(max_x, max(-max_x, x))
+                y = min(max_y, max(-max_y, y))
+                color = rng.getrandbits(24)
+                food_id = foods.add(x, y, color >> 16, color >> 8 & 0xFF, color & 0xFF)
+                counts[self.region_of(x, y)] += 1 # may be a neighbour, near the edge
+                spawned.append(food_id)
+            budget -= group
+            missing = [region for region in missing if counts[region] < targets[region]]
+        return spawned
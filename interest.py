@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Callable, Hashable, Iterable, TypeVar
+
+Key = TypeVar("Key", bound=Hashable)
+
+
+def refresh(known: set[Key], candidates: Iterable[Key], position_of: Callable[[Key], tuple[float, float]],
+            center_x: float, center_y: float, view_radius: float) -> tuple[set[Key], list[Key], set[Key]]:
+    """Finds what is visible now, given candidates from a query around the center
+
+    Candidates already known stay visible as long as they are in the query,
+    new ones have to be inside the view square to enter, so only their positions are looked up
+
+    Returns:
+        tuple[set[Key], list[Key], set[Key]]: visible, entered and left keys
+    """
+    candidate_set = set(candidates)
+    visible = known & candidate_set
+    entered: list[Key] = []
+    for key in candidate_set - known:
+        x, y = position_of(key)
+        if abs(x - center_x) <= view_radius and abs(y - center_y) <= view_radius:
+            entered.append(key)
+    visible.update(entered)
+    left = known - visible
+    return (visible, entered, left)
+
+
+class InterestArea:
+    """Entities a single client has been told about, and therefore receives updates for
+
+    An entity enters when it is inside the view square, and leaves when it is outside the view square grown by hysteresis,
+    so entities on the border do not spawn and despawn every tick
+    """
+
+    def __init__(self) -> None:
+        self.players: set[int] = set()
+        self.foods: set[int] = set() # food IDs
+
+    def update_players(self, candidates: Iterable[int], position_of: Callable[[int], tuple[float, float]],
+                       center_x: float, center_y: float, view_radius: float) -> tuple[list[int], set[int]]:
+        self.players, entered, left = refresh(self.players, candidates, position_of, center_x, center_y, view_radius)
+        return (entered, left)
+
+    def update_foods(self, candidates: Iterable[int], position_of: Callable[[int], tuple[float, float]],
+                     center_x: float, center_y: float, view_radius: float) -> tuple[list[int], set[int]]:
+        self.foods, entered, left = refresh(self.foods, candidates, position_of, center_x, center_y, view_radius)
+        return (entered, left)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from collections import deque
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+
+
+class ServerClock:
+    """Estimates the server time from the time stamps in 'DELTA's, and how far behind it remote players are drawn
+
+    The offset follows the least delayed snapshot, so late ones are absorbed by the delay instead of shifting the clock
+    """
+    MIN_DELAY: float = 0.05 # seconds
+    MAX_DELAY: float = 0.5
+    DRIFT: float = 0.01 # how fast the offset follows snapshots that all arrive later
+    SMOOTHING: float = 0.1
+
+    def __init__(self) -> None:
+        self.offset: float | None = None # server time - local time
+        self.interval: float = self.MIN_DELAY # between snapshots
+        self.jitter: float = 0.0
+        self.last_server_time: float | None = None
+
+    def update(self, server_time: float, local_time: float) -> None:
+        sample = server_time - local_time
+        if self.offset is None or sample > self.offset:
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * self.DRIFT
+        self.jitter += (self.offset - sample - self.jitter) * self.SMOOTHING
+        if self.last_server_time is not None and server_time > self.last_server_time:
+            self.interval += (server_time - self.last_server_time - self.interval) * self.SMOOTHING
+        self.last_server_time = server_time
+
+    @property
+    def delay(self) -> float:
+        return min(self.MAX_DELAY, max(self.MIN_DELAY, self.interval + 2 * self.jitter))
+
+    def now(self, local_time: float) -> float:
+        return local_time + (self.offset or 0.0)
+
+    def render_time(self, local_time: float) -> float:
+        """Server time that remote players are drawn at, one snapshot interval and the jitter behind
+        """
+        return self.now(local_time) - self.delay
+
+
+class PositionBuffer:
+    """Time stamped positions of a remote player, sampled between the two surrounding ones
+    """
+    SIZE: int = 32
+    MAX_GAP: float = 0.25 # seconds, longer than `GameServer.BROADCAST_INTERVAL`, longer gaps mean the player stood still until shortly before
+
+    def __init__(self) -> None:
+        self.samples: deque[tuple[float, Vec2]] = deque(maxlen=self.SIZE)
+
+    def __bool__(self) -> bool:
+        return bool(self.samples)
+
+    def push(self, server_time: float, loc: Vec2) -> None:
+        if self.samples:
+            last_time = self.samples[-1][0]
+            if server_time < last_time: # older than what is buffered
+                return
+            if server_time == last_time:
+                self.samples.pop()
+            elif server_time - last_time > self.MAX_GAP: # moves are only sent when moved
+                self.samples.append((server_time - self.MAX_GAP, self.samples[-1][1]))
+        self.samples.append((server_time, loc))
+
+    def reset(self, server_time: float, loc: Vec2) -> None:
+        """Drops the buffered path, so a teleport is not interpolated across the world
+        """
+        self.samples.clear()
+        self.samples.append((server_time, loc))
+
+    def sample(self, render_time: float) -> Vec2:
+        samples = self.samples
+        while len(samples) > 2 and samples[1][0] <= render_time: # no longer needed
+            samples.popleft()
+        first_time, first_loc = samples[0]
+        if render_time <= first_time:
+            return first_loc
+        for next_time, next_loc in samples:
+            if next_time >= render_time:
+                weight = (render_time - first_time) / (next_time - first_time)
+                return first_loc.lerp(next_loc, weight)
+            first_time, first_loc = next_time, next_loc
+        return first_loc # newest one, until more arrive
@@ -1,7 +1,7 @@
 import subprocess
 # import keyboard
 
-
+# windowed bots, see `swarm.py` to load test with many headless ones
 INSTANCES: int = 5
 
 processes: list[subprocess.Popen] = []
@@ -9,9 +9,9 @@ for _ in range(INSTANCES):
     process = subprocess.Popen("python ./bot.py", shell=True)
     processes.append(process)
 
-# TODO: kill processes
-# while True:
-#     if keyboard.is_pressed("esc"):
-#         for process in processes:
-#             process.kill()
-#         break
+try:
+    for process in processes:
+        process.wait()
+except KeyboardInterrupt:
+    for process in processes:
+        process.kill()
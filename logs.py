@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import sys
+import time
+import logging
+
+# Leveled logging keeping the "[Info] ..." look of the old prints.
+# Every message template is rate limited on its own, so a burst of kills or rejected positions
+# under load costs a counter increment instead of a write per event
+
+LEVEL_NAMES: dict[int, str] = {
+    logging.DEBUG: "Debug",
+    logging.INFO: "Info",
+    logging.WARNING: "Warning",
+    logging.ERROR: "Error",
+    logging.CRITICAL: "Critical"
+}
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets `burst` records of each message template through per `interval` seconds
+
+    The first record let through after some were dropped tells how many
+    """
+
+    def __init__(self, burst: int = 10, interval: float = 1) -> None:
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows: dict[tuple[str, object], list] = {} # (logger, template): [window start, passed, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        window = self._windows.get((record.name, record.msg))
+        if window is None:
+            window = self._windows[(record.name, record.msg)] = [now, 0, 0]
+        elif now - window[0] >= self.interval:
+            window[0] = now
+            window[1] = 0
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+        window[1] += 1
+        if window[2]:
+            record.msg = f"{record.msg} (+{window[2]} suppressed)"
+            window[2] = 0
+        return True
+
+
+class Formatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"[{LEVEL_NAMES.get(record.levelno, record.levelname)}] {record.getMessage()}"
+
+
+ROOT = logging.getLogger("agario")
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(Formatter())
+_handler.addFilter(RateLimitFilter())
+ROOT.addHandler(_handler)
+ROOT.setLevel(logging.INFO)
+ROOT.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return ROOT.getChild(name)
+
+
+def configure(level: str = "info", burst: int = 10, interval: float = 1) -> None:
+    """Sets the level of all loggers, and how many records of a single message template pass per `interval` seconds
+    """
+    ROOT.setLevel(level.upper())
+    for log_filter in _handler.filters:
+        if isinstance(log_filter, RateLimitFilter):
+            log_filter.burst = burst
+            log_filter.interval = interval
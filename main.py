@@ -1,11 +1,20 @@
 # dependencies
 from displaylib.pygame import * # type: ignore
 import pygame
+import time
+import struct
+from typing import Any, Callable, Iterable, Sequence
 # local imports
 from camera import Camera
 from player import PlayerBase, Player
-from food import Food
+from food import Food, FoodLayer
+from spatial import SpatialHash
 from background import Background
+from overlay import DebugOverlay
+from metrics import KindTimings
+from interpolation import ServerClock
+import snapshot
+import protocol
 
 
 WORLD_SIZE = Vec2(2_000, 2_000)
@@ -17,17 +26,99 @@ class App(Engine, networking.Client):
     half_world_size = Vec2i.ONE * 100 # temp
     request_batch = 64
     response_batch = 128
+    PROTOCOL: str = "binary" # "binary" says 'HELLO' in a frame, "text" in a text request and does not negotiate
+    PLAYER_CELL_SIZE: int = 128
+    SHOW_HANDLER_TIMINGS: bool = False # debug overlay, also toggled with F3
 
     def _on_start(self) -> None:
         print("[Info] Client start")
         self.width
+        Camera.current = Camera()
         self.background = Background()
+        self.food_layer = FoodLayer()
         self.player = Player()
         self.floating_point = Node2D()
         self.players: dict[int, PlayerBase] = {-1: self.player}
-        self.foods: dict[tuple[float, float], Food] = {}
+        self.player_grid: SpatialHash[int] = SpatialHash(self.PLAYER_CELL_SIZE) # other players, for bots
+        self._max_radius: float = 0
+        self._max_radius_dirty = True
+        self.foods: dict[int, Food] = self.food_layer.foods # added and removed through the layer
+        self.frame_reader: protocol.FrameReader | None = None
+        self.frame_writer: protocol.FrameWriter | None = None # set once the server confirms binary
+        self.join_timestamp: float = time.perf_counter()
+        self.clock = ServerClock()
+        self.server_time: float = 0.0 # of the 'DELTA' being applied
+        self.render_time: float = 0.0 # server time remote players are drawn at
+        self.movement: str = "position" # until the server says to send inputs
+        self.pending_moves: dict[int, tuple[float, float]] = {} # cid: x and y
+        self.pending_radii: dict[int, float] = {} # cid: radius
+        self.handler_timings = KindTimings()
+        self.debug_overlay = DebugOverlay(z_index=100, visible=self.SHOW_HANDLER_TIMINGS)
+        # kind: handler, of the values `protocol.unpack` or `protocol.parse_text` give
+        self.handlers: dict[str, Callable[..., None]] = {
+            "ASSIGN_CID": self.assign_cid,
+            "SET_WORLD_SIZE": self.set_world_size,
+            "SET_INITIAL_POSITION": self.set_initial_position,
+            "SET_COLOR": self.set_color,
+            "SET_MOVEMENT": self.set_movement,
+            "FORCE_POSITION": self.on_force_position,
+            "SPAWN_PLAYER": self.spawn_player,
+            "MOVE_DUMMIE": self.on_move_player,
+            "SET_RADIUS": self.queue_radius,
+            "SET_DUMMIE_COLOR": self.set_player_color,
+            "SPAWN_FOOD": self.on_spawn_food,
+            "DESTROY_FOOD": self.destroy_food,
+        }
+        # kinds without a packed layout
+        self.text_handlers: dict[str, Callable[[list[str]], None]] = {
+            "DELTA": self.on_text_delta,
+            "WORLD_SNAPSHOT": self.on_text_world_snapshot,
+        }
+        self.binary_handlers: dict[str, Callable[[memoryview], None]] = {
+            "HELLO": self.on_binary_hello,
+            "DELTA": self.on_binary_delta,
+            "WORLD_SNAPSHOT": self.on_binary_world_snapshot,
+            "TEXT": self.on_binary_text,
+        }
+        if self.PROTOCOL == "binary": # as a frame, which servers speaking only binary understand too
+            hello = protocol.FrameWriter()
+            hello.write(protocol.encode("HELLO", [protocol.VERSION]))
+            hello.flush(self._socket)
+        else:
+            req = networking.Request("HELLO", data=[protocol.VERSION, self.PROTOCOL])
+            self.send(req)
     
+    def send_request(self, kind: str, data: Sequence[Any]) -> None:
+        """Sends using the negotiated protocol
+        """
+        if self.frame_writer is not None:
+            self.frame_writer.write(protocol.encode(kind, data))
+        else:
+            req = networking.Request(kind, data=data)
+            self.send(req)
+
+    def _on_response_received(self, response: bytes) -> None:
+        if self.frame_reader is None:
+            if not response.startswith(protocol.MAGIC_BYTE):
+                super()._on_response_received(response) # text response
+                return
+            self.frame_reader = protocol.FrameReader()
+        try:
+            frames = self.frame_reader.feed(response)
+        except ValueError as error:
+            print("[Warning] Invalid binary response:", error)
+            return
+        for kind, payload in frames:
+            try:
+                self._on_binary_response(kind, payload)
+            except struct.error:
+                print(f"[Warning] '{kind}' could not decode properly")
+
     def _update(self, _delta: float) -> None:
+        self.apply_pending()
+        if self.frame_writer is not None:
+            self.frame_writer.flush(self._socket)
+        self.render_time = self.clock.render_time(time.perf_counter())
         self.floating_point.position = self.floating_point.position.lerp(self.player.get_global_position(), 0.05)
         rel = self.player.get_global_position() - self.floating_point.position
         target = self.player.get_global_position() + rel
@@ -35,84 +126,254 @@ class App(Engine, networking.Client):
         self.bg_color = color.MAROON
 
     def _on_response(self, response: networking.Response) -> None:
-        # print(response.kind)
-        match response:
-            case networking.Response(kind="ASSIGN_CID", data=[cid]):
-                self.player.cid = int(cid)
-                del self.players[-1]
-                self.players[self.player.cid] = self.player # bind to given client ID
-
-            case networking.Response(kind="SET_WORLD_SIZE", data=[width, height]):
-                self.half_world_size = Vec2i(int(width) // 2, int(height) // 2)
-            
-            case networking.Response(kind="SET_INITIAL_POSITION", data=[x, y]):
-                loc = Vec2(float(x), float(y))
-                self.player.position = loc.copy()
-                self.player.visual_position = loc.copy()
-            
-            case networking.Response(kind="SPAWN_PLAYER", data=[cid, x, y]):
-                loc = Vec2(float(x), float(y))
-                player_dummie = PlayerBase()
-                player_dummie.position = loc
-                self.players[int(cid)] = player_dummie
-            
-            case networking.Response(kind="FORCE_POSITION", data=[cid, x, y]):
-                # print("FORCE POSITION:", f"Vec2({x}, {y}) of {cid}")
-                try:
-                    loc = Vec2(float(x), float(y))
-                except ValueError:
-                    print("[Warning] 'FORCE_POSITION': x or y could not decode properly")
-                    return
-                player = self.players[int(cid)]
-                player.position = loc.copy()
-                player.visual_position = loc.copy()
-                if player is self.player:
-                    self.floating_point.position = self.player.position.copy()
-                    self.player.time_chilled = 0 # reset chill time
-            
-            case networking.Response(kind="MOVE_DUMMIE", data=[cid, x, y]):
-                try:
-                    loc = Vec2(float(x), float(y))
-                except ValueError:
-                    print("[Warning] 'MOVE_DUMMIE' x or y could not decode properly")
-                    return
-                self.players[int(cid)].position = loc
-            
-            case networking.Response(kind="SET_COLOR", data=[r, g, b]):
-                self.player.color = color.rgb_color(int(r), int(g), int(b))
-            
-            case networking.Response(kind="SET_DUMMIE_COLOR", data=[cid, red, green, blue]):
-                self.players[int(cid)].color = color.rgb_color(int(red), int(green), int(blue))
-            
-            case networking.Response(kind="SPAWN_FOOD", data=[x, y, red, green, blue]):
-                loc = Vec2(int(x), int(y))
-                food = Food()
-                food.position = loc
-                try:
-                    food.color = color.rgb_color(int(red), int(green), int(blue))
-                except ValueError:
-                    print("[Warning] 'SPAWN_FOOD' red or green or blue could not decode properly")
-                    food.color = color.rand_color()
-                self.foods[loc.to_tuple()] = food
-            
-            case networking.Response(kind="SET_RADIUS", data=[cid, radius]):
-                try:
-                    self.players[int(cid)].radius = float(radius)
-                except ValueError:
-                    print("[Warning] 'SET_RADIUS' cid or radius could not decode properly")
-                    return
-
-            case networking.Response(kind="DESTROY_FOOD", data=[x, y]):
-                try:
-                    key = (int(x), int(y))
-                except ValueError:
-                    print("[Warning] 'DESTROY_FOOD': x or y could not decode properly")
-                    return
-                try:
-                    self.foods[key].queue_free()
-                    del self.foods[key]
-                except KeyError:
-                    return
+        kind = response.kind
+        start = time.perf_counter()
+        text_handler = self.text_handlers.get(kind)
+        if text_handler is not None:
+            text_handler(response.data)
+        elif kind in self.handlers:
+            try:
+                values = protocol.parse_text(kind, response.data)
+            except ValueError:
+                print(f"[Warning] '{kind}' could not decode properly")
+                return
+            self.handlers[kind](*values)
+        self.handler_timings.add(kind, time.perf_counter() - start)
+
+    def _on_binary_response(self, kind: str, payload: memoryview) -> None:
+        start = time.perf_counter()
+        binary_handler = self.binary_handlers.get(kind)
+        if binary_handler is not None:
+            binary_handler(payload)
+        elif kind in self.handlers:
+            self.handlers[kind](*protocol.unpack(kind, payload))
+        self.handler_timings.add(kind, time.perf_counter() - start)
+
+    def on_text_delta(self, data: list[str]) -> None:
+        try:
+            self.apply_delta(snapshot.parse_sections(data))
+        except (ValueError, KeyError, IndexError):
+            print("[Warning] 'DELTA' could not decode properly")
+
+    def on_text_world_snapshot(self, data: list[str]) -> None:
+        try:
+            index, count, *sections = data
+            self.apply_delta(snapshot.parse_sections(sections))
+        except (ValueError, KeyError, IndexError):
+            print("[Warning] 'WORLD_SNAPSHOT' could not decode properly")
+            return
+        if int(index) + 1 == int(count):
+            self.on_world_received(int(count))
+
+    def on_binary_hello(self, _payload: memoryview) -> None:
+        self.frame_writer = protocol.FrameWriter()
+
+    def on_binary_delta(self, payload: memoryview) -> None:
+        self.apply_delta(protocol.iter_delta(payload))
+
+    def on_binary_world_snapshot(self, payload: memoryview) -> None:
+        index, count = protocol.CHUNK_HEADER.unpack_from(payload)
+        self.apply_delta(protocol.iter_delta(payload[protocol.CHUNK_HEADER.size:]))
+        if index + 1 == count:
+            self.on_world_received(count)
+
+    def on_binary_text(self, payload: memoryview) -> None:
+        text_kind, data = protocol.unpack_text(payload)
+        self._on_response(networking.Response(text_kind, data=data))
+
+    def assign_cid(self, cid: int) -> None:
+        self.player.cid = cid
+        del self.players[-1]
+        self.players[self.player.cid] = self.player # bind to given client ID
+
+    def set_world_size(self, width: int, height: int) -> None:
+        self.half_world_size = Vec2i(width // 2, height // 2)
+
+    def set_initial_position(self, x: float, y: float) -> None:
+        loc = Vec2(x, y)
+        self.player.position = loc.copy()
+        self.player.visual_position = loc.copy()
+
+    def set_color(self, red: int, green: int, blue: int) -> None:
+        self.player.color = color.rgb_color(red, green, blue)
+
+    def set_movement(self, mode: int) -> None:
+        self.movement = "input" if mode else "position"
+
+    def on_force_position(self, cid: int, x: float, y: float) -> None:
+        self.force_position(cid, Vec2(x, y))
+
+    def spawn_player(self, cid: int, x: float, y: float) -> None:
+        self.despawn_player(cid)
+        self.players[cid] = PlayerBase()
+        self.move_player(cid, Vec2(x, y), self.clock.now(time.perf_counter()))
+
+    def set_player_color(self, cid: int, red: int, green: int, blue: int) -> None:
+        self.players[cid].color = color.rgb_color(red, green, blue)
+
+    def on_spawn_food(self, food_id: int, x: float, y: float, red: int, green: int, blue: int) -> None:
+        self.spawn_food(food_id, x, y, color.rgb_color(red, green, blue))
+
+    def on_move_player(self, cid: int, x: float, y: float) -> None:
+        self.queue_move(cid, x, y, self.clock.now(time.perf_counter())) # not time stamped
+
+    def queue_move(self, cid: int, x: float, y: float, server_time: float) -> None:
+        """Buffers every move of a remote player for interpolation, and keeps the last one until the next frame applies it
+        """
+        player = self.players.get(cid)
+        if player is None or player is self.player: # own moves are local
+            return
+        player.positions.push(server_time, Vec2(x, y)) # 'DELTA's arriving together still each add a sample
+        if cid in self.pending_moves:
+            self.handler_timings.count("coalesced_moves")
+        self.pending_moves[cid] = (x, y)
+
+    def queue_radius(self, cid: int, radius: float) -> None:
+        """Keeps the last radius of a player until the next frame applies it
+        """
+        if cid not in self.players:
+            return
+        if cid in self.pending_radii:
+            self.handler_timings.count("coalesced_radii")
+        self.pending_radii[cid] = radius
+
+    def apply_pending(self) -> None:
+        """Applies the moves and radii received since the previous frame, only the last one of each player
+        """
+        start = time.perf_counter()
+        players = self.players
+        for cid, (x, y) in self.pending_moves.items():
+            self.place_player(cid, Vec2(x, y))
+        self.pending_moves.clear()
+        for cid, radius in self.pending_radii.items():
+            players[cid].radius = radius
+            self._max_radius_dirty = True
+        self.pending_radii.clear()
+        self.handler_timings.add("(apply pending)", time.perf_counter() - start)
+
+    def on_world_received(self, chunks: int) -> None:
+        join_latency = time.perf_counter() - self.join_timestamp
+        print(f"[Info] Received world in {join_latency * 1000:.1f} ms ({chunks} chunks,",
+              f"{len(self.players) - 1} players, {len(self.foods)} foods)")
+        self.send_request("WORLD_READY", [])
+
+    def force_position(self, cid: int, loc: Vec2) -> None:
+        player = self.players[cid]
+        self.pending_moves.pop(cid, None) # received before, so older
+        player.position = loc.copy()
+        player.visual_position = loc.copy()
+        if player is self.player:
+            self.floating_point.position = self.player.position.copy()
+            self.player.time_chilled = 0 # reset chill time
+            self.player.reset_prediction() # positions sent before are not replayed
+        else:
+            player.positions.reset(self.server_time, loc.copy())
+            self.player_grid.insert(cid, loc.x, loc.y)
+
+    def move_player(self, cid: int, loc: Vec2, server_time: float) -> None:
+        self.players[cid].positions.push(server_time, loc)
+        self.place_player(cid, loc)
+
+    def place_player(self, cid: int, loc: Vec2) -> None:
+        """Latest position of a player, without buffering it for interpolation
+        """
+        self.players[cid].position = loc
+        self.player_grid.insert(cid, loc.x, loc.y)
+
+    def nearest_food(self, loc: Vec2, max_range: float) -> Food | None:
+        """Closest food within `max_range` of `loc`, from the food grid
+        """
+        foods = self.foods
+        food_id = self.food_layer.grid.nearest(loc.x, loc.y, max_range,
+                                               position_of=lambda food_id: foods[food_id].position.to_tuple())
+        return None if food_id is None else foods[food_id]
+
+    @property
+    def max_radius(self) -> float:
+        """Largest radius of any known player, which may be past `simulation.MAX_RADIUS` after eating a player
+        """
+        if self._max_radius_dirty:
+            self._max_radius = max((player.radius for player in self.players.values()), default=0)
+            self._max_radius_dirty = False
+        return self._max_radius
+
+    def nearby_players(self, loc: Vec2, max_range: float) -> list[PlayerBase]:
+        """Other players whose edge is within `max_range` of `loc`
+        """
+        players: list[PlayerBase] = []
+        for cid in self.player_grid.query(loc.x, loc.y, max_range + self.max_radius):
+            player = self.players[cid]
+            if loc.distance_to(player.position) - player.radius < max_range:
+                players.append(player)
+        return players
+
+    def spawn_food(self, food_id: int, x: float, y: float, food_color: ColorValue) -> None:
+        if food_id in self.foods: # ID reused since it was eaten, or already known from joining mid tick
+            self.food_layer.remove(food_id)
+        self.food_layer.add(food_id, x, y, food_color)
+
+    def destroy_food(self, food_id: int) -> None:
+        if food_id in self.foods:
+            self.food_layer.remove(food_id)
+
+    def apply_delta(self, sections: Iterable[tuple[str, Iterable[tuple[Any, ...]]]]) -> None:
+        self.server_time = self.clock.now(time.perf_counter()) # unless time stamped
+        for tag, records in sections:
+            match tag:
+                case snapshot.TIME:
+                    for (server_time,) in records:
+                        self.server_time = server_time
+                        self.clock.update(server_time, time.perf_counter())
+                case snapshot.MOVES:
+                    for cid, x, y in records:
+                        self.queue_move(cid, x, y, self.server_time)
+                case snapshot.CORRECTIONS:
+                    for cid, sequence, x, y in records:
+                        if cid == self.player.cid:
+                            self.player.reconcile(sequence, Vec2(x, y))
+                case snapshot.ACKS:
+                    for cid, sequence, steps, x, y in records:
+                        if cid == self.player.cid:
+                            self.player.reconcile_input(sequence, steps, Vec2(x, y), self.half_world_size)
+                case snapshot.FORCED:
+                    for cid, x, y in records:
+                        if cid in self.players:
+                            self.force_position(cid, Vec2(x, y))
+                case snapshot.RADII:
+                    for cid, radius in records:
+                        self.queue_radius(cid, radius)
+                case snapshot.FOODS_ADDED:
+                    for food_id, x, y, red, green, blue in records:
+                        self.spawn_food(food_id, x, y, color.rgb_color(red, green, blue))
+                case snapshot.FOODS_REMOVED:
+                    for (food_id,) in records:
+                        self.destroy_food(food_id)
+                case snapshot.PLAYERS_ADDED:
+                    for cid, x, y, radius, red, green, blue in records:
+                        self.despawn_player(cid)
+                        loc = Vec2(x, y)
+                        player_dummie = PlayerBase()
+                        player_dummie.visual_position = loc.copy()
+                        player_dummie.radius = radius
+                        player_dummie.visual_radius = radius
+                        player_dummie.color = color.rgb_color(red, green, blue)
+                        self.players[cid] = player_dummie
+                        self._max_radius_dirty = True
+                        self.move_player(cid, loc, self.server_time)
+                case snapshot.PLAYERS_REMOVED:
+                    for (cid,) in records:
+                        self.despawn_player(cid)
+
+    def despawn_player(self, cid: int) -> None:
+        player = self.players.get(cid)
+        if player is None or player is self.player:
+            return
+        self.pending_moves.pop(cid, None)
+        self.pending_radii.pop(cid, None)
+        player.queue_free()
+        del self.players[cid]
+        self._max_radius_dirty = True
+        self.player_grid.discard(cid)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import sys
+import json
+import time
+import socket
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+# optional dependencies
+try:
+    import resource # not on Windows
+except ImportError:
+    resource = None
+# type hinting
+if TYPE_CHECKING:
+    import cProfile
+
+TICK_SECTIONS: tuple[str, ...] = ("movement", "food_spawn", "food_collision", "player_collision", "broadcast")
+
+
+def max_rss_kib() -> int:
+    """Peak resident memory of this process, or 0 where it is unknown
+    """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss # bytes on macOS
+
+
+class RingBuffer:
+    """Last `size` samples, for percentiles without keeping the whole history
+    """
+
+    def __init__(self, size: int = 1024) -> None:
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def append(self, sample: float) -> None:
+        self.samples.append(sample)
+
+    def percentiles(self, *fractions: float) -> list[float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0 for _ in fractions]
+        last = len(ordered) - 1
+        return [ordered[min(last, int(fraction * len(ordered)))] for fraction in fractions]
+
+
+class TickMetrics:
+    """Timings of every tick split into sections, and traffic counted by message kind
+
+    A tick is timed with `start_tick`, then `lap(section)` after each section and `end_tick`
+    """
+
+    def __init__(self, sections: Iterable[str] = TICK_SECTIONS, size: int = 1024) -> None:
+        self.sections: dict[str, RingBuffer] = {section: RingBuffer(size) for section in sections}
+        self.ticks = RingBuffer(size)
+        self.ticks_total = 0
+        self.late_ticks = 0
+        self.sent: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0]) # kind: [messages, bytes]
+        self.received: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0])
+        self.gauges: dict[str, int] = {} # connections, clients, foods...
+        self.counters: defaultdict[str, int] = defaultdict(int) # coalesced updates, dropped positions...
+        self._tick_start = 0.0
+        self._lap_start = 0.0
+
+    def start_tick(self) -> None:
+        self._tick_start = self._lap_start = time.perf_counter()
+
+    def lap(self, section: str) -> None:
+        now = time.perf_counter()
+        self.sections[section].append(now - self._lap_start)
+        self._lap_start = now
+
+    def end_tick(self) -> None:
+        self.ticks.append(time.perf_counter() - self._tick_start)
+        self.ticks_total += 1
+
+    def count_sent(self, kind: str, size: int, messages: int = 1) -> None:
+        counter = self.sent[kind]
+        counter[0] += messages
+        counter[1] += size
+
+    def count_received(self, kind: str, size: int) -> None:
+        counter = self.received[kind]
+        counter[0] += 1
+        counter[1] += size
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def reset_traffic(self) -> None:
+        self.sent.clear()
+        self.received.clear()
+        self.counters.clear()
+        self.late_ticks = 0
+
+    def report(self) -> dict[str, Any]:
+        """Plain data for a structured log line or the stats endpoint, with times in milliseconds
+        """
+        tick_p50, tick_p99 = self.ticks.percentiles(0.5, 0.99)
+        sections: dict[str, dict[str, float]] = {}
+        for section, samples in self.sections.items():
+            p50, p99 = samples.percentiles(0.5, 0.99)
+            sections[section] = {"p50": round(p50 * 1000, 3), "p99": round(p99 * 1000, 3)}
+        return {
+            "ticks": self.ticks_total,
+            "late_ticks": self.late_ticks,
+            "tick_ms": {"p50": round(tick_p50 * 1000, 3), "p99": round(tick_p99 * 1000, 3)},
+            "sections_ms": sections,
+            "sent": {kind: {"messages": messages, "bytes": size} for kind, (messages, size) in self.sent.items()},
+            "received": {kind: {"messages": messages, "bytes": size} for kind, (messages, size) in self.received.items()},
+            "counters": dict(self.counters),
+            **self.gauges
+        }
+
+
+class KindTimings:
+    """Calls and seconds spent per message kind, summed over windows of `window` seconds
+
+    For the client, whose handlers run as messages arrive instead of in a tick
+    """
+
+    def __init__(self, window: float = 1.0) -> None:
+        self.window = window
+        self.current: defaultdict[str, list[float]] = defaultdict(lambda: [0, 0.0]) # kind: [calls, seconds]
+        self.counters: defaultdict[str, int] = defaultdict(int)
+        self.last: dict[str, tuple[int, float]] = {} # of the window before, which is complete
+        self.last_counters: dict[str, int] = {}
+        self.last_seconds: float = 0.0 # length of that window, as it ends with the first call after `window`
+        self.window_start = time.perf_counter()
+
+    def add(self, kind: str, seconds: float) -> None:
+        entry = self.current[kind]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def roll(self, now: float) -> bool:
+        """Starts the next window once this one is over
+
+        Returns:
+            bool: whether `last` changed
+        """
+        if now - self.window_start < self.window:
+            return False
+        self.last = {kind: (int(calls), seconds) for kind, (calls, seconds) in self.current.items()}
+        self.last_counters = dict(self.counters)
+        self.last_seconds = now - self.window_start
+        self.current.clear()
+        self.counters.clear()
+        self.window_start = now
+        return True
+
+
+class TickProfiler:
+    """Runs `cProfile` on every `every`-th tick, accumulating into one profile written to `path`
+
+    `cProfile` is only imported once a tick is profiled, as most servers never profile
+    """
+
+    def __init__(self, every: int, path: str) -> None:
+        self.every = every
+        self.path = path
+        self.profile: cProfile.Profile | None = None
+        self._tick = 0
+        self._is_profiling = False
+
+    def start_tick(self) -> None:
+        self._tick += 1
+        if self.every and self._tick % self.every == 0:
+            if self.profile is None:
+                import cProfile
+                self.profile = cProfile.Profile()
+            self._is_profiling = True
+            self.profile.enable()
+
+    def end_tick(self) -> None:
+        if self._is_profiling:
+            self.profile.disable() # type: ignore[union-attr]
+            self._is_profiling = False
+
+    def dump(self) -> None:
+        if self.profile is None or not self.profile.getstats():
+            return
+        import pstats
+        pstats.Stats(self.profile).dump_stats(self.path)
+
+
+class StatsEndpoint:
+    """Local HTTP endpoint answering every request with a fresh report as JSON
+
+    Polled from the tick instead of running its own thread, so the report is never made mid tick
+    """
+    TIMEOUT: float = 0.01 # seconds a stats request may hold up the tick
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081) -> None:
+        self._socket = socket.create_server((host, port))
+        self._socket.setblocking(False)
+
+    def poll(self, make_report: Callable[[], dict[str, Any]]) -> None:
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                connection.settimeout(self.TIMEOUT)
+                connection.recv(4096) # the request itself does not matter
+                body = json.dumps(make_report()).encode("utf-8")
+                connection.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n"
+                                   + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+            except OSError:
+                pass
+            finally:
+                connection.close()
+
+    def close(self) -> None:
+        self._socket.close()
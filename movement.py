@@ -5,16 +5,19 @@ from typing import TYPE_CHECKING as _TYPE_CHECKING
 from displaylib.math import Vec2 as _Vec2
 from displaylib.ascii import keyboard as _keyboard
 
+import simulation as _simulation
+
 if _TYPE_CHECKING:
     from typing import Protocol as _Protocol
     from displaylib.template.type_hints import NodeType as _NodeType, Transform2DMixin as _Transform2DMixin, UpdateFunction as _UpdateFunction
     from displaylib.ascii import keyboard as _keyboard
 
     class _ValidMovementNode(_Transform2DMixin, _Protocol):
+        timestep: _simulation.FixedTimestep
         @property
-        def speed(self) -> _Vec2: ...
-        @speed.setter
-        def speed(self, value: _Vec2) -> None: ...
+        def radius(self) -> float: ...
+        @radius.setter
+        def radius(self, value: float) -> None: ...
         @property
         def is_chilling(self) -> float: ...
         @is_chilling.setter
@@ -22,25 +25,34 @@ if _TYPE_CHECKING:
 
 
 class Movement: # Component (mixin class)
-    speed: _Vec2 = _Vec2.ONE
+    """Moves by the keyboard, in fixed `simulation.TIMESTEP` steps whatever the frame rate
+    """
 
     def __new__(cls: type[_NodeType], *args, **kwargs) -> _NodeType:
         instance = super().__new__(cls, *args, **kwargs) # type: _ValidMovementNode  # type: ignore
+        instance.timestep = _simulation.FixedTimestep()
         instance._update = instance._movement_update_wrapper(instance._update) # type: ignore
         return instance # type: ignore
     
     def _movement_update_wrapper(self: _ValidMovementNode, update_function: _UpdateFunction) -> _UpdateFunction:
         def _update(delta: float):
             if not self.is_chilling: # from Player class
-                direction = _Vec2.ZERO
+                direction = _Vec2(0, 0)
                 if _keyboard.is_pressed("D"):
-                    direction.x += delta
+                    direction.x += 1
                 if _keyboard.is_pressed("A"):
-                    direction.x -= delta
+                    direction.x -= 1
                 if _keyboard.is_pressed("W"):
-                    direction.y -= delta
+                    direction.y -= 1
                 if _keyboard.is_pressed("S"):
-                    direction.y += delta
-                self.position += direction.normalized() * self.speed
+                    direction.y += 1
+                for _ in range(self.timestep.advance(delta)):
+                    step_direction = self._on_input(direction)
+                    self.position = _simulation.step(self.position, step_direction, self.radius, self.root.half_world_size)
             update_function(delta)
         return _update
+
+    def _on_input(self, direction: _Vec2) -> _Vec2:
+        """Called with the keyboard direction before every step, returns the direction to step with
+        """
+        return direction
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+# dependencies
+from displaylib.pygame import * # type: ignore
+import pygame
+# type hinting
+if TYPE_CHECKING:
+    from main import App
+
+
+class DebugOverlay(Node2D):
+    """Time spent handling each message kind over the last second, toggled with F3
+
+    Lines are only rendered again when a new second of timings is complete, and blitted from then on
+    """
+    root: App
+    TOGGLE_KEY: int = pygame.K_F3
+    FONT_SIZE: int = 14
+    MAX_KINDS: int = 12 # slowest kinds listed
+    MARGIN: int = 8
+
+    def __init__(self, *args, visible: bool = False, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.visible = visible
+        self.font: pygame.font.Font | None = None # loaded when first shown
+        self.lines: list[Surface] = []
+
+    def _input(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.KEYDOWN and event.key == self.TOGGLE_KEY:
+            self.visible = not self.visible
+
+    def _update(self, _delta: float) -> None:
+        timings = self.root.handler_timings
+        if timings.roll(time.perf_counter()) and self.visible:
+            self.lines = [self.font_surface(text) for text in self.make_text()]
+
+    def make_text(self) -> list[str]:
+        timings = self.root.handler_timings
+        window = timings.last_seconds or timings.window
+        text = [f"{'kind':<22}{'calls/s':>9}{'ms/s':>9}{'us/call':>9}"]
+        slowest = sorted(timings.last.items(), key=lambda item: -item[1][1])
+        for kind, (calls, seconds) in slowest[:self.MAX_KINDS]:
+            text.append(f"{kind:<22}{calls / window:>9.0f}{seconds * 1000 / window:>9.2f}{seconds * 1e6 / max(1, calls):>9.1f}")
+        for name, amount in sorted(timings.last_counters.items()):
+            text.append(f"{name:<22}{amount / window:>9.0f}")
+        return text
+
+    def font_surface(self, text: str) -> Surface:
+        if self.font is None:
+            self.font = pygame.font.SysFont("monospace", self.FONT_SIZE)
+        return self.font.render(text, True, color.BLACK, color.WHITE)
+
+    def _render(self, surface: Surface) -> None:
+        if not self.visible:
+            return
+        y = self.MARGIN
+        for line in self.lines:
+            surface.blit(line, (self.MARGIN, y))
+            y += line.get_height()
@@ -6,7 +6,10 @@ from displaylib.pygame import * # type: ignore
 import pygame
 # local imports
 from camera import Camera
+import simulation
 from movement import Movement
+from prediction import Prediction
+from interpolation import PositionBuffer
 # type hinting
 if TYPE_CHECKING:
     from main import App
@@ -15,50 +18,65 @@ if TYPE_CHECKING:
 class PlayerBase(Node2D):
     root: App
     default_process_priority = 1
-    MAX_RADIUS = 100
-    SPEED_MODIFIER = 10
     color: ColorValue = color.BLACK
-    radius: float = 10
+    radius: float = simulation.INITIAL_RADIUS
     visual_radius: float = radius
     cid = -1 # -1 is not ID set
     visual_position = Vec2.ZERO
-    speed = Vec2.ONE * ((MAX_RADIUS - radius +1) * SPEED_MODIFIER +1)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.positions = PositionBuffer() # time stamped by the server, for remote players
 
     def _update(self, _delta: float) -> None:
         self.visual_radius = lerp(self.visual_radius, self.radius, 0.05)
-        self.visual_position = self.visual_position.lerp(self.get_global_position(), 0.25)
-        self.speed = Vec2.ONE * ((self.MAX_RADIUS - self.radius +1) * self.SPEED_MODIFIER +1)
+        if self.positions: # drawn a bit in the past, between the two surrounding snapshots
+            self.visual_position = self.positions.sample(self.root.render_time)
+        else:
+            self.visual_position = self.visual_position.lerp(self.get_global_position(), 0.25)
 
     def _render(self, surface: Surface) -> None:
         loc = self.visual_position - Camera.current.offset
-        pygame.draw.circle(surface, self.color, (loc).to_tuple(), self.visual_radius)
+        radius = self.visual_radius
+        width, height = surface.get_size()
+        if loc.x + radius < 0 or loc.y + radius < 0 or loc.x - radius > width or loc.y - radius > height: # off-screen
+            return
+        pygame.draw.circle(surface, self.color, (loc).to_tuple(), radius)
     
 
-class Player(PlayerBase, Movement):
+class Player(PlayerBase, Movement, Prediction):
     default_process_priority = 2
-    MAX_RADIUS = 100
-    SPEED_MODIFIER = 0.02
     CHILL_TIME: float = 0.3
     time_chilled: float = CHILL_TIME
     last_position = Vec2.ZERO
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.reset_prediction()
+
     @property
     def is_chilling(self) -> bool:
         return self.time_chilled <= self.CHILL_TIME
 
+    def _on_input(self, direction: Vec2) -> Vec2:
+        if self.root.movement != "input" or self.cid == -1:
+            return direction
+        data = self.next_input(self.get_global_position(), direction) # only sent when it changes
+        if data is not None:
+            self.root.send_request("SET_INPUT", [self.cid, *data])
+        return self.sent_direction # as the server moves with it
+
     def _update(self, delta: float) -> None:
         self.time_chilled += delta
         if self.is_chilling: # frozen a bit after forced position
             return
-        self.radius = min(self.MAX_RADIUS, self.radius)
-        super()._update(delta)
-        self.visual_position = self.get_global_position() # override
+        self.radius = min(simulation.MAX_RADIUS, self.radius)
+        super()._update(delta) # moved by `Movement` before this
         # send request
-        loc = self.get_global_position()
-        half_boundary = self.root.half_world_size - (Vec2i.ONE * int(self.visual_radius))
-        valid_loc = loc.clamped(-half_boundary, half_boundary)
+        valid_loc = simulation.clamp_to_world(self.get_global_position(), self.radius, self.root.half_world_size)
         self.set_global_position(valid_loc)
-        if self.get_global_position().distance_to(self.last_position) > 0.5: # moved more than 0.5
-            req = networking.Request("SET_POSITION", data=[self.cid, *self.get_global_position().to_tuple()])
-            self.root.send(req)
-        self.last_position = self.get_global_position()
+        self.visual_position = valid_loc + self.ease_correction() # override
+        if self.root.movement == "position" and valid_loc.distance_to(self.last_position) > 0.5: # moved more than 0.5
+            sequence = self.record_sent(valid_loc)
+            self.root.send_request("SET_POSITION", [self.cid, *valid_loc.to_tuple(), sequence])
+        self.last_position = valid_loc
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from collections import deque
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+# local imports
+import simulation
+
+
+class Prediction: # Component (mixin class)
+    """Sequences sent positions or inputs, so where the server has the player can be replayed onto the predicted position
+
+    When sending positions, the server only corrects rejected ones, with where it still has the player.
+    When sending inputs, the server acknowledges where it moved the player after some steps with an input.
+    Either way, everything moved since then is kept, by shifting the prediction by the error at that point.
+    Expects `position`, `radius` and `last_position` (of the previous update) on the class it is mixed into
+    """
+    HISTORY_SIZE: int = 256 # sent positions kept, about 4 seconds at 60 updates per second
+    CORRECTION_SMOOTHING: float = 0.2 # of the visual error removed per update
+    CORRECTION_THRESHOLD: float = 0.5 # smaller errors from acknowledged inputs are left alone
+    INPUT_THRESHOLD: float = 0.2 # about 11 degrees, steering changes smaller than this are not sent
+    sequence: int = 0 # 0 is unsequenced
+    correction = Vec2.ZERO # visual offset still left from corrections
+    position: Vec2
+    radius: float
+    last_position: Vec2
+
+    def reset_prediction(self) -> None:
+        self.sent_positions: deque[tuple[int, Vec2]] = deque(maxlen=self.HISTORY_SIZE)
+        # sequence, start, direction, and first step and radius of each stretch moved at one radius
+        self.sent_inputs: deque[tuple[int, Vec2, Vec2, list[tuple[int, float]]]] = deque(maxlen=self.HISTORY_SIZE)
+        self.sent_direction: Vec2 | None = None # sent again after a reset
+        self.input_steps = 0 # steps moved with the last sent input
+        self.correction = Vec2.ZERO
+
+    def record_sent(self, loc: Vec2) -> int:
+        """Returns the sequence to send along with `loc`
+        """
+        self.sequence += 1
+        self.sent_positions.append((self.sequence, loc))
+        return self.sequence
+
+    def input_changed(self, direction: Vec2) -> bool:
+        """Whether `direction` from steering differs enough from the last sent input to send it
+        """
+        if self.sent_direction is None:
+            return True
+        if direction.x == 0 and direction.y == 0:
+            return self.sent_direction.x != 0 or self.sent_direction.y != 0
+        return self.sent_direction.distance_to(direction.normalized()) > self.INPUT_THRESHOLD
+
+    def next_input(self, loc: Vec2, direction: Vec2) -> tuple[int, int, int, int] | None:
+        """Called once per step before moving with `sent_direction`, which is `direction` as the server sees it
+
+        Args:
+            loc (Vec2): position before the step
+            direction (Vec2): wanted direction
+
+        Returns:
+            tuple[int, int, int, int] | None: 'SET_INPUT' data after the cid if the input changed, else None
+        """
+        data: tuple[int, int, int, int] | None = None
+        if self.input_changed(direction):
+            x, y = simulation.encode_direction(direction)
+            self.sequence += 1
+            self.sent_direction = simulation.decode_direction(x, y)
+            self.sent_inputs.append((self.sequence, loc, self.sent_direction, []))
+            data = (x, y, self.sequence, min(self.input_steps, 0xFFFF)) # the server moves the previous one as far
+            self.input_steps = 0
+        if self.sent_inputs:
+            radii = self.sent_inputs[-1][3]
+            if not radii or radii[-1][1] != self.radius: # speed changes with the radius from this step on
+                radii.append((self.input_steps, self.radius))
+        self.input_steps += 1
+        return data
+
+    def reconcile_input(self, sequence: int, steps: int, loc: Vec2, half_world_size: Vec2) -> None:
+        """Shifts `position` by the error between where the server moved the player after `steps` with input `sequence`,
+        and where that input moved it here
+
+        Args:
+            sequence (int): sequence of the acknowledged input
+            steps (int): steps the server moved with it
+            loc (Vec2): where the server has the player
+            half_world_size (Vec2): half of the world size
+        """
+        while self.sent_inputs and self.sent_inputs[0][0] < sequence:
+            self.sent_inputs.popleft()
+        if not self.sent_inputs or self.sent_inputs[0][0] != sequence: # already reset, by a forced position
+            return
+        _, start, direction, radii = self.sent_inputs[0]
+        error = loc - simulation.advance_segments(start, direction, radii, half_world_size, steps)
+        if error.length() < self.CORRECTION_THRESHOLD:
+            return
+        self.sent_inputs = deque(((sent_sequence, sent_start + error, sent_direction, radii)
+                                  for sent_sequence, sent_start, sent_direction, radii in self.sent_inputs),
+                                 maxlen=self.HISTORY_SIZE)
+        self.position = self.position + error
+        self.last_position = self.last_position + error
+        self.correction = self.correction - error # drawn where it was, and eased in
+
+    def reconcile(self, sequence: int, loc: Vec2) -> None:
+        """Shifts `position` by the error between where the server has the player and where it was sent to at `sequence`
+
+        Args:
+            sequence (int): sequence of the rejected position
+            loc (Vec2): where the server still has the player
+        """
+        sent_loc: Vec2 | None = None
+        while self.sent_positions and self.sent_positions[0][0] <= sequence:
+            sent_sequence, sent_loc = self.sent_positions.popleft()
+            if sent_sequence != sequence:
+                sent_loc = None
+        if sent_loc is None: # already reset, by a forced position
+            return
+        error = loc - sent_loc
+        # positions still in flight are shifted too, as the next correction is relative to them
+        self.sent_positions = deque(((sent_sequence, sent_loc + error) for sent_sequence, sent_loc in self.sent_positions),
+                                    maxlen=self.HISTORY_SIZE)
+        self.position = self.position + error
+        self.last_position = self.last_position + error
+        self.correction = self.correction - error # drawn where it was, and eased in
+
+    def ease_correction(self) -> Vec2:
+        self.correction = self.correction.lerp(Vec2.ZERO, self.CORRECTION_SMOOTHING)
+        return self.correction
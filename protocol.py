@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import socket
+import struct
+from typing import Any, Iterable, Iterator, Sequence
+
+# Compact binary protocol, negotiated with 'HELLO'
+# Frame layout: MAGIC (u8) | message type (u8) | payload length (u32) | payload
+# Fixed records are little-endian, with float32 coordinates/radii, int32 cids and uint8 colors.
+# Kinds without a packed layout are sent as 'TEXT' frames, the kind and its data joined by `TEXT_SEPARATOR`
+
+VERSION: int = 4 # 2: sequenced 'SET_POSITION', time stamped 'DELTA', 3: 'SET_INPUT', 4: food IDs
+MAGIC: int = 0xA7 # never the first byte of a text request
+MAGIC_BYTE = bytes((MAGIC,))
+HEADER = struct.Struct("<BBI")
+TEXT_SEPARATOR = "\x1f"
+
+# kind: (message type, record layout)
+LAYOUTS: dict[str, tuple[int, struct.Struct]] = {
+    "HELLO": (1, struct.Struct("<B")), # version
+    "ASSIGN_CID": (2, struct.Struct("<i")),
+    "SET_WORLD_SIZE": (3, struct.Struct("<ii")),
+    "SET_INITIAL_POSITION": (4, struct.Struct("<ff")),
+    "SET_COLOR": (5, struct.Struct("<BBB")),
+    "SET_POSITION": (6, struct.Struct("<iffI")), # cid, x, y, sequence
+    "FORCE_POSITION": (7, struct.Struct("<iff")),
+    "MOVE_DUMMIE": (8, struct.Struct("<iff")),
+    "SET_RADIUS": (9, struct.Struct("<if")),
+    "SPAWN_PLAYER": (10, struct.Struct("<iff")),
+    "SET_DUMMIE_COLOR": (11, struct.Struct("<iBBB")),
+    "SPAWN_FOOD": (12, struct.Struct("<IffBBB")), # food ID, x, y, red, green, blue
+    "DESTROY_FOOD": (13, struct.Struct("<I")), # food ID
+    "SET_INPUT": (14, struct.Struct("<ibbIH")), # cid, direction x, direction y, sequence, steps of the previous input
+    "SET_MOVEMENT": (15, struct.Struct("<B")), # 0: clients send positions, 1: clients send inputs
+}
+# kind: converter of each text value, from the struct format of its layout
+TEXT_CONVERTERS: dict[str, tuple[type, ...]] = {
+    kind: tuple(float if code in "fd" else int for code in layout.format.lstrip("<"))
+    for kind, (_, layout) in LAYOUTS.items()
+}
+DELTA_TYPE: int = 32
+TEXT_TYPE: int = 33
+WORLD_SNAPSHOT_TYPE: int = 34
+KINDS: dict[int, str] = {message_type: kind for kind, (message_type, _) in LAYOUTS.items()}
+KINDS[DELTA_TYPE] = "DELTA"
+KINDS[TEXT_TYPE] = "TEXT"
+KINDS[WORLD_SNAPSHOT_TYPE] = "WORLD_SNAPSHOT"
+
+# `DELTA` section tag: record layout, matching `snapshot.RECORD_TYPES`
+DELTA_LAYOUTS: dict[str, struct.Struct] = {
+    "T": struct.Struct("<d"), # server time
+    "M": struct.Struct("<iff"), # cid, x, y
+    "C": struct.Struct("<iIff"), # cid, sequence, x, y
+    "K": struct.Struct("<iIIff"), # cid, input sequence, steps, x, y
+    "F": struct.Struct("<iff"), # cid, x, y
+    "R": struct.Struct("<if"), # cid, radius
+    "A": struct.Struct("<IffBBB"), # food ID, x, y, red, green, blue
+    "D": struct.Struct("<I"), # food ID
+    "P": struct.Struct("<ifffBBB"), # cid, x, y, radius, red, green, blue
+    "Q": struct.Struct("<i"), # cid
+}
+SECTION_HEADER = struct.Struct("<BI") # tag, record count
+CHUNK_HEADER = struct.Struct("<HH") # chunk index, chunk count
+
+
+def encode(kind: str, data: Sequence[Any]) -> bytes:
+    """Encodes a single message, falling back to a 'TEXT' frame for kinds without a layout
+    """
+    if kind in LAYOUTS:
+        message_type, layout = LAYOUTS[kind]
+        payload = layout.pack(*data)
+    else:
+        message_type = TEXT_TYPE
+        payload = TEXT_SEPARATOR.join((kind, *map(str, data))).encode("utf-8")
+    return HEADER.pack(MAGIC, message_type, len(payload)) + payload
+
+
+def _pack_sections(records: Iterable[tuple[str, tuple[Any, ...]]]) -> bytes:
+    parts: list[bytes] = []
+    tag = ""
+    packed: list[bytes] = []
+    for record_tag, record in records:
+        if record_tag != tag:
+            if packed:
+                parts.append(SECTION_HEADER.pack(ord(tag), len(packed)))
+                parts.extend(packed)
+                packed = []
+            tag = record_tag
+        packed.append(DELTA_LAYOUTS[tag].pack(*record))
+    if packed:
+        parts.append(SECTION_HEADER.pack(ord(tag), len(packed)))
+        parts.extend(packed)
+    return b"".join(parts)
+
+
+def encode_delta(records: Iterable[tuple[str, tuple[Any, ...]]]) -> bytes:
+    """Encodes `(tag, record)` pairs, grouped by tag as from `Snapshot._records`, into a single 'DELTA' frame
+    """
+    payload = _pack_sections(records)
+    return HEADER.pack(MAGIC, DELTA_TYPE, len(payload)) + payload
+
+
+def encode_world_snapshot(index: int, count: int, records: Iterable[tuple[str, tuple[Any, ...]]]) -> bytes:
+    """Encodes chunk `index` of `count` of a 'WORLD_SNAPSHOT', laid out as 'DELTA' after the chunk header
+    """
+    payload = CHUNK_HEADER.pack(index, count) + _pack_sections(records)
+    return HEADER.pack(MAGIC, WORLD_SNAPSHOT_TYPE, len(payload)) + payload
+
+
+def unpack(kind: str, payload: memoryview) -> tuple[Any, ...]:
+    return LAYOUTS[kind][1].unpack(payload)
+
+
+def parse_text(kind: str, data: Sequence[str]) -> tuple[Any, ...]:
+    """Values of a text message of a packed kind, converted to what `unpack` gives for it
+
+    Raises:
+        ValueError: if a value does not convert, or the count does not match the layout
+    """
+    converters = TEXT_CONVERTERS[kind]
+    if len(data) != len(converters):
+        raise ValueError(f"'{kind}' has {len(converters)} values, not {len(data)}")
+    return tuple(convert(value) for convert, value in zip(converters, data))
+
+
+def unpack_text(payload: memoryview) -> tuple[str, list[str]]:
+    kind, *data = str(payload, "utf-8").split(TEXT_SEPARATOR)
+    return (kind, data)
+
+
+def iter_delta(payload: memoryview) -> Iterator[tuple[str, Iterator[tuple[Any, ...]]]]:
+    """Yields `(tag, records)` for each section, unpacking records straight from the payload
+    """
+    index = 0
+    end = len(payload)
+    while index < end:
+        tag_code, count = SECTION_HEADER.unpack_from(payload, index)
+        index += SECTION_HEADER.size
+        tag = chr(tag_code)
+        layout = DELTA_LAYOUTS[tag]
+        size = layout.size * count
+        yield (tag, layout.iter_unpack(payload[index:index + size]))
+        index += size
+
+
+class FrameReader:
+    """Splits a byte stream into frames
+
+    Payloads are memoryviews over the received bytes, so only a partial frame left at the end is ever copied
+    """
+
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def feed(self, data: bytes) -> list[tuple[str, memoryview]]:
+        if self._pending:
+            data = self._pending + data
+        view = memoryview(data)
+        frames: list[tuple[str, memoryview]] = []
+        index = 0
+        end = len(data)
+        while end - index >= HEADER.size:
+            magic, message_type, length = HEADER.unpack_from(view, index)
+            if magic != MAGIC:
+                raise ValueError(f"Invalid frame start {magic:#x}")
+            start = index + HEADER.size
+            if end - start < length: # wait for the rest of the frame
+                break
+            frames.append((KINDS.get(message_type, ""), view[start:start + length]))
+            index = start + length
+        self._pending = data[index:] if index < end else b""
+        return frames
+
+
+class FrameWriter:
+    """Outgoing buffer for a non-blocking socket, keeping any bytes the socket did not accept yet
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def write(self, frame: bytes) -> None:
+        self._buffer += frame
+
+    def flush(self, connection: socket.socket) -> None:
+        if not self._buffer:
+            return
+        try:
+            sent = connection.send(self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError: # lost connection, which the reading side reports
+            self._buffer.clear()
+            return
+        del self._buffer[:sent]
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, BinaryIO, Hashable, Iterator, NamedTuple
+
+# Append-only session log of everything that reaches the server, to replay it headlessly
+# File layout: FILE_HEADER, then records: RECORD_HEADER (kind, time, connection, payload length) | payload.
+# Times are seconds of the server clock since the session started, connections are numbered in order of connecting
+
+MAGIC = b"AGRS"
+VERSION: int = 1
+FILE_HEADER = struct.Struct("<4sB")
+RECORD_HEADER = struct.Struct("<BdII")
+SESSION = 1 # payload: seed (u64), then the server config as JSON
+CONNECT = 2 # payload: port (u16), then the host
+DISCONNECT = 3 # payload: the error
+REQUEST = 4 # payload: received bytes, as given to `_on_request_received`
+TEXT = 5 # payload: kind and data of a text request, joined by `TEXT_SEPARATOR`
+TICK = 6 # payload: delta (f64)
+SEED = struct.Struct("<Q")
+PORT = struct.Struct("<H")
+DELTA = struct.Struct("<d")
+TEXT_SEPARATOR = "\x1f"
+
+
+class Record(NamedTuple):
+    kind: int
+    time: float
+    connection: int
+    payload: bytes
+
+
+class SessionRecorder:
+    """Writes inbound traffic, connects, disconnects and ticks of a server as they happen
+
+    Records are buffered and flushed every tick, so a crash loses at most the tick it happened in
+    """
+
+    def __init__(self, path: str, seed: int, config: dict[str, Any], time: float) -> None:
+        self.file: BinaryIO = open(path, "ab")
+        self.start_time = time
+        self.connection_ids: dict[Hashable, int] = {}
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.write(SESSION, time, 0, SEED.pack(seed) + json.dumps(config).encode("utf-8"))
+
+    def write(self, kind: int, time: float, connection_id: int, payload: bytes) -> None:
+        self.file.write(RECORD_HEADER.pack(kind, time - self.start_time, connection_id, len(payload)))
+        self.file.write(payload)
+
+    def connect(self, connection: Hashable, host: str, port: int, time: float) -> None:
+        connection_id = self.connection_ids[connection] = len(self.connection_ids) + 1
+        self.write(CONNECT, time, connection_id, PORT.pack(port) + str(host).encode("utf-8"))
+
+    def disconnect(self, connection: Hashable, error: Exception, time: float) -> None:
+        connection_id = self.connection_ids.pop(connection, 0)
+        self.write(DISCONNECT, time, connection_id, f"{type(error).__name__} {error}".encode("utf-8"))
+
+    def request(self, connection: Hashable, request: bytes, time: float) -> None:
+        self.write(REQUEST, time, self.connection_ids.get(connection, 0), bytes(request))
+
+    def text(self, connection: Hashable, kind: str, data: list[Any], time: float) -> None:
+        payload = TEXT_SEPARATOR.join((kind, *map(str, data))).encode("utf-8")
+        self.write(TEXT, time, self.connection_ids.get(connection, 0), payload)
+
+    def tick(self, delta: float, time: float) -> None:
+        self.write(TICK, time, 0, DELTA.pack(delta))
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_session(file: BinaryIO) -> Iterator[Record]:
+    """Yields the records of a session log, stopping at a record cut off by a crash
+    """
+    header = file.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        return
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} session log")
+    while True:
+        header = file.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        kind, time, connection_id, length = RECORD_HEADER.unpack(header)
+        payload = file.read(length)
+        if len(payload) < length:
+            return
+        yield Record(kind, time, connection_id, payload)
+
+
+def decode_session(payload: bytes) -> tuple[int, dict[str, Any]]:
+    """Seed and server config of a `SESSION` record
+    """
+    (seed,) = SEED.unpack_from(payload)
+    return (seed, json.loads(payload[SEED.size:]))
+
+
+def decode_connect(payload: bytes) -> tuple[str, int]:
+    """Host and port of a `CONNECT` record
+    """
+    (port,) = PORT.unpack_from(payload)
+    return (payload[PORT.size:].decode("utf-8"), port)
+
+
+def decode_text(payload: bytes) -> tuple[str, list[str]]:
+    kind, *data = payload.decode("utf-8").split(TEXT_SEPARATOR)
+    return (kind, data)
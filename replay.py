@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import time
+import struct
+import hashlib
+import argparse
+from typing import Any, Iterator
+# dependencies
+from displaylib.math import Vec2i # type: ignore
+# local imports
+from server import HeadlessServer
+from collision import ENGINES
+import recording
+import protocol
+import logs
+
+# Feeds a session log recorded with `engineserver.py --record` back into a headless server,
+# at the recorded pace or as fast as possible, e.g. to profile real traffic or compare collision engines
+
+
+class ReplayServer(HeadlessServer):
+    """`HeadlessServer` on the recorded clock, digesting what it sends and the world after every tick
+
+    Two replays of the same log give the same digests, unless the server logic behaves differently
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.traffic_digest = hashlib.sha256()
+        self.world_digest = hashlib.sha256()
+        self.ticks = 0
+
+    def start_event(self) -> None:
+        ... # `event_time` is set from the log
+
+    def send_frame(self, connection: Any, frame: bytes) -> None:
+        super().send_frame(connection, frame)
+        self.traffic_digest.update(struct.pack("<I", connection))
+        self.traffic_digest.update(frame)
+
+    def send_text(self, connection: Any, kind: str, data: Any) -> None:
+        super().send_text(connection, kind, data)
+        self.traffic_digest.update(struct.pack("<I", connection))
+        self.traffic_digest.update(protocol.encode(kind, data))
+
+    def _update(self, delta: float) -> None:
+        super()._update(delta)
+        self.ticks += 1
+        digest = self.world_digest
+        for cid in sorted(self.clients):
+            client = self.clients[cid]
+            digest.update(struct.pack("<iddd", cid, client.position.x, client.position.y, client.radius))
+        digest.update(struct.pack("<I", len(self.foods)))
+
+    def digest_foods(self) -> str:
+        digest = hashlib.sha256()
+        for food_id in sorted(self.foods):
+            digest.update(struct.pack("<Idd", food_id, *self.foods.position(food_id)))
+        return digest.hexdigest()
+
+
+def select_session(records: Iterator[recording.Record], index: int) -> Iterator[recording.Record]:
+    """Records of the `index`-th session in the log, starting with its `SESSION` record
+    """
+    session = -1
+    for record in records:
+        if record.kind == recording.SESSION:
+            session += 1
+            if session > index:
+                return
+        if session == index:
+            yield record
+
+
+def replay(records: Iterator[recording.Record], args: argparse.Namespace) -> ReplayServer:
+    start = next(records, None)
+    if start is None:
+        raise ValueError(f"Log has no session {args.session}")
+    seed, config = recording.decode_session(start.payload)
+    server = ReplayServer()
+    for name, value in config.items():
+        if isinstance(getattr(server, name, None), Vec2i): # recorded as [x, y]
+            value = Vec2i(*value)
+        setattr(server, name, value)
+    server.SEED = seed
+    server.RECORD_PATH = ""
+    server.STATS_PORT = 0
+    server.PROFILE_EVERY = args.profile_every
+    if args.engine:
+        server.COLLISION_ENGINE = args.engine
+    server.event_time = start.time
+    server._on_start()
+    wall_start = time.perf_counter()
+    for record in records:
+        if args.speed:
+            delay = wall_start + (record.time - start.time) / args.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        server.event_time = record.time
+        connection = record.connection
+        match record.kind:
+            case recording.CONNECT:
+                host, port = recording.decode_connect(record.payload)
+                server._on_client_connected(connection, host, port)
+            case recording.DISCONNECT:
+                server._on_client_disconnected(connection, ConnectionError(record.payload.decode("utf-8")))
+            case recording.REQUEST:
+                server._on_request_received(connection, record.payload)
+            case recording.TEXT:
+                kind, data = recording.decode_text(record.payload)
+                server.handle_text(connection, kind, data)
+            case recording.TICK:
+                (delta,) = recording.DELTA.unpack(record.payload)
+                server._update(delta)
+    return server
+
+
+def main(args: argparse.Namespace) -> dict[str, Any]:
+    with open(args.log, "rb") as file:
+        records = select_session(recording.read_session(file), args.session)
+        wall_start = time.perf_counter()
+        if args.profile:
+            import cProfile # only when profiling the whole replay
+            import pstats
+            profile = cProfile.Profile()
+            server = profile.runcall(replay, records, args)
+            pstats.Stats(profile).dump_stats(args.profile)
+        else:
+            server = replay(records, args)
+        elapsed = time.perf_counter() - wall_start
+    server.profiler.dump()
+    if hasattr(server.collisions, "close"): # sharded workers
+        server.collisions.close()
+    report = server.make_report()
+    return {
+        "seed": server.seed,
+        "engine": server.collisions.name,
+        "ticks": server.ticks,
+        "recorded_seconds": round(server.server_time(), 3),
+        "replay_seconds": round(elapsed, 3),
+        "sent_messages": server.sent_messages,
+        "sent_bytes": server.sent_bytes,
+        "traffic_digest": server.traffic_digest.hexdigest(),
+        "world_digest": server.world_digest.hexdigest(),
+        "foods_digest": server.digest_foods(),
+        "tick_ms": report["tick_ms"],
+        "sections_ms": report["sections_ms"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agar.io - Replay a recorded server session headlessly")
+    parser.add_argument("log", help="session log written by a server started with `--record`")
+    parser.add_argument("--session", type=int, default=0, help="index of the session in the log, as servers append to it")
+    parser.add_argument("--speed", type=float, default=0, help="1 for the recorded pace, 0 for as fast as possible")
+    parser.add_argument("--engine", choices=(*ENGINES, "sharded"), help="collision engine, instead of the recorded one")
+    parser.add_argument("--profile", metavar="PATH", help="profile the whole replay with cProfile into PATH")
+    parser.add_argument("--profile-every", type=int, default=0, help="profile every n-th tick, as the servers do")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"), default="warning")
+    args = parser.parse_args()
+    logs.configure(args.log_level)
+    print(json.dumps(main(args), indent=2))
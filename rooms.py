@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+# dependencies
+from displaylib.math import Vec2i # type: ignore
+# local imports
+from server import GameServer, make_argument_parser, configure
+from aioserver import AsyncConnection, AsyncGame, AsyncHost
+from snapshot import Snapshot
+from metrics import StatsEndpoint, max_rss_kib
+import logs
+
+log = logs.get_logger("rooms")
+
+# Many independent arenas in one process: every room is a whole `GameServer` world with its own clients,
+# and `RoomServer` owns the connections, places each one in a room, and ticks every room with clients
+
+
+class Room(AsyncGame):
+    """One arena of a `RoomServer`, whose messages are queued until the server delivers them
+
+    Settings are the `GameServer` ones, overridden per room, plus `CAPACITY`
+    """
+    CAPACITY: int = 50 # connections placed in the room at most
+
+    def __init__(self, room_id: int, settings: dict[str, Any]) -> None:
+        self.room_id = room_id
+        for name, value in settings.items():
+            if not name.isupper() or not hasattr(Room, name):
+                raise ValueError(f"Unknown room setting '{name}'")
+            if name == "WORLD_SIZE":
+                value = Vec2i(*value)
+                self.HALF_WORLD_SIZE = Vec2i(value.x // 2, value.y // 2)
+            setattr(self, name, value)
+        if self.SEED: # rooms would otherwise share the same world
+            self.SEED += room_id
+        if self.RECORD_PATH:
+            self.RECORD_PATH = room_path(self.RECORD_PATH, room_id)
+        self.PROFILE_PATH = room_path(self.PROFILE_PATH, room_id)
+        self.STATS_PORT = 0 # served for all rooms by `RoomServer`
+        self.outbox: list[tuple[AsyncConnection, bytes | Snapshot]] = []
+
+    def queue(self, connection: AsyncConnection, message: bytes | Snapshot) -> None:
+        self.outbox.append((connection, message))
+
+    def has_space(self) -> bool:
+        return self.connection_count() < self.CAPACITY
+
+    def close(self) -> None:
+        if hasattr(self.collisions, "close"): # sharded workers
+            self.collisions.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+def room_path(path: str, room_id: int) -> str:
+    """`path` with the room in its name, e.g. "server_tick.room2.prof"
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.room{room_id}{extension}"
+
+
+class RoomServer(AsyncHost):
+    """Serves many `Room`s with asyncio, using the binary protocol only
+
+    A connection is placed in the fullest room with space left, so players meet and other rooms stay empty,
+    and a room is opened on demand when every room is full. Rooms without connections are not ticked at all,
+    and rooms opened on demand are closed once their last connection leaves.
+    Rooms with at least `HEAVY_ROOM_CLIENTS` clients are ticked on a thread pool while the others tick inline;
+    this overlaps where a room releases the GIL, e.g. the numpy engine, or on a free-threaded build
+    """
+    ROOMS: list[dict[str, Any]] = [{}] # settings of the rooms always open, rooms opened on demand copy the first
+    MAX_ROOMS: int = 64
+    HEAVY_ROOM_CLIENTS: int = 100
+    POOL_WORKERS: int = 0 # threads ticking heavy rooms, 0 for one per core
+
+    def __init__(self, *, host: str = "localhost", port: int = 8080) -> None:
+        super().__init__(host=host, port=port)
+        self.rooms: dict[int, Room] = {}
+        self.room_counter = 0
+        self.pool = ThreadPoolExecutor(self.POOL_WORKERS or os.cpu_count() or 1, thread_name_prefix="room")
+        self.stats_endpoint: StatsEndpoint | None = None
+        self.late_ticks = 0
+
+    def start(self) -> None:
+        for settings in self.ROOMS:
+            self.open_room(settings)
+        if GameServer.STATS_PORT:
+            self.stats_endpoint = StatsEndpoint(port=GameServer.STATS_PORT)
+
+    def stop(self) -> None:
+        for room in self.rooms.values():
+            room.close()
+        self.pool.shutdown(cancel_futures=True)
+
+    def open_room(self, settings: dict[str, Any]) -> Room:
+        room = Room(self.room_counter, settings)
+        self.room_counter += 1
+        room._on_start()
+        self.rooms[room.room_id] = room
+        log.info("Opened room %d, %s world, %d foods", room.room_id, room.WORLD_SIZE.to_tuple(), len(room.foods))
+        return room
+
+    def close_room(self, room: Room) -> None:
+        del self.rooms[room.room_id]
+        room.close()
+        log.info("Closed room %d", room.room_id)
+
+    def place(self) -> Room | None:
+        """Fullest room with space left, or a new one if every room is full and `MAX_ROOMS` allows it
+        """
+        open_rooms = [room for room in self.rooms.values() if room.has_space()]
+        if open_rooms:
+            return max(open_rooms, key=lambda room: room.connection_count())
+        if len(self.rooms) < self.MAX_ROOMS:
+            return self.open_room(self.ROOMS[0] if self.ROOMS else {})
+        log.warning("Every room is full, refusing connection")
+        return None
+
+    def received(self, game: AsyncGame) -> None:
+        self.deliver(game) # type: ignore[arg-type]
+
+    def drop(self, connection: AsyncConnection, error: Exception) -> AsyncGame | None:
+        room = super().drop(connection, error)
+        if isinstance(room, Room) and room.room_id >= len(self.ROOMS) and not room.connection_count(): # opened on demand
+            self.close_room(room)
+        return room
+
+    def deliver(self, room: Room) -> None:
+        """Hands what the room sent to the connections' writers, on the event loop's thread
+        """
+        outbox = room.outbox
+        room.outbox = []
+        for connection, message in outbox:
+            self.send(connection, message)
+
+    def count_late_tick(self) -> None:
+        self.late_ticks += 1
+
+    def tick(self, delta: float) -> None:
+        self.update_rooms(delta)
+        if self.stats_endpoint is not None:
+            self.stats_endpoint.poll(self.make_report)
+
+    def update_rooms(self, delta: float) -> None:
+        """Ticks every room with connections, heavy ones on the pool, and delivers what they sent
+        """
+        active = [room for room in self.rooms.values() if room.connection_count()]
+        heavy = [room for room in active if len(room.clients) >= self.HEAVY_ROOM_CLIENTS]
+        futures = [self.pool.submit(room._update, delta) for room in heavy]
+        for room in active:
+            if len(room.clients) < self.HEAVY_ROOM_CLIENTS:
+                room._update(delta)
+        for future in futures:
+            future.result() # raises what the room raised
+        for room in active:
+            self.deliver(room)
+
+    def make_report(self) -> dict[str, Any]:
+        return {
+            "rooms": {room.room_id: room.make_report() for room in self.rooms.values()},
+            "connections": len(self.connection_games),
+            "active_rooms": sum(1 for room in self.rooms.values() if room.connection_count()),
+            "late_ticks": self.late_ticks,
+            "max_rss_kib": max_rss_kib()
+        }
+
+
+if __name__ == "__main__":
+    parser = make_argument_parser("Agar.io - Server (rooms)")
+    parser.add_argument("--rooms", metavar="PATH",
+                        help="JSON list of the settings of each room always open, e.g. [{\"WORLD_SIZE\": [4000, 4000]}]")
+    parser.add_argument("--max-rooms", type=int, default=RoomServer.MAX_ROOMS, help="including rooms opened on demand")
+    parser.add_argument("--capacity", type=int, default=Room.CAPACITY, help="connections per room, unless set per room")
+    parser.add_argument("--heavy-clients", type=int, default=RoomServer.HEAVY_ROOM_CLIENTS,
+                        help="clients from which a room is ticked on the thread pool")
+    args = parser.parse_args()
+    configure(args)
+    if args.rooms:
+        with open(args.rooms, "r", encoding="utf-8") as file:
+            RoomServer.ROOMS = json.load(file)
+    RoomServer.MAX_ROOMS = args.max_rooms
+    RoomServer.HEAVY_ROOM_CLIENTS = args.heavy_clients
+    Room.CAPACITY = args.capacity
+    server = RoomServer(host=args.host, port=args.port)
+    server.run()
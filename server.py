@@ -1,212 +1,698 @@
 import time
+import json
 import socket
 import random
-import itertools
+import struct
+import argparse
+import statistics
+from collections import deque
+from typing import Any, Sequence
 # dependencies
-from displaylib.template import * # type: ignore
-from displaylib.pygame import color, ColorValue
+from displaylib.math import Vec2, Vec2i # type: ignore
+# local imports
+from collision import ENGINES
+from entities import Client, FoodStore
+from foodfield import FoodField
+from snapshot import Snapshot, SnapshotStats, payload_size, flatten
+from metrics import TickMetrics, TickProfiler, StatsEndpoint, max_rss_kib
+from recording import SessionRecorder
+import simulation
+import protocol
+import logs
 
+log = logs.get_logger("server")
 
-class Client(Node2D):
-    cid: int = -1
-    color: ColorValue = color.BLACK
-    radius: float = 10
+# Only imported, by the servers that run it: `engineserver.py`, `aioserver.py` and `rooms.py`
 
 
-class Food(Node2D):
-    color: ColorValue = color.FOREST_GREEN
-    energy: float = 0.2
-    radius: int = 3 # this is constant on both sides
+class GameServer:
+    """Game logic of the server, independent of how connections are served
 
-
-class MainServer(networking.Server, Engine):
+    Transport hooks:
+        - `send_frame(self, connection, frame: bytes) -> None`
+        - `send_text(self, connection, kind: str, data: Sequence[Any]) -> None`
+        - `flush(self) -> None`
+        - `_on_text_request(self, sender, request: bytes) -> None`, parsing it for `handle_text`
+    """
     WORLD_SIZE = Vec2i(2000, 2000)
     # WORLD_SIZE = Vec2i(500, 500)
     HALF_WORLD_SIZE = Vec2i(WORLD_SIZE.x // 2, WORLD_SIZE.y // 2)
-    MAX_FOOD_COUNT: int = 200
-    INITIAL_FOOD_BATCHES: int = 20
-    FOOD_SPAWN_INTERVAL: float = 1.5 # seconds
+    MAX_FOOD_COUNT: int = 200 # in the whole world
+    FOOD_DENSITY: float = 50 # foods per million square units, kept in every region
+    FOOD_REGION_SIZE: int = 400
+    FOOD_REFILL_RATE: float = 0.02 # of the target food count spawned per second at most
     FOOD_SPAWN_GROUP_MIN_RADIUS: int = 10
     FOOD_SPAWN_GROUP_MAX_RADIUS: int = 35
-    FOOD_SPAWN_BORDER_MARGIN = Vec2i.ONE * 5
-    FOOD_SPAWN_BATCH: int = 5
-    INITIAL_PLAYER_RADIUS: int = 10
-    MAX_PLAYER_RADIUS: int = 100
-    VALID_POSITION_CHANGE: int = 25 # adjust if speed formula on client side is changed
-    request_batch = 128
+    FOOD_SPAWN_BORDER_MARGIN: int = 5
+    FOOD_SPAWN_BATCH: int = 5 # foods spawned around the same point at most
+    MOVEMENT: str = "input" # "input": clients send inputs and the server moves them, "position": clients send positions
+    MAX_STEP_LEAD: int = 15 # steps a client that sends inputs may run ahead of the server clock, absorbing jitter
+    MOVE_BURST: float = 0.25 # seconds of movement a client may send at once, absorbing network jitter
+    MOVE_TOLERANCE: float = 1 # distance, as positions are sent as float32
+    MAX_POSITION_RATE: float = 30 # 'SET_POSITION's applied per second and client, newer ones replace a pending one, 0 for any
+    FOOD_REACH_MARGIN: float = 2 # growth covered by a client's first food query, others are queried again once they grew past it
+    CELL_SIZE: int = 100 # spatial grid cell size, should be around `simulation.MAX_RADIUS`
+    COLLISION_ENGINE: str = "grid" # "grid" | "numpy" | "sharded"
+    SHARDS: int = 0 # worker processes of the "sharded" engine, 0 for one per core
+    BROADCAST_INTERVAL: float = 0.1 # seconds between 'DELTA's, every second tick at 16 ticks per second, clients interpolate in between
+    MAX_DELTA_VALUES: int = 2048 # values per 'DELTA' request before splitting
+    MAX_WORLD_SNAPSHOT_RECORDS: int = 512 # entities per 'WORLD_SNAPSHOT' chunk
+    REPORT_INTERVAL: float = 10 # seconds between structured metrics log lines
+    STATS_PORT: int = 0 # local HTTP port serving metrics as JSON, 0 to not serve
+    PROFILE_EVERY: int = 0 # profile every n-th tick with cProfile, 0 to not profile
+    PROFILE_PATH: str = "server_tick.prof" # written on every report while profiling
+    SEED: int = 0 # of the world's random numbers, 0 for a new one every start
+    RECORD_PATH: str = "" # session log appended to for replaying, see `recording.py`, empty to not record
+    VIEW_RADIUS: float = 600 # half size of the area sent to a client, about half a large window
+    VIEW_RADIUS_PER_RADIUS: float = 4 # bigger players see further (client camera is not zoomed yet)
+    VIEW_HYSTERESIS: float = 1.25 # entities leave the area only this much further out
+    event_time: float = 0.0 # see `now`
 
     def _on_start(self) -> None:
-        print("[Info] Server start")
+        self.start_event()
+        now = self.now()
+        self.seed = self.SEED or random.randrange(1, 2 ** 32)
+        self.random = random.Random(self.seed)
+        log.info("Server start, seed %d", self.seed)
+        self.recorder = SessionRecorder(self.RECORD_PATH, self.seed, self.config(), now) if self.RECORD_PATH else None
         self.cid_counter = 0 # >= 0
         self.clients: dict[int, Client] = {}
-        self.foods: dict[tuple[float, float], Food] = {}
-        self.food_spawn_timestamp: float = time.perf_counter()
-        for _ in range(self.INITIAL_FOOD_BATCHES):
-            self.spawn_food_batch()
+        self.connection_cids: dict[socket.socket, int] = {}
+        self.frame_readers: dict[socket.socket, protocol.FrameReader] = {}
+        self.binary_connections: set[socket.socket] = set()
+        self.connect_timestamps: dict[socket.socket, float] = {}
+        self.join_latencies: deque[float] = deque(maxlen=256) # seconds from connect until the client has the world
+        self.foods = FoodStore()
+        self.collisions = self.make_collisions()
+        log.info("Using collision engine %s", self.collisions.name)
+        self.snapshot = Snapshot()
+        self.snapshot_stats = SnapshotStats()
+        self.metrics = TickMetrics()
+        self.profiler = TickProfiler(self.PROFILE_EVERY, self.PROFILE_PATH)
+        self.stats_endpoint = StatsEndpoint(port=self.STATS_PORT) if self.STATS_PORT else None
+        self.start_timestamp: float = now
+        self.report_timestamp: float = now
+        self.broadcast_timestamp: float = now
+        self.timestep = simulation.FixedTimestep()
+        self.pending_cids: set[int] = set() # clients with a pending position
+        self.food_field = self.make_food_field()
+        self.add_foods(self.food_field.fill())
     
+    def make_collisions(self) -> Any:
+        if self.COLLISION_ENGINE == "sharded":
+            from shard import ShardedCollisions # starts worker processes, so only imported when used
+            return ShardedCollisions(self.CELL_SIZE, shards=self.SHARDS)
+        return ENGINES[self.COLLISION_ENGINE](self.CELL_SIZE)
+
+    def make_food_field(self) -> FoodField:
+        return FoodField(self.foods, self.random, self.HALF_WORLD_SIZE.to_tuple(),
+                         region_size=self.FOOD_REGION_SIZE, density=self.FOOD_DENSITY, refill_rate=self.FOOD_REFILL_RATE,
+                         max_count=self.MAX_FOOD_COUNT, group_size=self.FOOD_SPAWN_BATCH,
+                         group_min_radius=self.FOOD_SPAWN_GROUP_MIN_RADIUS, group_max_radius=self.FOOD_SPAWN_GROUP_MAX_RADIUS,
+                         border_margin=self.FOOD_SPAWN_BORDER_MARGIN)
+
+    def config(self) -> dict[str, Any]:
+        """Plain settings, recorded with a session so a replay runs the same, with sizes as `[x, y]`
+        """
+        config: dict[str, Any] = {}
+        for name in dir(self):
+            value = getattr(self, name)
+            if not name.isupper():
+                continue
+            if isinstance(value, (bool, int, float, str)):
+                config[name] = value
+            elif isinstance(value, Vec2i):
+                config[name] = value.to_tuple()
+        return config
+
+    def start_event(self) -> None:
+        """Reads the clock for a connect, disconnect, request or tick that is about to be handled
+        """
+        self.event_time = time.perf_counter()
+
+    def now(self) -> float:
+        """Time of the event being handled, the same for everything it does, so a replay reproduces it exactly
+        """
+        return self.event_time
+
+    def random_color(self) -> tuple[int, int, int]:
+        return (self.random.randint(0, 255), self.random.randint(0, 255), self.random.randint(0, 255))
+
     def _on_client_disconnected(self, connection: socket.socket, error: Exception) -> None:
-        print("[Info] Client disconnected", "because of", type(error).__name__, error)
+        self.start_event()
+        if self.recorder is not None:
+            self.recorder.disconnect(connection, error, self.now())
+        log.info("Client disconnected because of %s %s", type(error).__name__, error)
+        self.frame_readers.pop(connection, None)
+        self.binary_connections.discard(connection)
+        self.connect_timestamps.pop(connection, None)
+        cid = self.connection_cids.pop(connection, None)
+        if cid is None:
+            return
+        del self.clients[cid]
+        self.pending_cids.discard(cid)
+        self.collisions.remove_client(cid) # others despawn it when their interest is refreshed
     
     def _on_client_connected(self, connection: socket.socket, host: str, port: int) -> None:
-        print("[Info] Client", host, "connected to", port)
-        client = Client()
+        self.start_event()
+        if self.recorder is not None:
+            self.recorder.connect(connection, host, port, self.now())
+        log.info("Client %s connected to %s", host, port) # joins when it says 'HELLO'
+        self.connect_timestamps[connection] = self.now()
+
+    def _on_request_received(self, sender: socket.socket, request: bytes) -> None:
+        self.start_event()
+        if sender not in self.frame_readers and request[:1] != protocol.MAGIC_BYTE:
+            self._on_text_request(sender, request) # recorded as parsed, see `handle_text`
+            return
+        if self.recorder is not None:
+            self.recorder.request(sender, request, self.now())
+        reader = self.frame_readers.setdefault(sender, protocol.FrameReader())
+        try:
+            frames = reader.feed(request)
+        except ValueError as error:
+            log.warning("Invalid binary request: %s", error)
+            return
+        for kind, payload in frames:
+            try:
+                self._on_binary_request(sender, kind, payload)
+            except struct.error:
+                log.warning("'%s' could not decode properly", kind)
+
+    def _on_binary_request(self, connection: socket.socket, kind: str, payload: memoryview) -> None:
+        if kind != "TEXT": # counted by its own kind
+            self.metrics.count_received(kind, len(payload))
+        match kind:
+            case "SET_INPUT":
+                cid, x, y, sequence, previous_steps = protocol.unpack(kind, payload)
+                self.set_input(connection, cid, simulation.decode_direction(x, y), sequence, previous_steps)
+            case "SET_POSITION":
+                cid, x, y, sequence = protocol.unpack(kind, payload)
+                self.set_position(connection, cid, Vec2(x, y), sequence)
+            case "HELLO":
+                (version,) = protocol.unpack(kind, payload)
+                self.join(connection, binary=version == protocol.VERSION)
+            case "TEXT":
+                text_kind, data = protocol.unpack_text(payload)
+                self.handle_text(connection, text_kind, data)
+
+    def send_frame(self, connection: socket.socket, frame: bytes) -> None:
+        raise NotImplementedError
+
+    def send_text(self, connection: socket.socket, kind: str, data: Sequence[Any]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        ...
+
+    def _on_text_request(self, sender: socket.socket, request: bytes) -> None:
+        log.warning("Text requests are not supported by %s", type(self).__name__)
+
+    def send_message(self, connection: socket.socket, kind: str, data: Sequence[Any]) -> None:
+        """Sends using the protocol negotiated by the connection
+        """
+        if connection in self.binary_connections:
+            frame = protocol.encode(kind, data)
+            self.send_frame(connection, frame)
+            self.metrics.count_sent(kind, len(frame))
+        else:
+            self.send_text(connection, kind, data)
+            self.metrics.count_sent(kind, payload_size(kind, data))
+
+    def send_delta(self, connection: socket.socket, delta: Snapshot) -> None:
+        if connection in self.binary_connections:
+            frame = protocol.encode_delta(delta._records())
+            self.send_frame(connection, frame)
+            self.snapshot_stats.add_sent(1, len(frame))
+            self.metrics.count_sent("DELTA", len(frame))
+            return
+        chunks = delta.encode(self.MAX_DELTA_VALUES)
+        for data in chunks:
+            self.send_text(connection, "DELTA", data)
+        size = sum(payload_size("DELTA", data) for data in chunks)
+        self.snapshot_stats.add_sent(len(chunks), size)
+        self.metrics.count_sent("DELTA", size, messages=len(chunks))
+
+    def join(self, connection: socket.socket, binary: bool) -> None:
+        if connection in self.connection_cids:
+            return
+        if binary:
+            self.binary_connections.add(connection)
+            self.send_message(connection, "HELLO", [protocol.VERSION]) # confirms binary mode
         rand_loc = self.make_random_position()
-        half_boundary = self.HALF_WORLD_SIZE - Vec2.ONE * client.radius
+        half_boundary = self.HALF_WORLD_SIZE - Vec2.ONE * simulation.INITIAL_RADIUS
         loc = rand_loc.clamped(-half_boundary, half_boundary)
-        client.position = loc
-        client.cid = self.make_cid()
-        req = networking.Request("ASSIGN_CID", data=[client.cid])
-        self.send_to(req, connection=connection)
-        req = networking.Request("SET_WORLD_SIZE", data=self.WORLD_SIZE.to_tuple())
-        self.send_to(req, connection=connection)
-        req = networking.Request("SET_INITIAL_POSITION", data=[*client.get_global_position().to_tuple()])
-        self.send_to(req, connection=connection)
-        client.color = color.rand_color()
-        req = networking.Request("SET_COLOR", data=client.color)
-        self.send_to(req, connection=connection)
-        # spawn the allready existing players for the new client
-        for other_client in self.clients.values():
-            req = networking.Request("SPAWN_PLAYER", data=[other_client.cid, *other_client.position.to_tuple()])
-            self.send_to(req, connection=connection)
-            req = networking.Request("SET_DUMMIE_COLOR", data=[other_client.cid, *other_client.color])
-            self.send_to(req, connection=connection)
-            req = networking.Request("SET_RADIUS", data=[other_client.cid, other_client.radius])
-            self.send_to(req, connection=connection)
-        for loc, food in self.foods.items():
-            req = networking.Request("SPAWN_FOOD", data=[*loc, *food.color])
-            self.send_to(req, connection=connection)
-        # spawn new player for everyone
+        client = Client(self.make_cid(), connection, loc, self.random_color(), self.now())
+        self.send_message(connection, "ASSIGN_CID", [client.cid])
+        self.send_message(connection, "SET_WORLD_SIZE", self.WORLD_SIZE.to_tuple())
+        self.send_message(connection, "SET_INITIAL_POSITION", client.position.to_tuple())
+        self.send_message(connection, "SET_COLOR", client.color)
+        self.send_message(connection, "SET_MOVEMENT", [int(self.MOVEMENT == "input")])
         self.clients[client.cid] = client
-        req = networking.Request("SPAWN_PLAYER", data=[client.cid, *client.position.to_tuple()])
-        self.broadcast(req, exclude=[connection])
-        req = networking.Request("SET_DUMMIE_COLOR", data=[client.cid, *client.color])
-        self.broadcast(req, exclude=[connection])
+        self.connection_cids[connection] = client.cid
+        self.collisions.add_client(client.cid, *client.position.to_tuple(), client.radius)
+        log.info("Client %d joined using %s protocol", client.cid, "binary" if binary else "text")
+        self.send_world_snapshot(client)
+
+    def send_world_snapshot(self, client: Client) -> None:
+        """Sends everything in the client's area of interest in bulk, instead of one request per entity
+        """
+        world = self.make_client_delta(client) # interest is empty, so this only spawns
+        world.time = self.server_time()
+        chunks = world.split(self.MAX_WORLD_SNAPSHOT_RECORDS)
+        binary = client.connection in self.binary_connections
+        for index, records in enumerate(chunks):
+            if binary:
+                frame = protocol.encode_world_snapshot(index, len(chunks), records)
+                self.send_frame(client.connection, frame)
+                self.metrics.count_sent("WORLD_SNAPSHOT", len(frame))
+            else:
+                data = [index, len(chunks), *flatten(records)]
+                self.send_text(client.connection, "WORLD_SNAPSHOT", data)
+                self.metrics.count_sent("WORLD_SNAPSHOT", payload_size("WORLD_SNAPSHOT", data))
     
     def make_cid(self) -> int:
         cid = self.cid_counter
         self.cid_counter += 1
         return cid
     
-    def spawn_food_batch(self) -> None:
-        batch_center = self.make_random_position()
-        for _ in range(self.FOOD_SPAWN_BATCH):
-            offset = Vec2i(random.randint(self.FOOD_SPAWN_GROUP_MIN_RADIUS, self.FOOD_SPAWN_GROUP_MAX_RADIUS),
-                           random.randint(self.FOOD_SPAWN_GROUP_MIN_RADIUS, self.FOOD_SPAWN_GROUP_MAX_RADIUS))
-            if random.randint(0, 1):
-                offset.x = -offset.x
-            if random.randint(0, 1):
-                offset.y = -offset.y
-            loc = batch_center + offset
-            half_boundary = self.HALF_WORLD_SIZE - self.FOOD_SPAWN_BORDER_MARGIN
-            loc = loc.clamped(-half_boundary, half_boundary)
-            food = Food()
-            food.position = loc
-            food.color = color.rand_color()
-            self.foods[loc.to_tuple()] = food
-            req = networking.Request("SPAWN_FOOD", data=[*food.get_global_position().to_tuple(), *food.color])
-            self.broadcast(req)
+    def add_foods(self, food_ids: list[int]) -> None:
+        """Makes foods spawned by the food field collidable, and visible with the next 'DELTA'
+        """
+        foods = self.foods
+        for food_id in food_ids:
+            x, y = foods.position(food_id)
+            self.collisions.add_food(food_id, x, y)
+            self.snapshot.spawn_food(food_id, x, y, *foods.color(food_id))
     
-    def _on_response(self, connection: socket.socket, response: networking.Response) -> None:
-        # print(response.kind)
-        match response:
-            case networking.Response(kind="SET_POSITION", data=[cid, x, y]):
-                # print(f"SET POSITION: Vec2({x}, {y}) of {cid}")
-                if int(cid) == -1:
+    def handle_text(self, connection: socket.socket, kind: str, data: Sequence[str]) -> None:
+        """Handles a text request, from a 'TEXT' frame or parsed by the text protocol's server
+        """
+        if self.recorder is not None and connection not in self.frame_readers: # binary requests are recorded as received
+            self.recorder.text(connection, kind, list(data), self.now())
+        self.metrics.count_received(kind, payload_size(kind, data))
+        match kind, data:
+            case "SET_POSITION", [cid, x, y, *sequence]:
+                try: # same values as the binary layout, unsequenced from older clients
+                    cid, x, y, sequence = protocol.parse_text(kind, [cid, x, y, *(sequence or ["0"])])
+                except ValueError:
+                    log.warning("'SET_POSITION' could not decode properly")
                     return
+                self.set_position(connection, cid, Vec2(x, y), sequence)
+
+            case "SET_INPUT", [_, _, _, _, _]:
                 try:
-                    loc = Vec2(float(x), float(y))
+                    cid, x, y, sequence, previous_steps = protocol.parse_text(kind, data)
                 except ValueError:
-                    print("[Warning] 'SET_POSITION' x or y could not decode properly")
+                    log.warning("'SET_INPUT' could not decode properly")
+                    return
+                self.set_input(connection, cid, simulation.decode_direction(x, y), sequence, previous_steps)
+
+            case "HELLO", [version, mode]:
+                binary = mode == "binary" and version == str(protocol.VERSION)
+                self.join(connection, binary=binary)
+
+            case "WORLD_READY", _:
+                connect_timestamp = self.connect_timestamps.pop(connection, None)
+                if connect_timestamp is None:
                     return
-                client = self.clients[int(cid)]
-                dist = client.position.distance_to(loc)
-                if dist < self.VALID_POSITION_CHANGE:
-                    client.position = loc
-                    req = networking.Request("MOVE_DUMMIE", data=[cid, x, y])
-                    self.broadcast(req, exclude=[connection])
-                else:
-                    print(f"[Info] Rejected 'SET_POSITION', responding '{cid}' with 'FORCE_POSITION'")
-                    req = networking.Request("FORCE_POSITION", data=[cid, *client.position.to_tuple()])
-                    self.send_to(req, connection=connection)
+                self.join_latencies.append(self.now() - connect_timestamp)
+                log.info("Join latency %.1f ms, median %.1f ms",
+                         self.join_latencies[-1] * 1000, statistics.median(self.join_latencies) * 1000)
+
+    def set_input(self, connection: socket.socket, cid: int, direction: Vec2, sequence: int, previous_steps: int) -> None:
+        """Moves the client towards `direction` from the next tick on, until its next input
+
+        The previous input is first moved exactly `previous_steps` from where it started, as the client did,
+        as long as the client does not get more than `MAX_STEP_LEAD` steps ahead of the server clock
+        """
+        if self.connection_cids.get(connection) != cid: # not joined yet, or not its own
+            return
+        if self.MOVEMENT != "input":
+            log.warning("Ignored 'SET_INPUT', clients send positions")
+            return
+        client = self.clients[cid]
+        steps = max(0, min(previous_steps, client.input_steps + self.MAX_STEP_LEAD - client.step_lead))
+        client.step_lead = max(-self.MAX_STEP_LEAD, client.step_lead + steps - client.input_steps)
+        loc = simulation.advance_segments(client.input_start, client.direction, client.input_radii, self.HALF_WORLD_SIZE,
+                                          steps)
+        if loc != client.position:
+            client.position = loc
+            self.sync_client(client)
+            self.snapshot.move(client.cid, loc.x, loc.y)
+        client.input_start = loc
+        client.input_radii = [(0, client.radius)]
+        client.direction = direction
+        client.input_sequence = sequence
+        client.input_steps = 0
+        client.input_changed = True
+
+    def set_position(self, connection: socket.socket, cid: int, loc: Vec2, sequence: int = 0) -> None:
+        if self.connection_cids.get(connection) != cid: # -1, not joined yet, or not its own
+            return
+        if self.MOVEMENT != "position":
+            log.warning("Ignored 'SET_POSITION', clients send inputs")
+            return
+        client = self.clients[cid]
+        now = self.now()
+        if self.MAX_POSITION_RATE and now - client.move_timestamp < 1 / self.MAX_POSITION_RATE:
+            if client.pending_position is not None: # positions are absolute, so only the newest one matters
+                self.metrics.count("dropped_positions")
+            client.pending_position = (loc, sequence)
+            self.pending_cids.add(cid)
+            return
+        if client.pending_position is not None: # older than this one
+            self.metrics.count("dropped_positions")
+            client.pending_position = None
+        self.apply_position(client, loc, sequence, now)
+
+    def apply_pending_positions(self) -> None:
+        """Applies positions held back by `MAX_POSITION_RATE` once their client may move again
+        """
+        if not self.pending_cids:
+            return
+        now = self.now()
+        interval = 1 / self.MAX_POSITION_RATE if self.MAX_POSITION_RATE else 0
+        for cid in tuple(self.pending_cids):
+            client = self.clients[cid]
+            if now - client.move_timestamp < interval:
+                continue
+            self.pending_cids.discard(cid)
+            if client.pending_position is not None:
+                loc, sequence = client.pending_position
+                client.pending_position = None
+                self.apply_position(client, loc, sequence, now)
+
+    def apply_position(self, client: Client, loc: Vec2, sequence: int, now: float) -> None:
+        # the client moves `simulation.speed` per second at most, which it may save up for `MOVE_BURST`
+        client.move_budget = min(client.move_budget + simulation.max_distance(client.radius, now - client.move_timestamp),
+                                 simulation.max_distance(client.radius, self.MOVE_BURST))
+        client.move_timestamp = now
+        dist = client.position.distance_to(loc)
+        if dist <= client.move_budget + self.MOVE_TOLERANCE:
+            client.move_budget = max(0, client.move_budget - dist)
+            client.position = loc
+            self.sync_client(client)
+            self.snapshot.move(client.cid, loc.x, loc.y)
+        elif sequence: # the client replays what it moved since onto the correction
+            log.info("Rejected 'SET_POSITION' %d of '%d', correcting with the next 'DELTA'", sequence, client.cid)
+            self.snapshot.correct(client.cid, sequence, *client.position.to_tuple())
+        else:
+            log.info("Rejected 'SET_POSITION', responding '%d' with 'FORCE_POSITION'", client.cid)
+            self.send_message(client.connection, "FORCE_POSITION", [client.cid, *client.position.to_tuple()])
+
+    def server_time(self) -> float:
+        """Seconds since start, sent with every 'DELTA'
+        """
+        return self.now() - self.start_timestamp
+
+    def move_clients(self, steps: int) -> None:
+        """Moves clients that send inputs by `steps` fixed steps, acknowledging where each one ended up
+
+        Clients move on from where they are at their current radius, and steps moved before keep the speed of the radius
+        they had then, as the client moved one step at a time
+        """
+        if not steps:
+            return
+        for client in self.clients.values():
+            if client.direction.x == 0 and client.direction.y == 0 and not client.input_changed:
+                continue
+            if client.radius != client.input_radii[-1][1]: # ate or was eaten since
+                client.input_radii.append((client.input_steps, client.radius))
+            client.input_steps += steps
+            client.input_changed = False
+            loc = simulation.advance(client.position, client.direction, client.radius, self.HALF_WORLD_SIZE, steps)
+            if loc != client.position:
+                client.position = loc
+                self.sync_client(client)
+                self.snapshot.move(client.cid, loc.x, loc.y)
+            self.snapshot.ack(client.cid, client.input_sequence, client.input_steps, loc.x, loc.y)
 
     def make_random_position(self) -> Vec2i:
-        return Vec2i(random.randint(-self.HALF_WORLD_SIZE.x, self.HALF_WORLD_SIZE.x),
-                     random.randint(-self.HALF_WORLD_SIZE.y, self.HALF_WORLD_SIZE.y))
+        return Vec2i(self.random.randint(-self.HALF_WORLD_SIZE.x, self.HALF_WORLD_SIZE.x),
+                     self.random.randint(-self.HALF_WORLD_SIZE.y, self.HALF_WORLD_SIZE.y))
     
-    def _update(self, _delta: float) -> None:
-        if time.perf_counter() - self.food_spawn_timestamp >= self.FOOD_SPAWN_INTERVAL:
-            if len(self.foods) < self.MAX_FOOD_COUNT:
-                self.spawn_food_batch()
-            self.food_spawn_timestamp = time.perf_counter()
-        # collisions
-        foods_eaten_keys: list[tuple[int, int]] = []
+    def _update(self, delta: float) -> None:
+        self.start_event()
+        now = self.now()
+        if self.recorder is not None:
+            self.recorder.tick(delta, now)
+        metrics = self.metrics
+        self.profiler.start_tick()
+        metrics.start_tick()
+        self.apply_pending_positions()
+        self.move_clients(self.timestep.advance(delta))
+        metrics.lap("movement")
+        self.add_foods(self.food_field.refill(delta))
+        metrics.lap("food_spawn")
+        self.collide_foods()
+        metrics.lap("food_collision")
+        if len(self.clients) > 1:
+            self.collide_players()
+        metrics.lap("player_collision")
+        if now - self.broadcast_timestamp >= self.BROADCAST_INTERVAL:
+            self.broadcast_timestamp = now
+            self.send_snapshot()
+        metrics.lap("broadcast")
+        metrics.end_tick()
+        self.profiler.end_tick()
+        if self.stats_endpoint is not None:
+            self.stats_endpoint.poll(self.make_report)
+        if now - self.report_timestamp >= self.REPORT_INTERVAL:
+            self.report()
+
+    def connection_count(self) -> int:
+        return len(self.connect_timestamps.keys() | self.connection_cids.keys())
+
+    def make_report(self) -> dict[str, Any]:
+        self.metrics.gauges.update(connections=self.connection_count(), clients=len(self.clients), foods=len(self.foods),
+                                   max_rss_kib=max_rss_kib())
+        report = self.metrics.report()
+        if self.snapshot_stats.ticks:
+            report["snapshots"] = self.snapshot_stats.summary()
+        return report
+
+    def report(self) -> None:
+        """Logs the metrics as a single JSON line and starts counting traffic again
+        """
+        log.info("Metrics %s", json.dumps(self.make_report()))
+        self.metrics.reset_traffic()
+        self.snapshot_stats.reset()
+        self.profiler.dump()
+        self.report_timestamp = self.now()
+
+    def send_snapshot(self) -> None:
+        self.snapshot.time = self.server_time()
         for client in self.clients.values():
-            for food in self.foods.values():
-                dist = client.get_global_position().distance_to(food.get_global_position())
-                if (dist - food.radius + 1) < client.radius:
-                    new_radius = min(self.MAX_PLAYER_RADIUS, client.radius + food.energy)
-                    client.radius = new_radius
-                    foods_eaten_loc = food.get_global_position()
-                    food_key = foods_eaten_loc.to_tuple()
-                    if food_key not in self.foods:
-                        print("[Warning] Invalid food key checked:", food_key)
+            delta = self.make_client_delta(client)
+            if delta:
+                self.send_delta(client.connection, delta)
+        self.snapshot_stats.add_tick(self.snapshot, recipients=len(self.clients))
+        self.metrics.count("coalesced_updates", self.snapshot.coalesced)
+        self.snapshot.clear()
+        self.flush()
+
+    def make_client_delta(self, client: Client) -> Snapshot:
+        """Filters this tick's changes down to the client's area of interest,
+        spawning and despawning entities that crossed its border
+        """
+        snapshot = self.snapshot
+        delta = Snapshot()
+        delta.time = snapshot.time
+        interest = client.interest
+        x, y = client.position.to_tuple()
+        view_radius = self.VIEW_RADIUS + client.radius * self.VIEW_RADIUS_PER_RADIUS
+        keep_radius = view_radius * self.VIEW_HYSTERESIS
+        # players
+        clients = self.clients
+        known_players = interest.players
+        candidates = [cid for cid in self.collisions.query_clients(x, y, keep_radius) if cid != client.cid]
+        entered, left = interest.update_players(candidates, lambda cid: clients[cid].position.to_tuple(), x, y, view_radius)
+        for cid in left:
+            delta.despawn_player(cid)
+        for cid in entered:
+            other_client = clients[cid]
+            delta.spawn_player(cid, *other_client.position.to_tuple(), other_client.radius, *other_client.color)
+        for cid in known_players & interest.players: # already spawned, so only send changes
+            if cid in snapshot.moves:
+                delta.move(cid, *snapshot.moves[cid])
+            if cid in snapshot.forced:
+                delta.force_position(cid, *snapshot.forced[cid])
+            if cid in snapshot.radii:
+                delta.set_radius(cid, snapshot.radii[cid])
+        if client.cid in snapshot.corrections:
+            delta.correct(client.cid, *snapshot.corrections[client.cid])
+        if client.cid in snapshot.acks:
+            delta.ack(client.cid, *snapshot.acks[client.cid])
+        if client.cid in snapshot.forced:
+            delta.force_position(client.cid, *snapshot.forced[client.cid])
+        if client.cid in snapshot.radii:
+            delta.set_radius(client.cid, snapshot.radii[client.cid])
+        # foods, which never move, so spawning and eating is entering and leaving
+        foods = self.foods
+        entered, left = interest.update_foods(self.collisions.query_foods(x, y, keep_radius), foods.position,
+                                              x, y, view_radius)
+        for food_id in left:
+            delta.destroy_food(food_id)
+        for food_id in entered:
+            delta.spawn_food(food_id, *foods.position(food_id), *foods.color(food_id))
+        return delta
+
+    def sync_client(self, client: Client) -> None:
+        self.collisions.update_client(client.cid, *client.position.to_tuple(), client.radius)
+
+    def collide_foods(self) -> None:
+        clients = tuple(self.clients.values())
+        players = [(*client.position.to_tuple(), client.radius) for client in clients]
+        if hasattr(self.collisions, "eat_foods"): # resolved by the engine, e.g. strip by strip in worker processes
+            results = self.collisions.eat_foods(players, self.FOOD_REACH_MARGIN)
+        else:
+            results = self.eat_foods(players)
+        foods_eaten_ids: list[int] = []
+        for client, (radius, eaten_ids) in zip(clients, results):
+            for food_id in eaten_ids:
+                foods_eaten_ids.append(food_id)
+                self.snapshot.destroy_food(food_id)
+            if radius != client.radius:
+                client.radius = radius
+                self.snapshot.set_radius(client.cid, radius)
+                self.sync_client(client)
+
+        for food_id in sorted(foods_eaten_ids): # freed slots are reused in the same order every run
+            self.food_field.remove(food_id)
+            self.collisions.remove_food(food_id)
+
+    def eat_foods(self, players: list[tuple[float, float, float]]) -> list[tuple[float, list[int]]]:
+        """Radius after eating and eaten foods of every `(x, y, radius)` player, eating in turn
+        """
+        collisions = self.collisions
+        margin = self.FOOD_REACH_MARGIN
+        queries = [(x, y, radius + margin + simulation.FOOD_RADIUS) for x, y, radius in players]
+        return simulation.eat_in_turn(players, collisions.food_candidates(queries), self.foods.position, # type: ignore[return-value]
+                                      lambda x, y, reach: collisions.food_candidates([(x, y, reach)])[0], margin, set())
+
+    def collide_players(self) -> None:
+        # same pairs as `itertools.permutations(self.clients.values(), r=2)`,
+        # but only the ones the collision engine reports as nearby
+        mutally_killed: list[Client] = []
+        for client_a in tuple(self.clients.values()):
+            checked_cid = -1
+            while True: # query again if a kill moved or resized any client
+                x, y = client_a.position.to_tuple()
+                changed = False
+                for cid in self.collisions.player_candidates(client_a.cid, x, y, client_a.radius):
+                    if cid <= checked_cid:
                         continue
-                    foods_eaten_keys.append(food_key) # type: ignore  # tuple is of type tuple[int, int]
-                    x_raw, y_raw = food.get_global_position().to_tuple() # acquire by position
-                    x = int(x_raw)
-                    y = int(y_raw)
-                    req = networking.Request("DESTROY_FOOD", data=[x, y])
-                    self.broadcast(req)
-                    req = networking.Request("SET_RADIUS", data=[client.cid, client.radius])
-                    self.broadcast(req)
-                    
-        for food_key in foods_eaten_keys:
-            food_eaten = self.foods[food_key]
-            food_eaten.queue_free()
-            del self.foods[food_key]
-        if len(self.clients) > 1:
-            # clients killing each other
-            mutally_killed: list[Client] = []
-            for client_a, client_b in itertools.permutations(self.clients.values(), r=2):
-                dist = client_a.get_global_position().distance_to(client_b.get_global_position())
-                if dist - client_a.radius - client_b.radius < 0:
-                    if client_a.radius == self.MAX_PLAYER_RADIUS and client_b.radius == self.MAX_PLAYER_RADIUS:
-                        for killed_client in (client_a, client_b):
-                            if killed_client in mutally_killed:
-                                continue
-                            mutally_killed.append(killed_client)
-                            rand_loc = self.make_random_position()
-                            half_boundary = self.HALF_WORLD_SIZE - Vec2.ONE * int(killed_client.radius +1)
-                            loc = rand_loc.clamped(-half_boundary, half_boundary)
-                            killed_client.position = loc
-                            killed_client.radius = self.INITIAL_PLAYER_RADIUS
-                            print(f"[Info] Killed client {killed_client.cid} => 'FORCE_POSITION', A")
-                            req = networking.Request("FORCE_POSITION", data=[killed_client.cid, *loc.to_tuple()])
-                            self.broadcast(req)
-                            req = networking.Request("SET_RADIUS", data=[killed_client.cid, self.INITIAL_PLAYER_RADIUS])
-                            self.broadcast(req)
-                elif int(client_a.radius) == int(client_b.radius):
-                    continue # cannot kill with equal radius/power/size
-                dist = client_a.get_global_position().distance_to(client_b.get_global_position())
-                true_dist = dist - (client_a.radius + client_b.radius)
-                if true_dist < 0:
-                    survived_client = max(client_a, client_b, key=lambda client_arg: client_arg.radius)
-                    killed_client = min(client_a, client_b, key=lambda client_arg: client_arg.radius)
-                    survived_client.radius += killed_client.radius
-                    rand_loc = self.make_random_position()
-                    half_boundary = self.HALF_WORLD_SIZE - Vec2.ONE * int(killed_client.radius +1)
-                    loc = rand_loc.clamped(-half_boundary, half_boundary)
-                    killed_client.position = loc
-                    killed_client.radius = self.INITIAL_PLAYER_RADIUS
-                    print(f"[Info] Killed client {killed_client.cid} => 'FORCE_POSITION', B")
-                    req = networking.Request("FORCE_POSITION", data=[killed_client.cid, *loc.to_tuple()])
-                    self.broadcast(req)
-                    req = networking.Request("SET_RADIUS", data=[killed_client.cid, killed_client.radius])
-                    self.broadcast(req)
-                    # update survived client radius
-                    req = networking.Request("SET_RADIUS", data=[survived_client.cid, survived_client.radius])
-                    self.broadcast(req)
-
-
-if __name__ == "__main__":
-    server = MainServer()
+                    checked_cid = cid
+                    if self.collide_player_pair(client_a, self.clients[cid], mutally_killed):
+                        changed = True
+                        break
+                if not changed:
+                    break
+
+    def respawn_client(self, killed_client: Client) -> Vec2i:
+        rand_loc = self.make_random_position()
+        half_boundary = self.HALF_WORLD_SIZE - Vec2.ONE * int(killed_client.radius +1)
+        loc = rand_loc.clamped(-half_boundary, half_boundary)
+        killed_client.position = loc
+        killed_client.pending_position = None # sent before it knew
+        killed_client.direction = Vec2.ZERO # sends its input again once it may move
+        killed_client.input_start = loc
+        killed_client.input_radii = [(0, killed_client.radius)]
+        killed_client.input_steps = 0
+        return loc
+
+    def collide_player_pair(self, client_a: Client, client_b: Client, mutally_killed: list[Client]) -> bool:
+        """Resolves a single ordered pair of clients
+
+        Returns:
+            bool: whether any client was killed
+        """
+        killed = False
+        if not simulation.overlaps(client_a.position, client_a.radius, client_b.position, client_b.radius):
+            return killed
+        if simulation.is_mutual_kill(client_a.radius, client_b.radius):
+            for killed_client in (client_a, client_b):
+                if killed_client in mutally_killed:
+                    continue
+                mutally_killed.append(killed_client)
+                loc = self.respawn_client(killed_client)
+                killed_client.radius = simulation.INITIAL_RADIUS
+                self.sync_client(killed_client)
+                killed = True
+                log.info("Killed client %d => 'FORCE_POSITION', A", killed_client.cid)
+                self.snapshot.force_position(killed_client.cid, *loc.to_tuple())
+                self.snapshot.set_radius(killed_client.cid, simulation.INITIAL_RADIUS)
+            return killed
+        survived_client = max(client_a, client_b, key=lambda client_arg: client_arg.radius)
+        killed_client = min(client_a, client_b, key=lambda client_arg: client_arg.radius)
+        if not simulation.can_eat(survived_client.radius, killed_client.radius):
+            return killed
+        survived_client.radius += killed_client.radius
+        loc = self.respawn_client(killed_client)
+        killed_client.radius = simulation.INITIAL_RADIUS
+        self.sync_client(killed_client)
+        self.sync_client(survived_client)
+        killed = True
+        log.info("Killed client %d => 'FORCE_POSITION', B", killed_client.cid)
+        self.snapshot.force_position(killed_client.cid, *loc.to_tuple())
+        self.snapshot.set_radius(killed_client.cid, killed_client.radius)
+        # update survived client radius
+        self.snapshot.set_radius(survived_client.cid, survived_client.radius)
+        return killed
+
+class HeadlessServer(GameServer):
+    """`GameServer` without sockets, for benchmarks and tools driving it directly
+
+    Connections are any hashable, and sent messages are only counted
+    """
+
+    def __init__(self) -> None:
+        self.sent_messages = 0
+        self.sent_bytes = 0
+
+    def send_frame(self, connection: Any, frame: bytes) -> None:
+        self.sent_messages += 1
+        self.sent_bytes += len(frame)
+
+    def send_text(self, connection: Any, kind: str, data: Sequence[Any]) -> None:
+        self.sent_messages += 1
+        self.sent_bytes += payload_size(kind, data)
+
+
+def make_argument_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--engine", choices=(*ENGINES, "sharded"), default=GameServer.COLLISION_ENGINE,
+                        help="collision engine used by the server tick")
+    parser.add_argument("--shards", type=int, default=GameServer.SHARDS,
+                        help="worker processes of the sharded engine, 0 for one per core")
+    parser.add_argument("--movement", choices=("input", "position"), default=GameServer.MOVEMENT,
+                        help="whether clients send inputs the server moves them by, or their positions")
+    parser.add_argument("--position-rate", type=float, default=GameServer.MAX_POSITION_RATE,
+                        help="'SET_POSITION's applied per second and client, newer ones replace a pending one, 0 for any")
+    parser.add_argument("--broadcast-interval", type=float, default=GameServer.BROADCAST_INTERVAL,
+                        help="seconds between 'DELTA's, 0 for every tick")
+    parser.add_argument("--seed", type=int, default=GameServer.SEED, help="of the world's random numbers, 0 for a new one")
+    parser.add_argument("--record", default=GameServer.RECORD_PATH, metavar="PATH",
+                        help="append a session log to PATH, for replay.py")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"), default="info")
+    parser.add_argument("--stats-port", type=int, default=GameServer.STATS_PORT,
+                        help="serve metrics as JSON on this local port, 0 to not serve")
+    parser.add_argument("--profile-every", type=int, default=GameServer.PROFILE_EVERY,
+                        help=f"profile every n-th tick into {GameServer.PROFILE_PATH}, 0 to not profile")
+    return parser
+
+
+def configure(args: argparse.Namespace) -> None:
+    GameServer.COLLISION_ENGINE = args.engine
+    GameServer.SHARDS = args.shards
+    GameServer.BROADCAST_INTERVAL = args.broadcast_interval
+    GameServer.MOVEMENT = args.movement
+    GameServer.MAX_POSITION_RATE = args.position_rate
+    GameServer.STATS_PORT = args.stats_port
+    GameServer.PROFILE_EVERY = args.profile_every
+    GameServer.SEED = args.seed
+    GameServer.RECORD_PATH = args.record
+    logs.configure(args.log_level)
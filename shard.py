@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import os
+import atexit
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Any
+# optional dependencies
+try:
+    import numpy as np
+except ImportError:
+    np = None
+# local imports
+from collision import _CellIndex, _PackedArray, _group, NumpyCollisions, FoodKey
+import simulation
+
+# (shared memory name, shape, dtype) of an array workers attach to
+ArrayLayout = tuple[str, tuple[int, ...], str]
+
+
+class _SharedPackedArray(_PackedArray):
+    """`_PackedArray` allocated in shared memory, so worker processes read it without copying
+    """
+
+    def __init__(self, capacity: int = 256) -> None:
+        self.blocks: dict[int, shared_memory.SharedMemory] = {} # id of array: its block
+        super().__init__(capacity)
+
+    def _new_array(self, shape: tuple[int, ...], dtype: type) -> np.ndarray:
+        return _allocate(self.blocks, shape, dtype)
+
+    def _grow(self) -> None:
+        old_blocks = [self.blocks.pop(id(getattr(self, name))) for name in ("positions", "radii", "orders")]
+        super()._grow()
+        for block in old_blocks: # workers attach to the new ones with the next command
+            _release(block)
+
+    def layout(self) -> tuple[ArrayLayout, ArrayLayout, ArrayLayout]:
+        return (_layout(self.blocks, self.positions), _layout(self.blocks, self.radii), _layout(self.blocks, self.orders))
+
+    def close(self) -> None:
+        for block in self.blocks.values():
+            _release(block)
+        self.blocks.clear()
+
+
+def _allocate(blocks: dict[int, shared_memory.SharedMemory], shape: tuple[int, ...], dtype: Any) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    size = max(1, int(np.prod(shape)) * dtype.itemsize)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    array: np.ndarray = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    array.fill(0)
+    blocks[id(array)] = block
+    return array
+
+
+def _layout(blocks: dict[int, shared_memory.SharedMemory], array: np.ndarray) -> ArrayLayout:
+    return (blocks[id(array)].name, array.shape, array.dtype.str)
+
+
+def _release(block: shared_memory.SharedMemory) -> None:
+    block.close()
+    block.unlink()
+
+
+class ShardedCollisions(NumpyCollisions):
+    """`NumpyCollisions` split into vertical strips of the world, each resolved by a worker process
+
+    Clients and foods live in shared memory owned by this (front) process, which also keeps the client sockets.
+    Every pass, the strip borders are placed so each worker owns about as many clients, and a worker
+    resolves the clients it owns against everything within reach of its strip. A client moving to another strip
+    is handed off by ownership alone, as no entity data has to be copied.
+
+    Eating is resolved whole in the workers: the clients of a strip eat in turn against the foods around it,
+    and only what they ate comes back. Overlapping players are found by the workers too, while kills are applied
+    to those pairs by the front process, as every respawn draws from the world's random numbers in order
+
+    Requires `numpy` to be installed
+    """
+    name = "sharded"
+    SHARDS: int = 0 # worker processes, 0 for one per core
+    MAX_PATCHED_CLIENTS: int = 32 # changed clients checked in the front process, before resolving everything again
+    GROWTH_HALO: float = 10 # growth while eating that workers know the foods for, the front process eats beyond it
+
+    def __init__(self, cell_size: float = 0, shards: int = 0) -> None:
+        super().__init__(cell_size)
+        self.shard_count = shards or self.SHARDS or os.cpu_count() or 1
+        self.queries = _SharedPackedArray() # `(x, y, radius)` of `eat_foods`, reusing the growable arrays
+        self.owners: dict[int, int] = {} # cid: shard that resolved it last
+        self.handoffs = 0
+        self.replayed_strips = 0 # that ate again in the front process, see `eat_foods`
+        self._player_candidates: dict[int, list[int]] | None = None # resolved for all clients at once
+        self._changed_cids: set[int] = set() # since `_player_candidates` was resolved
+        context = multiprocessing.get_context()
+        self.pipes: list[Connection] = []
+        self.workers: list[multiprocessing.process.BaseProcess] = []
+        for index in range(self.shard_count):
+            front_end, worker_end = context.Pipe()
+            worker = context.Process(target=_run_worker, args=(worker_end,), name=f"shard-{index}", daemon=True)
+            worker.start()
+            worker_end.close()
+            self.pipes.append(front_end)
+            self.workers.append(worker)
+        atexit.register(self.close)
+
+    def _new_packed_array(self) -> _SharedPackedArray:
+        return _SharedPackedArray()
+
+    def close(self) -> None:
+        """Stops the workers and frees the shared memory
+        """
+        for pipe in self.pipes:
+            try:
+                pipe.send(None)
+                pipe.close()
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        self.pipes.clear()
+        self.workers.clear()
+        for packed in (self.clients, self.foods, self.queries):
+            packed.close() # type: ignore
+        atexit.unregister(self.close)
+
+    def add_client(self, cid: int, x: float, y: float, radius: float) -> None:
+        super().add_client(cid, x, y, radius)
+        self._changed_cids.add(cid)
+
+    def update_client(self, cid: int, x: float, y: float, radius: float) -> None:
+        super().update_client(cid, x, y, radius)
+        self._changed_cids.add(cid)
+
+    def remove_client(self, cid: int) -> None:
+        super().remove_client(cid)
+        self.owners.pop(cid, None)
+        self._changed_cids.add(cid)
+
+    def _borders(self, xs: np.ndarray) -> np.ndarray:
+        """Strip borders splitting `xs` evenly, where strip `i` is `[borders[i], borders[i + 1])`
+        """
+        inner = np.quantile(xs, np.arange(1, self.shard_count) / self.shard_count) if len(xs) else np.zeros(self.shard_count - 1)
+        return np.concatenate(([-np.inf], inner, [np.inf]))
+
+    def _scatter(self, command: str, borders: np.ndarray, halo: float, *arguments: Any, count: int, other_count: int) -> list[Any]:
+        """Sends a command to every worker with its strip, and returns their replies in strip order
+        """
+        for index, pipe in enumerate(self.pipes):
+            pipe.send((command, arguments, count, other_count, float(borders[index]), float(borders[index + 1]), halo))
+        return [pipe.recv() for pipe in self.pipes]
+
+    def eat_foods(self, players: list[tuple[float, float, float]], margin: float) -> list[tuple[float, list[FoodKey]]]:
+        """Radius after eating and eaten foods of every `(x, y, radius)` player, like `simulation.eat_in_turn`
+
+        Clients of different strips only affect each other through a food both would eat, so it is claimed by both
+        strips. Those strips, and strips whose foods they claim then, eat in turn again in the front process
+        """
+        if not players:
+            return []
+        packed = self.queries
+        while len(packed.radii) < len(players):
+            packed._grow()
+        block = np.asarray(players, dtype=np.float64).reshape(-1, 3)
+        packed.positions[:len(block)] = block[:, :2]
+        packed.radii[:len(block)] = block[:, 2]
+        borders = self._borders(block[:, 0])
+        halo = float(block[:, 2].max()) + margin + self.GROWTH_HALO + simulation.FOOD_RADIUS
+        foods = self.foods
+        replies = self._scatter("eat", borders, halo, *packed.layout()[:2], *foods.layout(), margin, self.cell_size,
+                                count=len(block), other_count=foods.count)
+        results: list[tuple[float, list[int]]] = [(radius, []) for radius in block[:, 2].tolist()]
+        claims: dict[int, int] = {} # food index: strip that ate it
+        replayed: set[int] = set()
+        for strip, (rows, radii, counts, eaten, unresolved) in enumerate(replies):
+            if len(unresolved):
+                replayed.add(strip)
+            for row, radius, eaten_indices in zip(rows.tolist(), radii.tolist(), np.split(eaten, np.cumsum(counts)[:-1])):
+                results[row] = (radius, eaten_indices.tolist())
+                for index in results[row][1]:
+                    if claims.setdefault(index, strip) != strip:
+                        replayed.update((strip, claims[index]))
+        strips = np.searchsorted(borders, block[:, 0], side="right") - 1
+        while replayed:
+            rows = np.flatnonzero(np.isin(strips, list(replayed))).tolist()
+            replay = self._eat_in_turn([players[row] for row in rows], margin)
+            others = {claims[index] for _, eaten_indices in replay for index in eaten_indices if index in claims} - replayed
+            if not others:
+                for row, result in zip(rows, replay):
+                    results[row] = result
+                self.replayed_strips += len(replayed)
+                break
+            replayed |= others # ate what another strip ate too, so that one eats again with them
+        keys = foods.keys
+        return [(radius, [keys[i] for i in eaten_indices]) for radius, eaten_indices in results]
+
+    def _eat_in_turn(self, players: list[tuple[float, float, float]], margin: float) -> list[tuple[float, list[int]]]:
+        """`simulation.eat_in_turn` in the front process, with food indices for keys
+        """
+        foods = self.foods
+        food_index = _CellIndex(foods.positions[:foods.count], self.cell_size)
+
+        def query(block: np.ndarray) -> list[list[int]]:
+            rows, indices = food_index.within_reach(block)
+            return _group(rows, indices, len(block), foods.orders)
+
+        block = np.array([(x, y, radius + margin + simulation.FOOD_RADIUS) for x, y, radius in players]).reshape(-1, 3)
+        return simulation.eat_in_turn(players, query(block), foods.positions[:foods.count].tolist().__getitem__, # type: ignore[return-value]
+                                      lambda x, y, reach: query(np.array([(x, y, reach)]))[0], margin, set())
+
+    def player_candidates(self, cid: int, x: float, y: float, radius: float) -> list[int]:
+        """Clients overlapping a circle at (`x`, `y`), in insertion order
+        """
+        clients = self.clients
+        i = clients.index[cid]
+        if (clients.positions[i, 0], clients.positions[i, 1], clients.radii[i]) != (x, y, radius): # not synced
+            return super().player_candidates(cid, x, y, radius)
+        changed_cids = self._changed_cids
+        if self._player_candidates is None or len(changed_cids) > max(self.MAX_PATCHED_CLIENTS, clients.count // 8):
+            self._player_candidates = self._resolve_players()
+            changed_cids.clear()
+        if not changed_cids:
+            return self._player_candidates[cid]
+        if cid in changed_cids: # moved or resized since, like a client that was just killed
+            return super().player_candidates(cid, x, y, radius)
+        # patch the resolved candidates with only the clients that changed
+        candidates = [other_cid for other_cid in self._player_candidates[cid] if other_cid not in changed_cids]
+        indices = np.fromiter((clients.index[other_cid] for other_cid in changed_cids if other_cid in clients.index), dtype=np.intp)
+        delta = clients.positions[indices] - (x, y)
+        reach = clients.radii[indices] + radius + 1e-6
+        overlapping = indices[np.einsum("ij,ij->i", delta, delta) < reach * reach]
+        candidates.extend(clients.keys[j] for j in overlapping.tolist() if j != i)
+        candidates.sort(key=lambda other_cid: clients.orders[clients.index[other_cid]])
+        return candidates
+
+    def _resolve_players(self) -> dict[int, list[int]]:
+        clients = self.clients
+        count = clients.count
+        xs = clients.positions[:count, 0]
+        borders = self._borders(xs)
+        owners = np.searchsorted(borders, xs, side="right") - 1
+        for cid, owner in zip(clients.keys, owners.tolist()):
+            if self.owners.get(cid, owner) != owner:
+                self.handoffs += 1
+            self.owners[cid] = owner
+        max_radius = float(clients.radii[:count].max()) if count else 0.0
+        replies = self._scatter("players", borders, max_radius, *clients.layout()[:2], count=count, other_count=count)
+        rows = np.concatenate([rows for rows, _ in replies])
+        columns = np.concatenate([columns for _, columns in replies])
+        keys = clients.keys
+        return {keys[i]: [keys[j] for j in group] for i, group in enumerate(_group(rows, columns, count, clients.orders))}
+
+
+def _run_worker(pipe: Connection) -> None:
+    attached: dict[str, tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+    def attach(layouts: tuple[ArrayLayout, ...]) -> list[np.ndarray]:
+        names = {name for name, _, _ in layouts}
+        for name in tuple(attached): # freed by the front process after growing
+            if name not in names:
+                attached.pop(name)[0].close()
+        arrays: list[np.ndarray] = []
+        for name, shape, dtype in layouts:
+            if name not in attached:
+                block = shared_memory.SharedMemory(name=name) # the front process unlinks it
+                attached[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+            arrays.append(attached[name][1])
+        return arrays
+
+    while True:
+        try:
+            command = pipe.recv()
+        except EOFError:
+            break
+        if command is None:
+            break
+        kind, arguments, count, other_count, low, high, halo = command
+        match kind:
+            case "eat":
+                *layouts, margin, cell_size = arguments
+                positions, radii, food_positions, _, food_orders = attach(layouts)
+                result = _eat_foods(positions[:count], radii[:count], food_positions[:other_count],
+                                    food_orders[:other_count], low, high, halo, margin, cell_size)
+            case "players":
+                positions, radii = attach(arguments)
+                result = _resolve_players(positions[:count], radii[:count], low, high, halo)
+            case _:
+                result = None
+        pipe.send(result)
+    for block, _ in attached.values():
+        block.close()
+
+
+def _strip(xs: np.ndarray, low: float, high: float) -> np.ndarray:
+    return np.flatnonzero((xs >= low) & (xs < high))
+
+
+def _eat_foods(positions: np.ndarray, radii: np.ndarray, food_positions: np.ndarray, food_orders: np.ndarray,
+               low: float, high: float, halo: float, margin: float, cell_size: float) -> tuple[np.ndarray, ...]:
+    """Lets the players of the strip eat in turn, against the foods within `halo` of it
+
+    Returns:
+        tuple[np.ndarray, ...]: rows of the players that ate, their radii after eating, how many foods each ate,
+            the eaten foods of one player after another, and rows of players that grew past what is known here
+    """
+    owned = _strip(positions[:, 0], low, high)
+    nearby = _strip(food_positions[:, 0], low - halo, high + halo) # foods across the border are still in reach
+    food_index = _CellIndex(food_positions[nearby], cell_size)
+    nearby_orders = food_orders[nearby]
+
+    def query(block: np.ndarray) -> list[list[int]]:
+        rows, indices = food_index.within_reach(block)
+        return _group(rows, indices, len(block), nearby_orders)
+
+    def query_again(x: float, y: float, reach: float) -> list[int] | None:
+        if reach > halo: # foods further out are not known here
+            return None
+        return query(np.array([(x, y, reach)]))[0]
+
+    players = np.column_stack((positions[owned], radii[owned])).tolist()
+    block = np.column_stack((positions[owned], radii[owned] + margin + simulation.FOOD_RADIUS))
+    results = simulation.eat_in_turn(players, query(block), food_positions[nearby].tolist().__getitem__,
+                                     query_again, margin, set())
+    rows: list[int] = []
+    grown_radii: list[float] = []
+    counts: list[int] = []
+    eaten: list[int] = []
+    unresolved: list[int] = []
+    for row, result in zip(owned.tolist(), results):
+        if result is None:
+            unresolved.append(row)
+        elif result[1]:
+            rows.append(row)
+            grown_radii.append(result[0])
+            counts.append(len(result[1]))
+            eaten.extend(result[1])
+    return (np.array(rows, dtype=np.intp), np.array(grown_radii), np.array(counts, dtype=np.intp),
+            nearby[np.array(eaten, dtype=np.intp)], np.array(unresolved, dtype=np.intp))
+
+
+def _resolve_players(positions: np.ndarray, radii: np.ndarray, low: float, high: float, max_radius: float) -> tuple[np.ndarray, np.ndarray]:
+    owned = _strip(positions[:, 0], low, high)
+    halo = 2 * max_radius + 1e-6 # no overlap can reach further than two of the biggest radii
+    nearby = _strip(positions[:, 0], low - halo, high + halo)
+    delta = positions[owned, None, :] - positions[None, nearby, :]
+    dist_squared = np.einsum("ijk,ijk->ij", delta, delta)
+    reach = radii[owned, None] + radii[None, nearby] + 1e-6 # same test as `NumpyCollisions.player_candidates`
+    rows, columns = np.nonzero(dist_squared < reach * reach)
+    rows = owned[rows]
+    columns = nearby[columns]
+    not_self = rows != columns
+    return (rows[not_self], columns[not_self])
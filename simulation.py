@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import Callable, Hashable, Iterable, Sequence, TypeVar
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+
+# Game rules shared by the server, the client and the bots, without any node, engine or rendering.
+# Movement advances in fixed steps of `TIMESTEP`, so it is the same at any frame rate
+
+TIMESTEP: float = 1 / 60 # seconds per simulation step
+MAX_STEPS: int = 8 # per update, the rest is dropped when an update took too long
+INITIAL_RADIUS: int = 10
+MAX_RADIUS: int = 100
+FOOD_RADIUS: int = 3 # this is constant on both sides
+FOOD_ENERGY: float = 0.2
+SPEED_PER_RADIUS: float = 0.02 # per step, for every radius below `MAX_RADIUS`
+BASE_SPEED: float = 1 # per step, at `MAX_RADIUS`
+INPUT_RESOLUTION: int = 127 # input directions are sent as int8 per axis
+
+FoodKey = TypeVar("FoodKey", bound=Hashable)
+
+
+def speed(radius: float) -> float:
+    """Distance moved per second, slower the bigger the player is
+    """
+    radius = min(radius, MAX_RADIUS) # may grow past it by eating a player, until it eats food
+    return ((MAX_RADIUS - radius + 1) * SPEED_PER_RADIUS + BASE_SPEED) / TIMESTEP
+
+
+def max_distance(radius: float, seconds: float) -> float:
+    return speed(radius) * seconds
+
+
+def clamp_to_world(loc: Vec2, radius: float, half_world_size: Vec2) -> Vec2:
+    """Keeps the whole circle inside the world
+    """
+    half_boundary = Vec2(half_world_size.x - int(radius), half_world_size.y - int(radius))
+    return loc.clamped(-half_boundary, half_boundary)
+
+
+def step(loc: Vec2, direction: Vec2, radius: float, half_world_size: Vec2) -> Vec2:
+    """Moves one `TIMESTEP` towards `direction`
+
+    Args:
+        loc (Vec2): position before the step
+        direction (Vec2): wanted direction, normalized here, so any length but zero moves at full speed
+        radius (float): radius of the player
+        half_world_size (Vec2): half of the world size
+
+    Returns:
+        Vec2: position after the step
+    """
+    if direction.x == 0 and direction.y == 0:
+        return loc
+    return clamp_to_world(loc + direction.normalized() * (speed(radius) * TIMESTEP), radius, half_world_size)
+
+
+def advance(loc: Vec2, direction: Vec2, radius: float, half_world_size: Vec2, steps: int) -> Vec2:
+    """Same as `steps` calls to `step` at one radius, in one go
+
+    Clamping to the world box is separate per axis and the direction does not change,
+    so clamping once at the end lands where clamping every step would
+    """
+    if steps <= 0 or (direction.x == 0 and direction.y == 0):
+        return loc
+    return clamp_to_world(loc + direction.normalized() * (speed(radius) * TIMESTEP * steps), radius, half_world_size)
+
+
+def advance_segments(loc: Vec2, direction: Vec2, segments: Sequence[tuple[int, float]], half_world_size: Vec2,
+                     steps: int) -> Vec2:
+    """Same as `steps` calls to `step` while the radius changes, one `advance` per stretch at one radius
+
+    Args:
+        segments (Sequence[tuple[int, float]]): first step and radius of each stretch, in order, from step 0
+    """
+    for i, (first_step, radius) in enumerate(segments):
+        if first_step >= steps:
+            break
+        end_step = segments[i + 1][0] if i + 1 < len(segments) else steps
+        loc = advance(loc, direction, radius, half_world_size, min(end_step, steps) - first_step)
+    return loc
+
+
+def encode_direction(direction: Vec2) -> tuple[int, int]:
+    if direction.x == 0 and direction.y == 0:
+        return (0, 0)
+    normalized = direction.normalized()
+    return (round(normalized.x * INPUT_RESOLUTION), round(normalized.y * INPUT_RESOLUTION))
+
+
+def decode_direction(x: int, y: int) -> Vec2:
+    """Direction as the server sees it, which is also what the client should predict with
+    """
+    return Vec2(x / INPUT_RESOLUTION, y / INPUT_RESOLUTION)
+
+
+def eats_food(loc: Vec2, radius: float, food_loc: Vec2) -> bool:
+    return loc.distance_to(food_loc) - FOOD_RADIUS + 1 < radius
+
+
+def grow(radius: float) -> float:
+    """Radius after eating a food
+    """
+    return min(MAX_RADIUS, radius + FOOD_ENERGY)
+
+
+def eat_foods(loc: Vec2, radius: float, foods: Iterable[tuple[FoodKey, float, float]],
+              eaten: set[FoodKey]) -> tuple[float, list[FoodKey]]:
+    """Foods a player eats out of `foods`, `(key, x, y)` in insertion order, growing with every food
+
+    Returns:
+        tuple[float, list[FoodKey]]: radius after eating, and the keys of the eaten foods, which are not in `eaten`
+    """
+    eaten_keys: list[FoodKey] = []
+    for key, x, y in foods:
+        if key in eaten: # cannot be eaten twice
+            continue
+        if eats_food(loc, radius, Vec2(x, y)):
+            radius = grow(radius)
+            eaten_keys.append(key)
+    return radius, eaten_keys
+
+
+def eat_in_turn(players: Sequence[tuple[float, float, float]], candidates: Sequence[Sequence[FoodKey]],
+                position_of: Callable[[FoodKey], tuple[float, float]],
+                query: Callable[[float, float, float], Sequence[FoodKey] | None],
+                margin: float, eaten: set[FoodKey]) -> list[tuple[float, list[FoodKey]] | None]:
+    """Lets every `(x, y, radius)` player eat in turn, as if it checked every food in insertion order
+
+    Args:
+        players (Sequence[tuple[float, float, float]]): in the order they eat
+        candidates (Sequence[Sequence[FoodKey]]): foods within `radius + margin + FOOD_RADIUS` of each player, in insertion order
+        position_of (Callable[[FoodKey], tuple[float, float]]): position of a food
+        query (Callable[[float, float, float], Sequence[FoodKey] | None]): foods within reach of (x, y), for a player
+            that grew past `radius + margin` while eating, or `None` if they are not known
+        margin (float): growth covered by `candidates`
+        eaten (set[FoodKey]): foods eaten before, which this adds to
+
+    Returns:
+        list[tuple[float, list[FoodKey]] | None]: radius after eating and eaten foods of each player,
+            `None` for a player `query` could not answer for, which eats nothing
+    """
+    results: list[tuple[float, list[FoodKey]] | None] = []
+    for (x, y, radius), foods in zip(players, candidates):
+        if not foods:
+            results.append((radius, []))
+            continue
+        loc = Vec2(x, y)
+        queried_radius = radius + margin
+        while True:
+            grown_radius, eaten_keys = eat_foods(loc, radius, ((key, *position_of(key)) for key in foods), eaten)
+            if grown_radius <= queried_radius:
+                break
+            # grew out of what was queried, so foods further out may be eaten too, even ones passed already
+            queried_radius = grown_radius + margin
+            foods = query(x, y, queried_radius + FOOD_RADIUS) # type: ignore[assignment]
+            if foods is None:
+                break
+        if foods is None:
+            results.append(None)
+            continue
+        eaten.update(eaten_keys)
+        results.append((grown_radius, eaten_keys))
+    return results
+
+
+def overlaps(loc: Vec2, radius: float, other_loc: Vec2, other_radius: float) -> bool:
+    return loc.distance_to(other_loc) - radius - other_radius < 0
+
+
+def can_eat(radius: float, other_radius: float) -> bool:
+    """Whether a player can eat another one it overlaps, as equal radius/power/size cannot kill
+    """
+    return int(radius) > int(other_radius)
+
+
+def is_mutual_kill(radius: float, other_radius: float) -> bool:
+    """Two players at `MAX_RADIUS` kill each other
+    """
+    return radius == MAX_RADIUS and other_radius == MAX_RADIUS
+
+
+class FixedTimestep:
+    """Turns variable update deltas into a whole number of `TIMESTEP`s, keeping the remainder for the next update
+    """
+
+    def __init__(self, timestep: float = TIMESTEP, max_steps: int = MAX_STEPS) -> None:
+        self.timestep = timestep
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+    def advance(self, delta: float) -> int:
+        """Returns how many steps to run for an update of `delta` seconds
+        """
+        self.accumulator += delta
+        steps = int(self.accumulator // self.timestep)
+        self.accumulator -= steps * self.timestep
+        return min(steps, self.max_steps)
+
+    def reset(self) -> None:
+        self.accumulator = 0.0
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Iterator
+
+# section tags used in the flat `DELTA` data list: [tag, count, *records, tag, count, *records, ...]
+TIME = "T" # server time, first in every 'DELTA'
+MOVES = "M" # cid, x, y
+CORRECTIONS = "C" # cid, sequence, x, y
+ACKS = "K" # cid, input sequence, steps moved with it, x, y
+FORCED = "F" # cid, x, y
+RADII = "R" # cid, radius
+FOODS_ADDED = "A" # food ID, x, y, red, green, blue
+FOODS_REMOVED = "D" # food ID
+PLAYERS_ADDED = "P" # cid, x, y, radius, red, green, blue
+PLAYERS_REMOVED = "Q" # cid
+RECORD_TYPES: dict[str, tuple[type, ...]] = {
+    TIME: (float,),
+    MOVES: (int, float, float),
+    CORRECTIONS: (int, int, float, float),
+    ACKS: (int, int, int, float, float),
+    FORCED: (int, float, float),
+    RADII: (int, float),
+    FOODS_ADDED: (int, float, float, int, int, int),
+    FOODS_REMOVED: (int,),
+    PLAYERS_ADDED: (int, float, float, float, int, int, int),
+    PLAYERS_REMOVED: (int,)
+}
+
+
+def payload_size(kind: str, data: Iterable[Any]) -> int:
+    """Approximate text size of a request, used for comparing traffic
+    """
+    return len(kind) + sum(len(str(value)) + 1 for value in data)
+
+
+def flatten(records: Iterable[tuple[str, tuple[Any, ...]]]) -> list[Any]:
+    """Flattens `(tag, record)` pairs, grouped by tag, into a text data list
+    """
+    data: list[Any] = []
+    tag = ""
+    count_index = 0
+    for record_tag, record in records:
+        if record_tag != tag: # start new section
+            tag = record_tag
+            data.extend((tag, 0))
+            count_index = len(data) - 1
+        data.extend(record)
+        data[count_index] += 1
+    return data
+
+
+def parse_sections(data: list[str]) -> Iterator[tuple[str, list[tuple[Any, ...]]]]:
+    """Splits a text `DELTA` data list into `(tag, records)`, with the same value types as the binary protocol
+    """
+    index = 0
+    while index < len(data):
+        tag = data[index]
+        count = int(data[index + 1])
+        types = RECORD_TYPES[tag]
+        size = len(types)
+        index += 2
+        records = [tuple(value_type(value) for value_type, value in zip(types, data[start:start + size]))
+                   for start in range(index, index + count * size, size)]
+        index += count * size
+        yield (tag, records)
+
+
+class Snapshot:
+    """World changes collected since the last broadcast, sent as a single `DELTA` request
+
+    Only the latest value per entity is kept, and food that is both spawned and eaten within the tick is dropped
+    """
+
+    def __init__(self) -> None:
+        self.time: float | None = None # server time when sent, for interpolating on the client
+        self.moves: dict[int, tuple[float, float]] = {}
+        self.corrections: dict[int, tuple[int, float, float]] = {}
+        self.acks: dict[int, tuple[int, int, float, float]] = {}
+        self.forced: dict[int, tuple[float, float]] = {}
+        self.radii: dict[int, float] = {}
+        self.foods_added: dict[int, tuple[Any, ...]] = {}
+        self.foods_removed: dict[int, tuple[Any, ...]] = {}
+        self.players_added: dict[int, tuple[Any, ...]] = {}
+        self.players_removed: dict[int, tuple[Any, ...]] = {}
+        self.events = 0 # number of per-event requests this snapshot replaces
+        self.event_bytes = 0 # and their size
+        self.coalesced = 0 # records replaced by a newer value for the same entity, or dropped with it
+
+    def __bool__(self) -> bool:
+        return bool(self.moves or self.corrections or self.acks or self.forced or self.radii or self.foods_added or self.foods_removed
+                    or self.players_added or self.players_removed)
+
+    def clear(self) -> None:
+        self.time = None
+        self.moves.clear()
+        self.corrections.clear()
+        self.acks.clear()
+        self.forced.clear()
+        self.radii.clear()
+        self.foods_added.clear()
+        self.foods_removed.clear()
+        self.players_added.clear()
+        self.players_removed.clear()
+        self.events = 0
+        self.event_bytes = 0
+        self.coalesced = 0
+
+    def _count_event(self, kind: str, *data: Any) -> None:
+        self.events += 1
+        self.event_bytes += payload_size(kind, data)
+
+    def move(self, cid: int, x: float, y: float) -> None:
+        self.coalesced += cid in self.moves
+        self.moves[cid] = (x, y)
+        self._count_event("MOVE_DUMMIE", cid, x, y)
+
+    def correct(self, cid: int, sequence: int, x: float, y: float) -> None:
+        """Where the server still has a client after rejecting its position `sequence`
+        """
+        self.coalesced += cid in self.corrections
+        self.corrections[cid] = (sequence, x, y)
+        self._count_event("FORCE_POSITION", cid, x, y)
+
+    def ack(self, cid: int, sequence: int, steps: int, x: float, y: float) -> None:
+        """Where the server moved a client after `steps` with its input `sequence`
+        """
+        self.coalesced += cid in self.acks
+        self.acks[cid] = (sequence, steps, x, y)
+
+    def force_position(self, cid: int, x: float, y: float) -> None:
+        self.coalesced += self.moves.pop(cid, None) is not None # applied after moves anyway
+        self.coalesced += cid in self.forced
+        self.forced[cid] = (x, y)
+        self._count_event("FORCE_POSITION", cid, x, y)
+
+    def set_radius(self, cid: int, radius: float) -> None:
+        self.coalesced += cid in self.radii
+        self.radii[cid] = radius
+        self._count_event("SET_RADIUS", cid, radius)
+
+    def spawn_food(self, food_id: int, x: float, y: float, red: int, green: int, blue: int) -> None:
+        self.foods_removed.pop(food_id, None) # ID reused, clients replace the food they know
+        self.foods_added[food_id] = (food_id, x, y, red, green, blue)
+        self._count_event("SPAWN_FOOD", food_id, x, y, red, green, blue)
+
+    def destroy_food(self, food_id: int) -> None:
+        self._count_event("DESTROY_FOOD", food_id)
+        if self.foods_added.pop(food_id, None) is not None: # never seen by any client
+            self.coalesced += 2
+            return
+        self.foods_removed[food_id] = (food_id,)
+
+    def spawn_player(self, cid: int, x: float, y: float, radius: float, red: int, green: int, blue: int) -> None:
+        self.players_removed.pop(cid, None)
+        self.players_added[cid] = (cid, x, y, radius, red, green, blue)
+        self._count_event("SPAWN_PLAYER", cid, x, y, radius, red, green, blue)
+
+    def despawn_player(self, cid: int) -> None:
+        self._count_event("DESPAWN_PLAYER", cid)
+        if self.players_added.pop(cid, None) is not None:
+            self.coalesced += 2
+            return
+        self.players_removed[cid] = (cid,)
+
+    def merge(self, later: Snapshot) -> int:
+        """Folds a later snapshot into this one, as if both had been collected as one
+
+        Returns:
+            int: number of moves and radii that replaced an older value
+        """
+        replaced = 0
+        if later.time is not None:
+            self.time = later.time
+        for cid, (x, y) in later.moves.items():
+            if cid in self.players_added: # not spawned on the client yet, so update the spawn
+                self.players_added[cid] = (cid, x, y, *self.players_added[cid][3:])
+                replaced += 1
+            elif cid in self.forced:
+                self.forced[cid] = (x, y)
+                replaced += 1
+            else:
+                replaced += cid in self.moves
+                self.moves[cid] = (x, y)
+        for cid, correction in later.corrections.items():
+            replaced += cid in self.corrections
+            self.corrections[cid] = correction # only the newest sequence matters
+        for cid, ack in later.acks.items():
+            replaced += cid in self.acks
+            self.acks[cid] = ack
+        for cid, (x, y) in later.forced.items():
+            if cid in self.players_added:
+                self.players_added[cid] = (cid, x, y, *self.players_added[cid][3:])
+                replaced += 1
+                continue
+            replaced += self.moves.pop(cid, None) is not None
+            self.forced[cid] = (x, y)
+        for cid, radius in later.radii.items():
+            if cid in self.players_added:
+                record = self.players_added[cid]
+                self.players_added[cid] = (*record[:3], radius, *record[4:])
+                replaced += 1
+            else:
+                replaced += cid in self.radii
+                self.radii[cid] = radius
+        for food_id, record in later.foods_added.items():
+            self.foods_removed.pop(food_id, None)
+            self.foods_added[food_id] = record
+        for food_id, record in later.foods_removed.items():
+            if self.foods_added.pop(food_id, None) is None:
+                self.foods_removed[food_id] = record
+        for cid, record in later.players_added.items():
+            self.players_removed.pop(cid, None)
+            self.players_added[cid] = record
+        for cid, record in later.players_removed.items():
+            if self.players_added.pop(cid, None) is None:
+                self.players_removed[cid] = record
+        self.events += later.events
+        self.event_bytes += later.event_bytes
+        return replaced
+
+    def _records(self) -> Iterator[tuple[str, tuple[Any, ...]]]:
+        if self.time is not None:
+            yield (TIME, (self.time,))
+        for cid, loc in self.moves.items():
+            yield (MOVES, (cid, *loc))
+        for cid, correction in self.corrections.items():
+            yield (CORRECTIONS, (cid, *correction))
+        for cid, ack in self.acks.items():
+            yield (ACKS, (cid, *ack))
+        for cid, loc in self.forced.items():
+            yield (FORCED, (cid, *loc))
+        for cid, radius in self.radii.items():
+            yield (RADII, (cid, radius))
+        for record in self.foods_added.values():
+            yield (FOODS_ADDED, record)
+        for record in self.foods_removed.values():
+            yield (FOODS_REMOVED, record)
+        for record in self.players_added.values():
+            yield (PLAYERS_ADDED, record)
+        for record in self.players_removed.values():
+            yield (PLAYERS_REMOVED, record)
+
+    def split(self, max_records: int) -> list[list[tuple[str, tuple[Any, ...]]]]:
+        """Splits the `(tag, record)` pairs into chunks of at most `max_records`
+        """
+        records = list(self._records())
+        return [records[start:start + max_records] for start in range(0, len(records), max_records)] or [[]]
+
+    def encode(self, max_values: int) -> list[list[Any]]:
+        """Encodes into one or more flat data lists, each holding at most about `max_values` values
+        """
+        chunks: list[list[Any]] = []
+        chunk: list[Any] = []
+        tag = ""
+        count_index = 0
+        for record_tag, record in self._records():
+            if len(chunk) + len(record) + 2 > max_values and chunk:
+                chunks.append(chunk)
+                chunk = []
+                tag = ""
+            if record_tag != tag: # start new section
+                tag = record_tag
+                chunk.extend((tag, 0))
+                count_index = len(chunk) - 1
+            chunk.extend(record)
+            chunk[count_index] += 1
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
+class SnapshotStats:
+    """Counts traffic sent through snapshots, next to what per-event requests would have cost
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.ticks = 0
+        self.messages = 0
+        self.bytes = 0
+        self.legacy_messages = 0
+        self.legacy_bytes = 0
+
+    def add_tick(self, snapshot: Snapshot, recipients: int) -> None:
+        self.ticks += 1
+        # one request per event, each sent to every connection
+        self.legacy_messages += snapshot.events * recipients
+        self.legacy_bytes += snapshot.event_bytes * recipients
+
+    def add_sent(self, messages: int, size: int) -> None:
+        self.messages += messages
+        self.bytes += size
+
+    def summary(self) -> str:
+        ticks = max(1, self.ticks)
+        return (f"{self.messages / ticks:.1f} msgs/tick (per-event {self.legacy_messages / ticks:.1f}), "
+                f"{self.bytes / ticks:.0f} bytes/tick (per-event {self.legacy_bytes / ticks:.0f})")
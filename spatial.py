@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import math
+from typing import Callable, Hashable, TypeVar, Generic
+
+Key = TypeVar("Key", bound=Hashable)
+
+
+class SpatialHash(Generic[Key]):
+    """Uniform grid over the world, storing keys (cid, food key, ...) by position
+
+    Keys are moved incrementally and only touch the grid when crossing a cell border.
+    Queries return keys in insertion order, matching the order of the dicts they index
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], set[Key]] = {}
+        self._locations: dict[Key, tuple[int, int]] = {}
+        self._order: dict[Key, int] = {}
+        self._order_counter = 0
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._locations
+
+    def cell_of(self, x: float, y: float) -> tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, key: Key, x: float, y: float) -> None:
+        if key in self._locations:
+            self.move(key, x, y)
+            return
+        cell = self.cell_of(x, y)
+        self._cells.setdefault(cell, set()).add(key)
+        self._locations[key] = cell
+        self._order[key] = self._order_counter
+        self._order_counter += 1
+
+    def move(self, key: Key, x: float, y: float) -> None:
+        old_cell = self._locations[key]
+        new_cell = self.cell_of(x, y)
+        if new_cell == old_cell:
+            return
+        self._discard_from_cell(key, old_cell)
+        self._cells.setdefault(new_cell, set()).add(key)
+        self._locations[key] = new_cell
+
+    def remove(self, key: Key) -> None:
+        cell = self._locations.pop(key)
+        del self._order[key]
+        self._discard_from_cell(key, cell)
+
+    def discard(self, key: Key) -> None:
+        if key in self._locations:
+            self.remove(key)
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._locations.clear()
+        self._order.clear()
+
+    def _discard_from_cell(self, key: Key, cell: tuple[int, int]) -> None:
+        bucket = self._cells[cell]
+        bucket.discard(key)
+        if not bucket: # keep the grid sparse
+            del self._cells[cell]
+
+    def query(self, x: float, y: float, radius: float, ordered: bool = True) -> list[Key]:
+        """Returns every key in the cells overlapping the square around (`x`, `y`)
+
+        This is a broad phase only, so callers still do their exact distance check.
+        Pass `ordered=False` to skip sorting by insertion order when the order does not matter
+        """
+        min_cx, min_cy = self.cell_of(x - radius, y - radius)
+        max_cx, max_cy = self.cell_of(x + radius, y + radius)
+        found: list[Key] = []
+        cells = self._cells
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(cells): # sparse grid, walk the filled cells instead
+            for (cx, cy), bucket in cells.items():
+                if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy:
+                    found.extend(bucket)
+        else:
+            for cx in range(min_cx, max_cx + 1):
+                for cy in range(min_cy, max_cy + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        found.extend(bucket)
+        if ordered:
+            found.sort(key=self._order.__getitem__)
+        return found
+
+    def nearest(self, x: float, y: float, max_range: float, position_of: Callable[[Key], tuple[float, float]]) -> Key | None:
+        """Returns the key closest to (`x`, `y`) and closer than `max_range`, the first inserted one on ties
+
+        Args:
+            x (float): x of the point to search from
+            y (float): y of the point to search from
+            max_range (float): exclusive search distance
+            position_of (Callable[[Key], tuple[float, float]]): exact position of a key, as only cells are stored
+
+        Returns:
+            Key | None: the closest key, or None if none is in range
+        """
+        closest: Key | None = None
+        closest_dist_squared = max_range * max_range
+        for key in self.query(x, y, max_range):
+            key_x, key_y = position_of(key)
+            dist_squared = (key_x - x) ** 2 + (key_y - y) ** 2
+            if dist_squared < closest_dist_squared:
+                closest = key
+                closest_dist_squared = dist_squared
+        return closest
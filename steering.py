@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import math
+import random
+from typing import Iterable
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+# local imports
+import simulation
+
+
+class BotSteering: # Component (mixin class)
+    """Wandering bot AI, without any node or rendering, so headless bots can share it
+    """
+    direction = Vec2.RIGHT
+    SIGHT_RANGE: int = 70
+    BOUNDARY_WILL_START: float = 0.6
+    BOUNDARY_AVOIDANCE: float = 0.15
+    FOOD_WILL: float = 0.25
+    PREY_WILL: float = 0.2
+    THREAT_AVOIDANCE: float = 0.35
+
+    def steer(self, loc: Vec2, radius: float, closest_food: Vec2 | None,
+              nearby_players: Iterable[tuple[Vec2, float]], half_world_size: Vec2) -> Vec2:
+        """Turns `direction` a bit at random, towards food and smaller players in sight,
+        and away from bigger players and the border
+
+        Args:
+            loc (Vec2): global position of the bot
+            radius (float): radius of the bot
+            closest_food (Vec2 | None): position of the closest food within `SIGHT_RANGE`
+            nearby_players (Iterable[tuple[Vec2, float]]): position and radius of other players within `SIGHT_RANGE`
+            half_world_size (Vec2): half of the world size
+
+        Returns:
+            Vec2: the new direction
+        """
+        angle = math.radians(random.randint(-12, 12))
+        self.direction = self.direction.rotated(angle)
+        if closest_food is not None:
+            dir_to_closest_food = loc.direction_to(closest_food)
+            self.direction = self.direction.lerp(dir_to_closest_food, self.FOOD_WILL).normalized()
+        for other_loc, other_radius in nearby_players:
+            if other_loc == loc:
+                continue
+            if simulation.can_eat(other_radius, radius): # threat
+                self.direction = self.direction.lerp(other_loc.direction_to(loc), self.THREAT_AVOIDANCE).normalized()
+            elif simulation.can_eat(radius, other_radius): # prey
+                self.direction = self.direction.lerp(loc.direction_to(other_loc), self.PREY_WILL).normalized()
+        # bias for moving close to border
+        origin = Vec2.ZERO
+        dist_to_center = loc.distance_to(origin)
+        dir_to_center = loc.direction_to(origin)
+        dist_to_corner = half_world_size.length()
+        if dist_to_center == 0:
+            dist_to_center = 0.1
+        ratio = dist_to_center / dist_to_corner
+        if ratio >= self.BOUNDARY_WILL_START: # kinda close to edge
+            self.direction = self.direction.lerp(dir_to_center, self.BOUNDARY_AVOIDANCE * ratio)
+        return self.direction
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import math
+import time
+import signal
+import socket
+import struct
+import argparse
+import selectors
+import multiprocessing
+from typing import Any, Iterable
+# dependencies
+from displaylib.math import Vec2, Vec2i # type: ignore
+# local imports
+from steering import BotSteering
+from prediction import Prediction
+import simulation
+from spatial import SpatialHash
+import snapshot
+import protocol
+import logs
+
+log = logs.get_logger("swarm")
+
+
+class HeadlessBot(BotSteering, Prediction):
+    """`bot.Bot` without a window, node tree or engine, keeping its own connection and cid
+
+    Speaks the binary protocol only, and keeps just the state the steering needs
+    """
+    CHILL_TIME: float = 0.3
+    CELL_SIZE: int = 128
+
+    def __init__(self, address: tuple[str, int]) -> None:
+        self.cid = -1
+        self.position = Vec2.ZERO
+        self.last_position = Vec2.ZERO
+        self.radius: float = simulation.INITIAL_RADIUS
+        self.timestep = simulation.FixedTimestep()
+        self.movement = "position" # until the server says to send inputs
+        self.time_chilled = self.CHILL_TIME
+        self.half_world_size = Vec2i.ONE * 100
+        self.foods: dict[int, tuple[float, float]] = {} # food ID: position
+        self.food_grid: SpatialHash[int] = SpatialHash(self.CELL_SIZE)
+        self.players: dict[int, tuple[Vec2, float]] = {} # other players, cid: (position, radius)
+        self.player_grid: SpatialHash[int] = SpatialHash(self.CELL_SIZE)
+        self._max_radius: float = 0
+        self._max_radius_dirty = False
+        self.frame_reader = protocol.FrameReader()
+        self.frame_writer = protocol.FrameWriter()
+        self.reset_prediction()
+        self.socket = socket.create_connection(address)
+        self.socket.setblocking(False)
+        self.frame_writer.write(protocol.encode("HELLO", [protocol.VERSION]))
+
+    @property
+    def is_chilling(self) -> bool:
+        return self.time_chilled <= self.CHILL_TIME
+
+    def send_request(self, kind: str, data: Iterable[Any]) -> None:
+        self.frame_writer.write(protocol.encode(kind, tuple(data)))
+
+    def flush(self) -> None:
+        self.frame_writer.flush(self.socket)
+
+    def close(self) -> None:
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+    def receive(self, data: bytes) -> None:
+        for kind, payload in self.frame_reader.feed(data):
+            try:
+                self._on_binary_response(kind, payload)
+            except struct.error:
+                log.warning("'%s' could not decode properly", kind)
+
+    def _on_binary_response(self, kind: str, payload: memoryview) -> None:
+        match kind:
+            case "DELTA":
+                self.apply_delta(protocol.iter_delta(payload))
+            case "WORLD_SNAPSHOT":
+                index, count = protocol.CHUNK_HEADER.unpack_from(payload)
+                self.apply_delta(protocol.iter_delta(payload[protocol.CHUNK_HEADER.size:]))
+                if index + 1 == count:
+                    self.send_request("WORLD_READY", [])
+            case "ASSIGN_CID":
+                (self.cid,) = protocol.unpack(kind, payload)
+            case "SET_WORLD_SIZE":
+                width, height = protocol.unpack(kind, payload)
+                self.half_world_size = Vec2i(width // 2, height // 2)
+            case "SET_INITIAL_POSITION":
+                self.position = Vec2(*protocol.unpack(kind, payload))
+            case "SET_MOVEMENT":
+                (mode,) = protocol.unpack(kind, payload)
+                self.movement = "input" if mode else "position"
+            case "FORCE_POSITION":
+                cid, x, y = protocol.unpack(kind, payload)
+                self.force_position(cid, Vec2(x, y))
+
+    def force_position(self, cid: int, loc: Vec2) -> None:
+        if cid == self.cid:
+            self.position = loc
+            self.time_chilled = 0 # reset chill time
+            self.reset_prediction()
+        elif cid in self.players:
+            self.move_player(cid, loc)
+
+    def move_player(self, cid: int, loc: Vec2) -> None:
+        self.players[cid] = (loc, self.players[cid][1])
+        self.player_grid.insert(cid, loc.x, loc.y)
+
+    @property
+    def max_radius(self) -> float:
+        """Largest radius of the other players, which may be past `simulation.MAX_RADIUS` after eating a player
+        """
+        if self._max_radius_dirty:
+            self._max_radius = max((radius for _, radius in self.players.values()), default=0)
+            self._max_radius_dirty = False
+        return self._max_radius
+
+    def nearby_players(self, loc: Vec2, max_range: float) -> list[tuple[Vec2, float]]:
+        """Position and radius of other players whose edge is within `max_range` of `loc`
+        """
+        nearby: list[tuple[Vec2, float]] = []
+        for cid in self.player_grid.query(loc.x, loc.y, max_range + self.max_radius):
+            other_loc, other_radius = self.players[cid]
+            if loc.distance_to(other_loc) - other_radius < max_range:
+                nearby.append((other_loc, other_radius))
+        return nearby
+
+    def apply_delta(self, sections: Iterable[tuple[str, Iterable[tuple[Any, ...]]]]) -> None:
+        for tag, records in sections:
+            match tag:
+                case snapshot.MOVES:
+                    for cid, x, y in records:
+                        if cid in self.players:
+                            self.move_player(cid, Vec2(x, y))
+                case snapshot.CORRECTIONS:
+                    for cid, sequence, x, y in records:
+                        if cid == self.cid:
+                            self.reconcile(sequence, Vec2(x, y))
+                case snapshot.ACKS:
+                    for cid, sequence, steps, x, y in records:
+                        if cid == self.cid:
+                            self.reconcile_input(sequence, steps, Vec2(x, y), self.half_world_size)
+                case snapshot.FORCED:
+                    for cid, x, y in records:
+                        self.force_position(cid, Vec2(x, y))
+                case snapshot.RADII:
+                    for cid, radius in records:
+                        if cid == self.cid:
+                            self.radius = radius
+                        elif cid in self.players:
+                            self.players[cid] = (self.players[cid][0], radius)
+                            self._max_radius_dirty = True
+                case snapshot.FOODS_ADDED:
+                    for food_id, x, y, *_color in records:
+                        self.foods[food_id] = (x, y)
+                        self.food_grid.insert(food_id, x, y)
+                case snapshot.FOODS_REMOVED:
+                    for (food_id,) in records:
+                        self.foods.pop(food_id, None)
+                        self.food_grid.discard(food_id)
+                case snapshot.PLAYERS_ADDED:
+                    for cid, x, y, radius, *_color in records:
+                        if cid != self.cid:
+                            self.players[cid] = (Vec2(x, y), radius)
+                            self.player_grid.insert(cid, x, y)
+                            self._max_radius_dirty = True
+                case snapshot.PLAYERS_REMOVED:
+                    for (cid,) in records:
+                        self.players.pop(cid, None)
+                        self.player_grid.discard(cid)
+                        self._max_radius_dirty = True
+
+    def update(self, delta: float) -> None:
+        """Same as `bot.Bot._update`
+        """
+        if self.cid == -1: # not joined yet
+            return
+        self.time_chilled += delta
+        if self.is_chilling:
+            return
+        for _ in range(self.timestep.advance(delta)):
+            closest_food = self.food_grid.nearest(self.position.x, self.position.y, self.SIGHT_RANGE, position_of=self.foods.__getitem__)
+            self.steer(self.position, self.radius, None if closest_food is None else Vec2(*self.foods[closest_food]),
+                       self.nearby_players(self.position, self.SIGHT_RANGE), self.half_world_size)
+            direction = self.direction
+            if self.movement == "input":
+                data = self.next_input(self.position, direction) # only sent when steering turned enough
+                if data is not None:
+                    self.send_request("SET_INPUT", [self.cid, *data])
+                direction = self.sent_direction # as the server moves with it
+            self.position = simulation.step(self.position, direction, self.radius, self.half_world_size)
+        self.position = simulation.clamp_to_world(self.position, self.radius, self.half_world_size)
+        if self.movement == "position" and self.position.distance_to(self.last_position) > 0.5: # moved more than 0.5
+            sequence = self.record_sent(self.position)
+            self.send_request("SET_POSITION", [self.cid, *self.position.to_tuple(), sequence])
+        self.last_position = self.position
+
+
+class Swarm:
+    """Runs many `HeadlessBot`s in one process, on a single selector loop
+
+    Bots are connected `ramp_up` per second until there are `count`, and all of them are closed on `stop`
+    """
+    READ_SIZE: int = 65_536
+    REPORT_INTERVAL: float = 10 # seconds
+
+    def __init__(self, *, host: str = "localhost", port: int = 8080, count: int = 100,
+                 ramp_up: float = 50, tps: int = 60) -> None:
+        self.address = (host, port)
+        self.count = count
+        self.ramp_up = ramp_up
+        self.tps = tps
+        self.bots: list[HeadlessBot] = []
+        self.selector = selectors.DefaultSelector()
+        self.is_running = False
+        self.start_timestamp = time.perf_counter()
+        self.received_bytes = 0
+
+    def stop(self, *_args: Any) -> None:
+        self.is_running = False
+
+    def run(self, duration: float = math.inf) -> None:
+        """Runs until stopped, or for `duration` seconds
+        """
+        self.is_running = True
+        self.start_timestamp = time.perf_counter()
+        report_timestamp = self.start_timestamp
+        try:
+            while self.is_running and self.step() < duration:
+                now = time.perf_counter()
+                if now - report_timestamp >= self.REPORT_INTERVAL:
+                    joined = sum(1 for bot in self.bots if bot.cid != -1)
+                    log.info("%d bots connected, %d joined, %.1f KiB/s received",
+                             len(self.bots), joined, self.received_bytes / (now - report_timestamp) / 1024)
+                    self.received_bytes = 0
+                    report_timestamp = now
+        finally:
+            self.close()
+
+    def step(self) -> float:
+        """Runs a single frame, sleeping until the next one is due
+
+        Returns:
+            float: seconds since `start_timestamp`
+        """
+        interval = 1 / self.tps
+        frame_start = time.perf_counter()
+        self.connect_due(frame_start - self.start_timestamp)
+        self.receive()
+        for bot in self.bots:
+            bot.update(interval)
+            bot.flush()
+        delay = interval - (time.perf_counter() - frame_start)
+        if delay > 0: # when running behind, bots still move as if on time
+            time.sleep(delay)
+        return time.perf_counter() - self.start_timestamp
+
+    def make_bot(self) -> HeadlessBot:
+        return HeadlessBot(self.address)
+
+    def connect_due(self, elapsed: float) -> None:
+        due = min(self.count, int(elapsed * self.ramp_up) + 1)
+        while len(self.bots) < due:
+            try:
+                bot = self.make_bot()
+            except OSError as error:
+                log.warning("Bot could not connect: %s", error)
+                self.stop()
+                return
+            self.bots.append(bot)
+            self.selector.register(bot.socket, selectors.EVENT_READ, bot)
+
+    def receive(self) -> None:
+        for key, _ in self.selector.select(timeout=0):
+            bot: HeadlessBot = key.data
+            try:
+                data = bot.socket.recv(self.READ_SIZE)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                data = b""
+            if not data:
+                log.info("Bot %d disconnected by server", bot.cid)
+                self.drop(bot)
+                continue
+            self.received_bytes += len(data)
+            try:
+                bot.receive(data)
+            except ValueError as error:
+                log.warning("Invalid binary response: %s", error)
+                self.drop(bot)
+
+    def drop(self, bot: HeadlessBot) -> None:
+        self.selector.unregister(bot.socket)
+        bot.close()
+        self.bots.remove(bot)
+
+    def close(self) -> None:
+        for bot in self.bots:
+            self.selector.unregister(bot.socket)
+            bot.close()
+        log.info("Closed %d bots", len(self.bots))
+        self.bots.clear()
+        self.selector.close()
+
+
+def run_swarm(options: dict[str, Any]) -> None:
+    swarm = Swarm(**options)
+    signal.signal(signal.SIGINT, swarm.stop)
+    signal.signal(signal.SIGTERM, swarm.stop)
+    swarm.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agar.io - Headless bot swarm")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--count", type=int, default=100, help="bots in total")
+    parser.add_argument("--ramp-up", type=float, default=50, help="bots connected per second")
+    parser.add_argument("--tps", type=int, default=60, help="bot updates per second, like the client")
+    parser.add_argument("--processes", type=int, default=1, help="split the bots over this many processes")
+    args = parser.parse_args()
+    processes = max(1, args.processes)
+    options = [{"host": args.host, "port": args.port, "tps": args.tps,
+                "count": args.count // processes + (index < args.count % processes),
+                "ramp_up": args.ramp_up / processes} for index in range(processes)]
+    if processes == 1:
+        run_swarm(options[0])
+    else:
+        workers = [multiprocessing.Process(target=run_swarm, args=(worker_options,)) for worker_options in options]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            for worker in workers:
+                worker.terminate() # 'SIGTERM' stops the swarm, which closes its bots
+            for worker in workers:
+                worker.join()
+        log.info("Swarm stopped")
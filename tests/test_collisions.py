@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import math
+import random
+import itertools
+
+import pytest
+# dependencies
+from displaylib.math import Vec2, Vec2i # type: ignore
+# local imports
+from server import HeadlessServer
+from entities import Client
+import simulation
+
+# Every collision engine against a brute-force pass over all foods and every ordered pair of clients,
+# in a world dense enough for players to eat food, eat each other and kill each other at `MAX_RADIUS`
+
+ENGINES: tuple[str, ...] = ("grid", "numpy", "sharded")
+RADII: tuple[float, ...] = (10, 10, 20, 37.5, 50, 99.9, 100, 100)
+
+
+def make_world(engine: str, seed: int, clients: int = 60) -> HeadlessServer:
+    server = HeadlessServer()
+    server.COLLISION_ENGINE = engine
+    server.SHARDS = 2
+    server.SEED = seed
+    server.WORLD_SIZE = Vec2i(800, 800)
+    server.HALF_WORLD_SIZE = Vec2i(400, 400)
+    server.FOOD_DENSITY = 4000
+    server.MAX_FOOD_COUNT = 5000
+    server._on_start()
+    rng = random.Random(seed)
+    for connection in range(clients):
+        server._on_client_connected(connection, "localhost", connection)
+        server.join(connection, binary=True)
+    for client in server.clients.values():
+        client.position = Vec2(rng.uniform(-350, 350), rng.uniform(-350, 350))
+        client.radius = rng.choice(RADII)
+        server.sync_client(client)
+    return server
+
+
+def brute_force(server: HeadlessServer) -> None:
+    """The rules written out again over all foods and every ordered pair of clients, without the server's helpers
+    """
+    foods = server.foods
+    clients = tuple(server.clients.values())
+    half_world_size = server.HALF_WORLD_SIZE
+    foods_eaten_ids: set[int] = set()
+    for client in clients:
+        for food_id in foods: # slot order, which is insertion order in a world that was only filled
+            if food_id in foods_eaten_ids:
+                continue
+            if math.dist(client.position.to_tuple(), foods.position(food_id)) - simulation.FOOD_RADIUS + 1 < client.radius:
+                client.radius = min(simulation.MAX_RADIUS, client.radius + simulation.FOOD_ENERGY)
+                foods_eaten_ids.add(food_id)
+    for food_id in foods_eaten_ids:
+        foods.remove(food_id)
+
+    def respawn(client: Client) -> None: # from the world's random numbers, in the same order as the server
+        x = server.random.randint(-half_world_size.x, half_world_size.x)
+        y = server.random.randint(-half_world_size.y, half_world_size.y)
+        bound_x = half_world_size.x - int(client.radius + 1)
+        bound_y = half_world_size.y - int(client.radius + 1)
+        client.position = Vec2(min(max(x, -bound_x), bound_x), min(max(y, -bound_y), bound_y))
+        client.radius = simulation.INITIAL_RADIUS
+
+    mutually_killed: list[Client] = []
+    for client_a, client_b in itertools.permutations(clients, r=2):
+        if math.dist(client_a.position.to_tuple(), client_b.position.to_tuple()) >= client_a.radius + client_b.radius:
+            continue
+        if client_a.radius == client_b.radius == simulation.MAX_RADIUS:
+            for client in (client_a, client_b):
+                if client not in mutually_killed:
+                    mutually_killed.append(client)
+                    respawn(client)
+            continue
+        bigger, smaller = (client_a, client_b) if client_a.radius >= client_b.radius else (client_b, client_a)
+        if int(bigger.radius) > int(smaller.radius):
+            bigger.radius += smaller.radius
+            respawn(smaller)
+
+
+def world_state(server: HeadlessServer) -> tuple[dict[int, tuple[tuple[float, float], float]], list[int]]:
+    clients = {cid: (client.position.to_tuple(), client.radius) for cid, client in server.clients.items()}
+    return clients, sorted(server.foods)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", range(1, 5))
+def test_engine_matches_brute_force(engine: str, seed: int) -> None:
+    if engine != "grid":
+        pytest.importorskip("numpy")
+    expected = make_world("grid", seed)
+    brute_force(expected)
+    server = make_world(engine, seed)
+    try:
+        server.collide_foods()
+        server.collide_players()
+    finally:
+        if hasattr(server.collisions, "close"):
+            server.collisions.close()
+    assert world_state(server) == world_state(expected)
+    assert len(server.foods) < server.food_field.target # some food was eaten
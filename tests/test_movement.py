@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+# local imports
+from server import HeadlessServer
+from entities import Client
+from prediction import Prediction
+import simulation
+
+# Inputs moved by the server against the client stepping one step at a time, while the radius changes mid-input
+
+LEFT = Vec2(-1, 0)
+HALF_WORLD_SIZE = HeadlessServer.HALF_WORLD_SIZE
+
+
+def make_server() -> tuple[HeadlessServer, Client]:
+    server = HeadlessServer()
+    server.MOVEMENT = "input"
+    server.SEED = 1
+    server._on_start()
+    server._on_client_connected(0, "localhost", 0)
+    server.join(0, binary=True)
+    (client,) = server.clients.values()
+    client.position = client.input_start = Vec2(0, 0)
+    client.radius = 10
+    server.sync_client(client)
+    server.set_input(0, client.cid, LEFT, 1, 0)
+    return server, client
+
+
+def stepped(loc: Vec2, radii: list[float]) -> Vec2:
+    for radius in radii:
+        loc = simulation.step(loc, LEFT, radius, HALF_WORLD_SIZE)
+    return loc
+
+
+def test_radius_change_keeps_steps_moved() -> None:
+    server, client = make_server()
+    server.move_clients(300)
+    assert client.position.distance_to(stepped(Vec2(0, 0), [10] * 300)) < 1e-6
+    client.radius = 30 # ate something
+    server.move_clients(1)
+    assert client.position.distance_to(stepped(Vec2(0, 0), [10] * 300 + [30])) < 1e-6
+
+
+def test_next_input_moves_previous_one_with_its_radii() -> None:
+    server, client = make_server()
+    server.move_clients(300)
+    client.radius = 30
+    server.move_clients(5)
+    server.set_input(0, client.cid, Vec2(0, 1), 2, 310) # the client got 5 steps further
+    assert client.position.distance_to(stepped(Vec2(0, 0), [10] * 300 + [30] * 10)) < 1e-6
+
+
+class Predicted(Prediction):
+    def __init__(self) -> None:
+        self.position = Vec2(0, 0)
+        self.last_position = Vec2(0, 0)
+        self.radius = 10
+        self.reset_prediction()
+
+    def step(self) -> None:
+        self.next_input(self.position, LEFT)
+        self.last_position = self.position
+        self.position = simulation.step(self.position, self.sent_direction, self.radius, HALF_WORLD_SIZE)
+
+
+def test_reconcile_input_replays_radii() -> None:
+    player = Predicted()
+    for _ in range(300):
+        player.step()
+    player.radius = 30
+    for _ in range(10):
+        player.step()
+    predicted = player.position
+    player.reconcile_input(player.sequence, 310, stepped(Vec2(0, 0), [10] * 300 + [30] * 10), HALF_WORLD_SIZE)
+    assert player.position == predicted
+    assert player.correction == Vec2.ZERO
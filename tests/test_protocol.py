@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import pytest
+# local imports
+import protocol
+
+# Values that float32 holds exactly, so every round trip compares equal
+
+MESSAGES: list[tuple[str, tuple]] = [
+    ("HELLO", (protocol.VERSION,)),
+    ("ASSIGN_CID", (-1,)),
+    ("SET_WORLD_SIZE", (2000, 2000)),
+    ("SET_POSITION", (3, 1.5, -2.25, 7)),
+    ("SPAWN_FOOD", (70000, 1.0, 2.0, 255, 0, 128)),
+    ("SET_INPUT", (3, -127, 127, 9, 0xFFFF)),
+    ("SET_MOVEMENT", (1,)),
+]
+DELTA: list[tuple[str, tuple]] = [
+    ("T", (12.345,)),
+    ("M", (1, 1.5, -2.5)),
+    ("M", (2, 3.0, 4.0)),
+    ("K", (1, 3, 4, 5.0, 6.0)),
+    ("A", (7, 1.0, 2.0, 1, 2, 3)),
+    ("D", (8,)),
+    ("P", (2, 1.0, 2.0, 10.5, 1, 2, 3)),
+    ("Q", (4,)),
+]
+
+
+def read(frames: bytes) -> list[tuple[str, memoryview]]:
+    return protocol.FrameReader().feed(frames)
+
+
+@pytest.mark.parametrize("kind, data", MESSAGES)
+def test_message_round_trip(kind: str, data: tuple) -> None:
+    ((read_kind, payload),) = read(protocol.encode(kind, data))
+    assert read_kind == kind
+    assert protocol.unpack(kind, payload) == data
+
+
+@pytest.mark.parametrize("kind, data", MESSAGES)
+def test_text_values_convert_as_unpacked(kind: str, data: tuple) -> None:
+    assert protocol.parse_text(kind, [str(value) for value in data]) == data
+
+
+def test_parse_text_rejects_malformed() -> None:
+    with pytest.raises(ValueError):
+        protocol.parse_text("SET_POSITION", ["3", "x", "2", "1"])
+    with pytest.raises(ValueError):
+        protocol.parse_text("SET_POSITION", ["3", "1"])
+
+
+def test_text_frame_round_trip() -> None:
+    ((kind, payload),) = read(protocol.encode("WORLD_READY", ["a", 1]))
+    assert kind == "TEXT"
+    assert protocol.unpack_text(payload) == ("WORLD_READY", ["a", "1"])
+
+
+def test_delta_round_trip() -> None:
+    ((kind, payload),) = read(protocol.encode_delta(DELTA))
+    assert kind == "DELTA"
+    assert [(tag, record) for tag, records in protocol.iter_delta(payload) for record in records] == DELTA
+
+
+def test_world_snapshot_round_trip() -> None:
+    ((kind, payload),) = read(protocol.encode_world_snapshot(1, 3, DELTA[1:]))
+    assert kind == "WORLD_SNAPSHOT"
+    assert protocol.CHUNK_HEADER.unpack_from(payload) == (1, 3)
+    sections = protocol.iter_delta(payload[protocol.CHUNK_HEADER.size:])
+    assert [(tag, record) for tag, records in sections for record in records] == DELTA[1:]
+
+
+def test_frames_split_across_reads() -> None:
+    frames = protocol.encode("ASSIGN_CID", (5,)) + protocol.encode_delta(DELTA)
+    reader = protocol.FrameReader()
+    received = [kind for i in range(len(frames)) for kind, _ in reader.feed(frames[i:i + 1])]
+    assert received == ["ASSIGN_CID", "DELTA"]
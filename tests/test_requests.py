@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+# dependencies
+from displaylib.math import Vec2 # type: ignore
+# local imports
+from server import HeadlessServer
+
+# Requests as clients send them, including malformed and foreign ones
+
+
+def make_server(movement: str, clients: int = 2) -> HeadlessServer:
+    server = HeadlessServer()
+    server.MOVEMENT = movement
+    server.SEED = 1
+    server.MAX_POSITION_RATE = 0
+    server._on_start()
+    for connection in range(clients):
+        server._on_client_connected(connection, "localhost", connection)
+        server.join(connection, binary=False)
+    return server
+
+
+@pytest.mark.parametrize("kind, data", [
+    ("SET_POSITION", ["x", "1", "2"]),
+    ("SET_POSITION", ["0", "1", "2", "seven"]),
+    ("SET_POSITION", ["0", "1", "2", "3", "4"]),
+    ("SET_INPUT", ["0", "1", "2", "3", "four"]),
+    ("SET_INPUT", ["zero", "1", "2", "3", "4"]),
+])
+def test_malformed_text_is_ignored(kind: str, data: list[str]) -> None:
+    server = make_server("position" if kind == "SET_POSITION" else "input")
+    positions = [client.position for client in server.clients.values()]
+    server.handle_text(0, kind, data)
+    assert [client.position for client in server.clients.values()] == positions
+
+
+def test_text_position_moves_own_player() -> None:
+    server = make_server("position")
+    client = server.clients[server.connection_cids[0]]
+    loc = client.position + Vec2(1, 0)
+    server.handle_text(0, "SET_POSITION", [str(client.cid), str(loc.x), str(loc.y)])
+    assert client.position == loc
+
+
+def test_position_of_another_player_is_ignored() -> None:
+    server = make_server("position")
+    other = server.clients[server.connection_cids[1]]
+    loc = other.position
+    server.handle_text(0, "SET_POSITION", [str(other.cid), str(loc.x + 1), str(loc.y)])
+    assert other.position == loc
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+# local imports
+from snapshot import Snapshot, flatten, parse_sections
+import snapshot
+
+
+def records(delta: Snapshot) -> list[tuple[str, tuple]]:
+    return list(delta._records())
+
+
+def test_merge_keeps_newest_values() -> None:
+    earlier, later = Snapshot(), Snapshot()
+    earlier.move(1, 1.0, 2.0)
+    earlier.set_radius(1, 10.0)
+    later.move(1, 3.0, 4.0)
+    later.set_radius(1, 11.0)
+    later.time = 5.0
+    assert earlier.merge(later) == 2
+    assert records(earlier) == [(snapshot.TIME, (5.0,)), (snapshot.MOVES, (1, 3.0, 4.0)), (snapshot.RADII, (1, 11.0))]
+
+
+def test_merge_updates_unsent_spawns() -> None:
+    earlier, later = Snapshot(), Snapshot()
+    earlier.spawn_player(1, 0.0, 0.0, 10.0, 1, 2, 3)
+    later.move(1, 5.0, 6.0)
+    later.set_radius(1, 12.0)
+    earlier.merge(later)
+    assert records(earlier) == [(snapshot.PLAYERS_ADDED, (1, 5.0, 6.0, 12.0, 1, 2, 3))]
+
+
+def test_merge_drops_food_added_then_removed() -> None:
+    earlier, later = Snapshot(), Snapshot()
+    earlier.spawn_food(7, 1.0, 2.0, 1, 2, 3)
+    later.destroy_food(7)
+    earlier.merge(later)
+    assert not earlier
+
+
+def test_merge_food_removed_then_added_is_only_added() -> None:
+    earlier, later = Snapshot(), Snapshot()
+    earlier.destroy_food(7)
+    later.spawn_food(7, 1.0, 2.0, 1, 2, 3)
+    earlier.merge(later)
+    assert records(earlier) == [(snapshot.FOODS_ADDED, (7, 1.0, 2.0, 1, 2, 3))]
+
+
+def test_spawn_food_after_destroy_in_one_snapshot() -> None:
+    delta = Snapshot()
+    delta.destroy_food(7)
+    delta.spawn_food(7, 1.0, 2.0, 1, 2, 3)
+    assert records(delta) == [(snapshot.FOODS_ADDED, (7, 1.0, 2.0, 1, 2, 3))]
+
+
+def test_merge_player_removed_then_added_is_only_added() -> None:
+    earlier, later = Snapshot(), Snapshot()
+    earlier.despawn_player(2)
+    later.spawn_player(2, 1.0, 2.0, 10.0, 1, 2, 3)
+    earlier.merge(later)
+    assert records(earlier) == [(snapshot.PLAYERS_ADDED, (2, 1.0, 2.0, 10.0, 1, 2, 3))]
+
+
+def test_text_sections_round_trip() -> None:
+    delta = Snapshot()
+    delta.time = 1.5
+    delta.move(1, 1.5, -2.5)
+    delta.ack(1, 3, 4, 5.0, 6.0)
+    delta.spawn_food(7, 1.0, 2.0, 1, 2, 3)
+    delta.despawn_player(2)
+    data = [str(value) for value in flatten(delta._records())]
+    parsed = [(tag, record) for tag, section in parse_sections(data) for record in section]
+    assert parsed == records(delta)